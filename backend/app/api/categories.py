@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from app.core.database import get_db
+from app.core.cache import cached_response, invalidate, TAG_CATEGORIES, TAG_KB
 from app.models.category import CategoryDefinition
 from app.models.pipeline import AnalysisResult
 from app.services.vector_service import vector_service # For async updates (later)
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -31,8 +35,12 @@ class CategoryResponse(BaseModel):
 # --- Endpoints ---
 
 @router.get("/", response_model=List[CategoryResponse])
-def get_categories(db: Session = Depends(get_db)):
+def get_categories(request: Request, db: Session = Depends(get_db)):
     """List all defined categories with usage counts."""
+    return cached_response(request, "categories:list", lambda: _compute_categories(db),
+                           List[CategoryResponse], ttl=120, tags=[TAG_CATEGORIES])
+
+def _compute_categories(db: Session) -> List[CategoryResponse]:
     cats = db.query(CategoryDefinition).order_by(CategoryDefinition.name).all()
     
     # Calculate usage
@@ -60,6 +68,7 @@ def create_category(cat: CategoryCreate, db: Session = Depends(get_db)):
     db.add(new_cat)
     db.commit()
     db.refresh(new_cat)
+    invalidate(TAG_CATEGORIES)
     return new_cat
 
 @router.put("/{id}", response_model=CategoryResponse)
@@ -84,6 +93,7 @@ def update_category(id: int, update: CategoryUpdate, background_tasks: Backgroun
     cat.name = new_name
     cat.description = update.description
     db.commit()
+    invalidate(TAG_CATEGORIES)
     
     if old_name != new_name:
         # Cascade Update: SQL
@@ -113,6 +123,7 @@ def delete_category(id: int, db: Session = Depends(get_db)):
 
     db.delete(cat)
     db.commit()
+    invalidate(TAG_CATEGORIES)
     return {"status": "success"}
 
 # --- Background Task Implementation ---
@@ -133,7 +144,11 @@ def cascade_category_update(old_name: str, new_name: str, db: Session):
                              .filter(AnalysisResult.category_main == old_name)\
                              .update({AnalysisResult.category_main: new_name}, synchronize_session=False)
         bg_db.commit()
-        print(f"Cascade Update: Renamed {old_name} -> {new_name} for {updated_count} items in SQL.")
+        logger.info(f"Cascade Update: Renamed {old_name} -> {new_name} for {updated_count} items in SQL.")
+        
+        from app.services.verdict_index import verdict_index
+        verdict_index.rename_category(old_name, new_name)
+        invalidate(TAG_CATEGORIES, TAG_KB)
         
         # 2. Vector Update (Costly)
         # Strategy: We can't query Chroma by Metadata in mass update easily efficiently without iterating.
@@ -142,7 +157,7 @@ def cascade_category_update(old_name: str, new_name: str, db: Session):
         
         bg_db.close()
     except Exception as e:
-        print(f"Error in cascade update: {e}")
+        logger.error(f"Error in cascade update: {e}")
 
 @router.get("/stats")
 def get_category_stats(db: Session = Depends(get_db)):
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from app.core.database import get_db
+from app.core.cache import cached_response, invalidate, TAG_FEEDS
 from app.models.feed import FeedSource
 from app.services.feed_service import feed_service
 from pydantic import BaseModel
@@ -23,6 +24,8 @@ class FeedResponse(FeedCreate):
     total_items_found: int
     last_status: str
     last_error: Optional[str]
+    last_fetch_duration_ms: Optional[int] = None
+    last_new_items: Optional[int] = None
     created_at: datetime
     
     class Config:
@@ -30,8 +33,9 @@ class FeedResponse(FeedCreate):
         orm_mode = True # pydantic v1 fallback
 
 @router.get("/", response_model=List[FeedResponse])
-def list_feeds(db: Session = Depends(get_db)):
-    return db.query(FeedSource).all()
+def list_feeds(request: Request, db: Session = Depends(get_db)):
+    return cached_response(request, "feeds:list", lambda: db.query(FeedSource).all(),
+                           List[FeedResponse], ttl=30, tags=[TAG_FEEDS])
 
 @router.post("/", response_model=FeedResponse)
 def create_feed(feed: FeedCreate, db: Session = Depends(get_db)):
@@ -45,6 +49,7 @@ def create_feed(feed: FeedCreate, db: Session = Depends(get_db)):
     db.add(db_feed)
     db.commit()
     db.refresh(db_feed)
+    invalidate(TAG_FEEDS)
     return db_feed
 
 @router.put("/{feed_id}/toggle")
@@ -53,6 +58,7 @@ def toggle_feed(feed_id: int, db: Session = Depends(get_db)):
     if not feed: raise HTTPException(404, "Not found")
     feed.is_active = not feed.is_active
     db.commit()
+    invalidate(TAG_FEEDS)
     return {"status": "ok", "is_active": feed.is_active}
 
 @router.post("/{feed_id}/fetch_now")
@@ -65,4 +71,5 @@ async def fetch_feed_now(feed_id: int):
 def delete_feed(feed_id: int, db: Session = Depends(get_db)):
     db.query(FeedSource).filter(FeedSource.id == feed_id).delete()
     db.commit()
+    invalidate(TAG_FEEDS)
     return {"status": "ok"}
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException 
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from app.core.database import get_db
 from app.models.pipeline import AnalysisResult, PipelineItem
 from app.services.llm_service import llm_service
+from app.services.kb_search import kb_search, rrf_fuse
+import asyncio
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 class ChatRequest(BaseModel):
     query: str
@@ -17,12 +22,34 @@ class ChatResponse(BaseModel):
     sources: List[str]
     mode: str
 
+async def _hybrid_search(vector_service, query: str, limit: int = 5):
+    """
+    Run semantic and keyword retrieval concurrently and fuse them with RRF.
+    Either side failing degrades to the other.
+    """
+    vector_results, keyword_results = await asyncio.gather(
+        vector_service.search_async(query, limit=limit * 2),
+        run_in_threadpool(kb_search.search, query, limit * 2, "any"),
+        return_exceptions=True
+    )
+    if isinstance(vector_results, Exception):
+        logger.error(f"Vector search failed for {query!r}: {vector_results}")
+        vector_results = []
+    if isinstance(keyword_results, Exception):
+        logger.error(f"Keyword search failed for {query!r}: {keyword_results}")
+        keyword_results = []
+    for res in vector_results:
+        res.setdefault("match", "semantic")
+    return rrf_fuse(vector_results, keyword_results, limit=limit)
+
 @router.post("/chat", response_model=ChatResponse)
-def chat_with_intel(req: ChatRequest, db: Session = Depends(get_db)):
+async def chat_with_intel(req: ChatRequest, db: Session = Depends(get_db)):
     """
     Dual-Mode Intelligence API:
-    1. KB Search (SWG Simulation): Direct Vector Retrieval.
+    1. KB Search (SWG Simulation): Exact verdict from the in-memory index, else Vector Retrieval.
     2. RAG Analysis (W-Intel): LLM Analysis based on Retrieved Data.
+    Vector lookups run on VectorService's own executor; blocking SQL/LLM calls go to the threadpool.
+    Retrieval is hybrid: semantic (Chroma) and keyword (FTS5/BM25) hits are fused with RRF.
     """
     from app.services.vector_service import vector_service
     
@@ -33,24 +60,29 @@ def chat_with_intel(req: ChatRequest, db: Session = Depends(get_db)):
     if req.mode == "kb-search":
         results = []
         
-        # 1. Exact Match Lookup (Priority)
-        print(f"DEBUG: Lookup exact for {req.query}")
-        try:
-            exact_match = vector_service.get_item(req.query.strip())
-            print(f"DEBUG: Exact match result: {exact_match}")
-            if exact_match:
-                results.append(exact_match)
-        except Exception as e:
-            print(f"DEBUG: Exact match ERROR: {e}")
+        # 1. Exact Match Lookup (Priority) - in-memory verdict index, no Chroma round-trip
+        from app.services.verdict_index import verdict_index
+        if not verdict_index.loaded:
+            await run_in_threadpool(verdict_index.ensure_loaded)
+        verdict = verdict_index.lookup(req.query, parent_fallback=False)
+        if verdict:
+            results.append({
+                "id": verdict["fqdn"],
+                "fqdn": verdict["fqdn"],
+                "category": verdict["category"],
+                "is_malicious": verdict["is_malicious"],
+                "snippet": f"Verdict index (confidence {verdict['confidence']:.2f})",
+                "distance": 0.0,
+                "score": 1.0 # Exact match
+            })
             
-        # 2. Semantic Search (Similarity)
-        print(f"DEBUG: Sending semantic search for {req.query}")
-        try:
-            sim_results = vector_service.search(req.query, limit=5)
-            print(f"DEBUG: Search result: {len(sim_results)} items")
-        except Exception as e:
-             print(f"DEBUG: Search ERROR: {e}")
-             sim_results = []
+        # 2. Hybrid Search (Similarity + Keyword) - only when there is no exact verdict
+        sim_results = []
+        if not results:
+            try:
+                sim_results = await _hybrid_search(vector_service, req.query, limit=5)
+            except Exception as e:
+                 logger.error(f"KB search failed for {req.query}: {e}")
 
         
         # Merge unique
@@ -74,21 +106,21 @@ def chat_with_intel(req: ChatRequest, db: Session = Depends(get_db)):
                 answer += f"**Domain**: {res['fqdn']}\n"
                 answer += f"- **Category**: {res['category']}\n"
                 answer += f"- **Malicious**: {res['is_malicious']}\n"
-                answer += f"- **Similarity Score**: {score:.4f}\n"
+                answer += f"- **Score**: {score:.4f} ({res.get('match', 'exact')})\n"
                 answer += f"- **Snippet**: {res['snippet'][:100]}...\n\n"
                 sources.append(res['fqdn'])
                 
-            answer += "> *Note: This result comes directly from ChromaDB without LLM processing.*"
+            answer += "> *Note: These results come directly from the KB (vector + keyword index) without LLM processing.*"
 
     # --- Mode 2: RAG Analysis (Default) ---
     else:
         # 1. Retrieve Context (Vector + SQL Fallback)
         context_text = ""
         
-        # A. Vector Search
-        vector_results = vector_service.search(req.query, limit=5)
-        for res in vector_results:
-            context_text += f"- [KB Match] Domain: {res['fqdn']}, Category: {res['category']}, Conf: {res['score']:.2f}\n"
+        # A. Hybrid Search (Vector + Keyword, RRF-fused)
+        kb_results = await _hybrid_search(vector_service, req.query, limit=5)
+        for res in kb_results:
+            context_text += f"- [KB Match] Domain: {res['fqdn']}, Category: {res['category']}, Match: {res['match']}\n"
             context_text += f"  Summary: {res['snippet']}\n\n"
             sources.append(res['fqdn'])
             
@@ -106,7 +138,7 @@ def chat_with_intel(req: ChatRequest, db: Session = Depends(get_db)):
             )
             filters = [PipelineItem.fqdn.ilike(f"%{k}%") for k in keywords]
             
-            sql_results = query.filter(or_(*filters)).limit(5).all()
+            sql_results = await run_in_threadpool(lambda: query.filter(or_(*filters)).limit(5).all())
             
             for item, analysis in sql_results:
                 if item.fqdn in sources: 
@@ -139,7 +171,7 @@ def chat_with_intel(req: ChatRequest, db: Session = Depends(get_db)):
         """
         
         try:
-            answer = llm_service.simple_chat(prompt)
+            answer = await run_in_threadpool(llm_service.simple_chat, prompt)
         except Exception as e:
             answer = f"Error: {e}"
 
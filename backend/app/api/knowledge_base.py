@@ -1,19 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import String, type_coerce
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 from app.core.database import get_db
-from app.models.pipeline import PipelineItem, AnalysisResult, CrawlResult, PipelineStatus, PipelineLog
+from app.core.pagination import keyset_page, capped_count, fqdn_contains
+from app.core.cache import cached_response, invalidate, TAG_KB, TAG_PIPELINE, TAG_CATEGORIES
+from app.models.pipeline import PipelineItem, AnalysisResult, PipelineStatus, PipelineLog
 from app.services.vector_service import vector_service
+from app.services.verdict_index import verdict_index, resolve_batch
+from app.services.snapshot_service import snapshot_service
+from app.services.kb_search import kb_search
+from fastapi.concurrency import run_in_threadpool
 
 import logging
 import os
+import json
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Listing sort key (ix_analysis_results_analyzed); compared as the stored string so cursors round-trip exactly
+ANALYZED_KEY = type_coerce(AnalysisResult.analyzed_at, String)
+
 # --- Schemas ---
 
 class KBItemResponse(BaseModel):
@@ -25,25 +37,49 @@ class KBItemResponse(BaseModel):
     summary: Optional[str]
     crawled_at: Optional[datetime]
     analyzed_at: Optional[datetime]
-    vector_status: str = "Indexed" # Indexed / Missing
+    vector_status: str = "Indexed" # Indexed / Pending
 
 class KBStats(BaseModel):
     total_indexed: int
     categories: dict[str, int]
     malicious_count: int
+    # Evidence chunk vectors vs domain references (see kb_chunk_refs)
+    chunks: Optional[dict] = None
 
 class KBUpdateRequest(BaseModel):
     category: Optional[str] = None
     is_malicious: Optional[bool] = None
     summary: Optional[str] = None
 
+class VerdictResponse(BaseModel):
+    fqdn: str
+    found: bool
+    matched: Optional[str] = None
+    match_type: Optional[str] = None # exact / parent
+    category: Optional[str] = None
+    is_malicious: Optional[bool] = None
+    confidence: Optional[float] = None
+
+class BatchLookupRequest(BaseModel):
+    fqdns: List[str]
+    parent_fallback: bool = True
+
+class BatchLookupResponse(BaseModel):
+    results: List[VerdictResponse]
+    found: int
+
+MAX_BATCH_LOOKUP = 50000
+
 # --- Endpoints ---
 
 @router.get("/stats", response_model=KBStats)
-def get_kb_stats(db: Session = Depends(get_db)):
+def get_kb_stats(request: Request, db: Session = Depends(get_db)):
     """
     Get generic stats about the Knowledge Base (Completed Items).
     """
+    return cached_response(request, "kb:stats", lambda: _compute_kb_stats(db), KBStats, ttl=60, tags=[TAG_KB])
+
+def _compute_kb_stats(db: Session) -> dict:
     query = db.query(PipelineItem).join(AnalysisResult).filter(PipelineItem.status == PipelineStatus.COMPLETED)
     
     total = query.count()
@@ -61,7 +97,8 @@ def get_kb_stats(db: Session = Depends(get_db)):
     return {
         "total_indexed": total,
         "categories": {c: count for c, count in cats if c},
-        "malicious_count": malicious
+        "malicious_count": malicious,
+        "chunks": vector_service.chunk_stats(db)
     }
 
 @router.get("/items", response_model=dict)
@@ -71,15 +108,20 @@ def get_kb_items(
     search: Optional[str] = None,
     category: Optional[str] = None,
     is_malicious: Optional[bool] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
     List KB items (Source: SQL AnalysisResults where status=COMPLETED).
+    Pages by keyset on (analyzed_at, id): pass next_cursor back as ?cursor=.
+    page is still honoured (offset) when no cursor is given.
+    total is capped; total_is_estimate tells whether the cap was hit.
     """
-    query = db.query(PipelineItem, AnalysisResult).join(AnalysisResult).filter(PipelineItem.status == PipelineStatus.COMPLETED)
+    query = db.query(PipelineItem, AnalysisResult, ANALYZED_KEY, AnalysisResult.id)\
+              .join(AnalysisResult).filter(PipelineItem.status == PipelineStatus.COMPLETED)
     
     if search:
-        query = query.filter(PipelineItem.fqdn.ilike(f"%{search}%"))
+        query = query.filter(fqdn_contains(PipelineItem.fqdn, PipelineItem.id, search))
     
     if category and category != "All":
         query = query.filter(AnalysisResult.category_main == category)
@@ -87,14 +129,18 @@ def get_kb_items(
     if is_malicious is not None:
         query = query.filter(AnalysisResult.is_malicious == is_malicious)
         
-    total = query.count()
+    total, total_is_estimate = capped_count(query)
     
-    items = query.order_by(AnalysisResult.analyzed_at.desc())\
-                 .offset((page - 1) * limit)\
-                 .limit(limit).all()
+    next_cursor = None
+    if page > 1 and not cursor:
+        items = query.order_by(ANALYZED_KEY.desc(), AnalysisResult.id.desc())\
+                     .offset((page - 1) * limit)\
+                     .limit(limit).all()
+    else:
+        items, next_cursor = keyset_page(query, ANALYZED_KEY, AnalysisResult.id, cursor, limit)
                  
     results = []
-    for item, analysis in items:
+    for item, analysis, _, _ in items:
         results.append({
             "id": item.id,
             "fqdn": item.fqdn,
@@ -104,12 +150,14 @@ def get_kb_items(
             "summary": analysis.summary,
             "crawled_at": item.updated_at, # Approximate
             "analyzed_at": analysis.analyzed_at,
-            "vector_status": "Indexed" # Assumed for now
+            "vector_status": "Indexed" if analysis.vector_id else "Pending"
         })
         
     return {
         "data": results,
         "total": total,
+        "total_is_estimate": total_is_estimate,
+        "next_cursor": next_cursor,
         "page": page,
         "limit": limit
     }
@@ -117,7 +165,8 @@ def get_kb_items(
 @router.patch("/items/{id}")
 def update_kb_item(id: int, req: KBUpdateRequest, db: Session = Depends(get_db)):
     """
-    Update Metadata AND Re-Index Vector.
+    Update Metadata AND queue a Re-Index of the Vector.
+    Embedding happens in the orchestrator's index stage, not in this request.
     """
     item = db.query(PipelineItem).filter(PipelineItem.id == id).first()
     if not item:
@@ -135,45 +184,15 @@ def update_kb_item(id: int, req: KBUpdateRequest, db: Session = Depends(get_db))
     if req.summary:
         analysis.summary = req.summary
         
+    # 2. Queue Re-Index: index_loop picks up COMPLETED items without a vector_id
+    analysis.vector_id = None
+    db.add(PipelineLog(item_id=id, stage="KB_MANUAL", level="INFO", message="Updated via KB Manager, queued for re-index"))
     db.commit()
     
-    # 2. Re-Index Vector
-    # We need content content.
-    try:
-        crawl = db.query(CrawlResult).filter(CrawlResult.item_id == id).first()
-        content_snippet = ""
-        if crawl and crawl.html_content_path:
-             # Resolve path
-            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            # Handle if path starts with data/ or not
-            rel_path = crawl.html_content_path
-            if rel_path.startswith("/"):
-                 full_path = rel_path
-            else:
-                 full_path = os.path.join(base_dir, rel_path)
-            
-            if os.path.exists(full_path):
-                with open(full_path, "r", encoding="utf-8", errors="ignore") as f:
-                    content_snippet = f.read()[:1000]
-        
-        # Combine summary + Evidence
-        rich_summary = f"Summary: {analysis.summary}\n\nEvidence: {content_snippet}"
-        
-        vector_service.add_item(
-            fqdn=item.fqdn,
-            content_summary=rich_summary,
-            category=analysis.category_main,
-            is_malicious=analysis.is_malicious
-        )
+    verdict_index.upsert(item.fqdn, analysis.category_main, analysis.is_malicious, analysis.confidence_score)
+    invalidate(TAG_KB, TAG_CATEGORIES)
         
-        db.add(PipelineLog(item_id=id, stage="KB_MANUAL", level="INFO", message="Updated and Re-indexed via KB Manager"))
-        db.commit()
-        
-    except Exception as e:
-        logger.error(f"Failed to re-index {item.fqdn}: {e}")
-        # Don't fail the request, but log it
-        
-    return {"status": "success", "message": "Updated and Re-indexed"}
+    return {"status": "success", "message": "Updated and queued for re-indexing"}
 
 @router.post("/items/{id}/rebuild")
 def rebuild_kb_item(id: int, db: Session = Depends(get_db)):
@@ -195,15 +214,188 @@ def delete_kb_item(id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Item not found")
         
     # Remove from Vector
-    try:
-        # Chroma doesn't have easy delete by ID in our wrapper yet?
-        # vector_service.collection.delete(ids=[item.fqdn])
-        if vector_service.collection:
-            vector_service.collection.delete(ids=[item.fqdn])
-    except Exception as e:
-        logger.error(f"Failed to delete vector for {item.fqdn}: {e}")
+    vector_service.delete_items([item.fqdn])
         
     item.status = PipelineStatus.ARCHIVED
     db.commit()
+    verdict_index.remove(item.fqdn)
+    kb_search.remove(item.id)
+    invalidate(TAG_KB, TAG_PIPELINE, TAG_CATEGORIES)
     
     return {"status": "success", "message": "Archived and removed from active KB"}
+
+# --- Keyword Search (FTS5 / BM25) ---
+
+@router.get("/search")
+async def search_kb(
+    q: str,
+    limit: int = Query(20, ge=1, le=200),
+    match: str = Query("all", pattern="^(all|any)$"),
+    category: Optional[str] = None,
+    is_malicious: Optional[bool] = None
+):
+    """
+    Full-text search over fqdn, page title, summary and crawl evidence, ranked by BM25.
+    Words are prefix-matched; match=all requires every word, match=any ranks by any.
+    """
+    results = await run_in_threadpool(kb_search.search, q, limit, match,
+                                      None if category == "All" else category, is_malicious)
+    return {"query": q, "results": results, "count": len(results)}
+
+# --- Verdict Lookup (SWG fast path, served from memory) ---
+
+def _to_verdict(fqdn: str, hit: Optional[dict]) -> dict:
+    if hit is None:
+        return {"fqdn": fqdn, "found": False}
+    return {"found": True, **hit}
+
+@router.get("/lookup/{fqdn}", response_model=VerdictResponse)
+async def lookup_verdict(fqdn: str, parent_fallback: bool = True):
+    """
+    Exact-match verdict for one FQDN with parent-domain fallback.
+    Answered from the in-memory verdict index; Chroma and SQL are not touched.
+    """
+    if not verdict_index.loaded:
+        await run_in_threadpool(verdict_index.ensure_loaded)
+    return _to_verdict(fqdn, verdict_index.lookup(fqdn, parent_fallback))
+
+@router.post("/lookup", response_model=BatchLookupResponse)
+async def lookup_verdicts(req: BatchLookupRequest):
+    """
+    Batch variant of /lookup/{fqdn}.
+    """
+    if len(req.fqdns) > MAX_BATCH_LOOKUP:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_LOOKUP} fqdns per call")
+    if not verdict_index.loaded:
+        await run_in_threadpool(verdict_index.ensure_loaded)
+    hits = verdict_index.lookup_many(req.fqdns, req.parent_fallback)
+    results = [_to_verdict(f, h) for f, h in zip(req.fqdns, hits)]
+    return {"results": results, "found": sum(1 for h in hits if h is not None)}
+
+# --- Bulk Verdicts (SWG integration, NDJSON streaming) ---
+
+VERDICT_CHUNK = 5000
+
+async def _read_fqdns(request: Request):
+    """
+    Read the fqdn list from either a JSON body ({"fqdns": [...]}) or a
+    newline-delimited upload. Uploads are split incrementally as they arrive,
+    so the raw body is never held alongside the decoded list.
+    Returns (fqdns, json_body).
+    """
+    if request.headers.get("content-type", "").startswith("application/json"):
+        body = await request.json()
+        fqdns = body.get("fqdns", []) if isinstance(body, dict) else body
+        return fqdns, body if isinstance(body, dict) else {}
+
+    fqdns = []
+    tail = b""
+    async for block in request.stream():
+        lines = (tail + block).split(b"\n")
+        tail = lines.pop()
+        fqdns.extend(line.decode("utf-8", "ignore") for line in lines)
+    if tail:
+        fqdns.append(tail.decode("utf-8", "ignore"))
+    return fqdns, {}
+
+@router.post("/verdicts")
+async def bulk_verdicts(request: Request, enqueue_unknown: bool = False, parent_fallback: bool = True):
+    """
+    Resolve many FQDNs against the KB, policy lists and pipeline status.
+    Body: {"fqdns": [...], "enqueue_unknown": bool} as JSON, or one fqdn per line (text/plain / NDJSON upload).
+    Response: NDJSON, one line per fqdn, streamed in chunks of VERDICT_CHUNK:
+      {"fqdn", "verdict": malicious|clean|blocked|allowed|pending|unknown|invalid, "category"?, "confidence"?,
+       "match_type"?, "policy"?, "pipeline_status"?, "enqueued"?}
+    """
+    # The body must be consumed before streaming starts (StreamingResponse owns the receive channel)
+    fqdns, body = await _read_fqdns(request)
+    # Flags may also be passed in the JSON body
+    enqueue_unknown = body.get("enqueue_unknown", enqueue_unknown)
+    parent_fallback = body.get("parent_fallback", parent_fallback)
+
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+    async def generate():
+        for i in range(0, len(fqdns), VERDICT_CHUNK):
+            records = await run_in_threadpool(resolve_batch, fqdns[i:i + VERDICT_CHUNK], parent_fallback, enqueue_unknown)
+            if records:
+                yield ("\n".join(map(dumps, records)) + "\n").encode("utf-8")
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+# --- Verdict Snapshot (edge proxy export) ---
+
+@router.get("/snapshot")
+def get_snapshot(request: Request, since: Optional[int] = None):
+    """
+    Download the current verdict snapshot (see snapshot_service for the format).
+    With ?since=<version>, a delta from that version is returned when one exists;
+    otherwise the full snapshot. Supports If-None-Match for cheap polling.
+    """
+    manifest = snapshot_service.get_manifest()
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Snapshot not built yet")
+
+    version = manifest["version"]
+    headers = {"X-Snapshot-Version": str(version), "Cache-Control": "no-cache"}
+    delta = manifest["deltas"].get(str(since)) if since is not None else None
+
+    if since == version:
+        etag = f'"kb-v{version}"'
+    elif delta:
+        etag = f'"kb-v{since}-v{version}"'
+    else:
+        etag = f'"kb-v{version}-{manifest["sha256"][:16]}"'
+    headers["ETag"] = etag
+
+    if since == version or request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    if delta:
+        headers["X-Snapshot-Delta-From"] = str(since)
+        return FileResponse(os.path.join(snapshot_service.snapshot_dir, delta["file"]),
+                            media_type="application/gzip", filename=delta["file"], headers=headers)
+
+    return FileResponse(snapshot_service.snapshot_path(version), media_type="application/octet-stream",
+                        filename=manifest["file"], headers=headers)
+
+@router.get("/snapshot/manifest")
+def get_snapshot_manifest():
+    manifest = snapshot_service.get_manifest()
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Snapshot not built yet")
+    return manifest
+
+@router.post("/snapshot/build")
+async def build_snapshot(force: bool = False):
+    manifest = await run_in_threadpool(snapshot_service.build, force)
+    return {k: v for k, v in manifest.items() if k != "history"}
+
+# --- SQL <-> Vector KB Reconciliation ---
+
+@router.get("/reconcile")
+def get_reconcile_state():
+    """Checkpoint of the current pass, the last run and the last completed pass."""
+    from app.services.kb_reconcile import kb_reconciler
+    return kb_reconciler.get_state()
+
+@router.post("/reconcile")
+async def reconcile_kb(apply: bool = False, reset: bool = False, max_changes: Optional[int] = Query(None, ge=1)):
+    """
+    Diff SQL against the vector KB from the checkpoint (apply=false only reports counts).
+    reset=true starts a full pass from the beginning.
+    """
+    from app.core.config import get_settings
+    from app.services.kb_reconcile import kb_reconciler
+    settings = get_settings()
+    if not await vector_service.available_async():
+        raise HTTPException(status_code=503, detail="Vector collection not available")
+    if reset:
+        kb_reconciler.reset()
+    summary = await vector_service.run_write(kb_reconciler.run, apply, settings.KB_RECONCILE_BATCH_SIZE,
+                                             max_changes or settings.KB_RECONCILE_MAX_CHANGES)
+    if "error" in summary:
+        raise HTTPException(status_code=409, detail=summary["error"])
+    if apply:
+        invalidate(TAG_KB, TAG_CATEGORIES)
+    return summary
@@ -1,64 +1,212 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.core.database import get_db
 from app.models.pipeline import PipelineItem, PipelineStatus, PipelineLog
-from app.models.schemas import PipelineItemResponse, PipelineItemCreate, PipelineStats, SystemHealth, ComponentStatus
-from sqlalchemy import func
+from app.models.schemas import PipelineItemResponse, PipelineItemCreate, PipelineStats, SystemHealth, ComponentStatus, SystemMetricResponse, PipelineLogResponse, AnalyzeRequest
+from sqlalchemy import func, String, type_coerce
+from app.core.pagination import keyset_page, fqdn_contains
+from app.core.cache import cached_response, invalidate, TAG_PIPELINE
+from app.services.event_bus import event_bus
+import asyncio
+import json
 
 router = APIRouter()
 
+# Sort key for item listings; must match the expression in ix_pipeline_items_*_activity.
+# Compared as the stored string so cursors round-trip exactly.
+ACTIVITY_KEY = type_coerce(func.coalesce(PipelineItem.updated_at, PipelineItem.created_at), String)
+
 @router.get("/stats", response_model=PipelineStats)
-def get_stats(db: Session = Depends(get_db)):
-    total = db.query(PipelineItem).count()
-    status_counts = db.query(PipelineItem.status, func.count(PipelineItem.status)).group_by(PipelineItem.status).all()
-    
-    # Fetch Recent Activity
-    recent_items = db.query(PipelineItem).order_by(PipelineItem.updated_at.desc()).limit(10).all()
-    recent_logs = db.query(PipelineLog).order_by(PipelineLog.id.desc()).limit(10).all()
-    
-    return {
-        "total": total,
-        "by_status": {status: count for status, count in status_counts},
-        "recent_items": recent_items,
-        "recent_logs": recent_logs
-    }
+def get_stats(request: Request, db: Session = Depends(get_db)):
+    def compute():
+        total = db.query(PipelineItem).count()
+        status_counts = db.query(PipelineItem.status, func.count(PipelineItem.status)).group_by(PipelineItem.status).all()
+        
+        # Fetch Recent Activity
+        recent_items = db.query(PipelineItem).order_by(PipelineItem.updated_at.desc()).limit(10).all()
+        recent_logs = db.query(PipelineLog).order_by(PipelineLog.id.desc()).limit(10).all()
+        
+        return {
+            "total": total,
+            "by_status": {status: count for status, count in status_counts},
+            "recent_items": recent_items,
+            "recent_logs": recent_logs
+        }
+    return cached_response(request, "pipeline:stats", compute, PipelineStats, ttl=30, tags=[TAG_PIPELINE])
 
 @router.get("/items", response_model=List[PipelineItemResponse])
 def get_items(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     status: Optional[str] = None,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(PipelineItem)
+    """
+    Items by most recent activity. Pass the X-Next-Cursor response header back as
+    ?cursor= for the next page; skip is still honoured for old clients.
+    """
+    query = db.query(PipelineItem, ACTIVITY_KEY, PipelineItem.id)
     if status:
         query = query.filter(PipelineItem.status == status)
     if search:
-        query = query.filter(PipelineItem.fqdn.contains(search))
+        query = query.filter(fqdn_contains(PipelineItem.fqdn, PipelineItem.id, search))
     
     # Eager load relationships for performance
     from sqlalchemy.orm import joinedload
     query = query.options(joinedload(PipelineItem.crawl_result), joinedload(PipelineItem.analysis_result))
     
-    return query.order_by(PipelineItem.updated_at.desc()).offset(skip).limit(limit).all()
+    if skip and not cursor:
+        rows = query.order_by(ACTIVITY_KEY.desc(), PipelineItem.id.desc()).offset(skip).limit(limit).all()
+    else:
+        rows, next_cursor = keyset_page(query, ACTIVITY_KEY, PipelineItem.id, cursor, limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    return [row[0] for row in rows]
 
 @router.post("/items", response_model=PipelineItemResponse)
 def create_item(item: PipelineItemCreate, db: Session = Depends(get_db)):
+    """
+    Ad-hoc submission; MEDIUM unless the caller sets a priority (1 = CRITICAL
+    is served ahead of every feed/backlog class).
+    """
     db_item = PipelineItem(**item.dict(), status=PipelineStatus.DISCOVERED)
     db.add(db_item)
     db.commit()
     db.refresh(db_item)
+    invalidate(TAG_PIPELINE)
     return db_item
 
+@router.post("/analyze")
+async def analyze_now(req: AnalyzeRequest, wait: bool = False, stream: bool = True):
+    """
+    Analyst fast lane: crawl + analyse one domain now on reserved slots instead of
+    waiting for the batch ticks. A verdict younger than max_age_hours is returned as is;
+    concurrent requests for the same fqdn share one run.
+    wait=false: 202, runs in the background.
+    wait=true: NDJSON progress (crawling, crawled, waiting, analyzing) ending in
+    verdict / failed / blocked, or pending after FAST_LANE_WAIT_SECONDS;
+    with stream=false only that last object is returned.
+    """
+    from app.services.fast_lane import fast_lane
+    from app.services.verdict_index import normalize_fqdn, is_valid_fqdn
+    from app.core.config import get_settings
+    fqdn = normalize_fqdn(req.fqdn)
+    if not is_valid_fqdn(fqdn):
+        raise HTTPException(status_code=400, detail="Invalid fqdn")
+
+    cached = None if req.force else await asyncio.to_thread(fast_lane.cached_verdict, fqdn, req.max_age_hours)
+    if cached is None:
+        run, coalesced = fast_lane.start(fqdn)
+    if not wait:
+        if cached:
+            return cached
+        return JSONResponse(status_code=202, content={"event": "accepted", "fqdn": fqdn, "coalesced": coalesced})
+
+    timeout = get_settings().FAST_LANE_WAIT_SECONDS
+    if not stream:
+        if cached:
+            return cached
+        last = None
+        async for event in run.follow(timeout):
+            last = event
+        return last
+
+    async def generate():
+        if cached:
+            yield json.dumps(cached) + "\n"
+            return
+        yield json.dumps({"event": "accepted", "fqdn": fqdn, "coalesced": coalesced}) + "\n"
+        async for event in run.follow(timeout):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@router.get("/analyze/in_flight")
+def get_fast_lane_runs():
+    from app.services.fast_lane import fast_lane
+    return fast_lane.in_flight()
+
+@router.get("/items/{item_id}/logs", response_model=List[PipelineLogResponse])
+def get_item_logs(item_id: int, include_archive: bool = False, db: Session = Depends(get_db)):
+    """
+    An item's log timeline, oldest first. Rows past the retention window live in
+    compressed daily archives and are only read with include_archive=true.
+    """
+    logs = db.query(PipelineLog).filter(PipelineLog.item_id == item_id).order_by(PipelineLog.id.asc()).all()
+    if not include_archive:
+        return logs
+    from app.services.log_retention import log_retention
+    hot_ids = {log.id for log in logs}
+    archived = [dict(row, archived=True) for row in log_retention.archived_logs(item_id) if row["id"] not in hot_ids]
+    return archived + logs
+
+@router.get("/logs/archives")
+def get_log_archives():
+    from app.services.log_retention import log_retention
+    return log_retention.partitions()
+
+@router.get("/control/status")
+def get_orchestrator_status():
+    from app.services.orchestrator import orchestrator
+    return orchestrator.get_status()
+
+@router.post("/control/drain")
+async def drain_pipeline(deadline_seconds: Optional[float] = None):
+    """
+    Stop claiming new work and wait (up to deadline_seconds, default DRAIN_DEADLINE_SECONDS)
+    for in-flight items; leftovers are released back to their queue. Lift with /control/resume.
+    """
+    from app.services.orchestrator import orchestrator
+    return await orchestrator.drain(deadline_seconds)
+
+@router.post("/control/resume")
+def resume_pipeline():
+    from app.services.orchestrator import orchestrator
+    orchestrator.resume()
+    return orchestrator.get_status()
+
+@router.post("/control/log_rollover")
+async def run_log_rollover():
+    """Archive and delete logs past LOG_RETENTION_DAYS now instead of waiting for the hourly job."""
+    from app.services.log_retention import log_retention
+    return await asyncio.to_thread(log_retention.rollover)
+
 @router.post("/control/flush_failed")
 def flush_failed(db: Session = Depends(get_db)):
-    """Reset failed items to QUEUED"""
+    """
+    Make every failed item due for retry now. Retry budgets still apply, so exhausted
+    items go to MANUAL_REVIEW instead of being retried forever.
+    """
+    from datetime import datetime
+    from app.services.retry_policy import retry_policy
     updated = db.query(PipelineItem).filter(
         PipelineItem.status.in_([PipelineStatus.CRAWLED_FAIL, PipelineStatus.ANALYSIS_FAIL])
-    ).update({PipelineItem.status: PipelineStatus.QUEUED}, synchronize_session=False)
+    ).update({PipelineItem.next_retry_at: datetime.now()}, synchronize_session=False)
+    db.commit()
+    promoted = retry_policy.promote_due()
+    return {"status": "ok", "requeued": promoted, "failed_items": updated}
+
+@router.post("/items/{item_id}/retry", response_model=PipelineItemResponse)
+def retry_item(item_id: int, db: Session = Depends(get_db)):
+    """Manually retry one item (including MANUAL_REVIEW): resets its retry budget and requeues it."""
+    from app.services.retry_policy import retry_policy
+    item = db.query(PipelineItem).filter(PipelineItem.id == item_id).first()
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if item.status not in (PipelineStatus.CRAWLED_FAIL, PipelineStatus.ANALYSIS_FAIL,
+                           PipelineStatus.MANUAL_REVIEW, PipelineStatus.QUEUED):
+        raise HTTPException(status_code=409, detail=f"Item is {item.status}, not failed")
+    retry_policy.retry_now(db, item)
     db.commit()
+    db.refresh(item)
+    invalidate(TAG_PIPELINE)
+    return item
+
 @router.get("/stats/bottlenecks")
 def get_bottlenecks(db: Session = Depends(get_db)):
     """
@@ -94,11 +242,60 @@ def get_bottlenecks(db: Session = Depends(get_db)):
         "sample_stuck_items": stuck_items
     }
 
+@router.get("/stats/classes")
+def get_class_stats(request: Request, db: Session = Depends(get_db)):
+    """
+    Per (queue, priority, source) class: depth, oldest wait, scheduler weight and items served.
+    """
+    from app.services.fair_scheduler import fair_scheduler
+    return cached_response(request, "pipeline:classes", lambda: fair_scheduler.class_stats(db), List[dict], ttl=10)
+
+@router.get("/stats/stages")
+def get_stage_timings(hours: int = 24, db: Session = Depends(get_db)):
+    """
+    Dwell-time percentiles per stage (queue wait, service time, total) from the stage timeline.
+    """
+    from app.services.stage_timeline import stage_timeline
+    return stage_timeline.stage_summary(db, hours=hours)
+
+@router.get("/stats/slowest")
+def get_slowest_items(stage: str = "CRAWL", hours: int = 24, limit: int = 20, db: Session = Depends(get_db)):
+    from app.services.stage_timeline import stage_timeline, STAGES
+    stage = stage.upper()
+    if stage not in STAGES:
+        raise HTTPException(status_code=400, detail=f"stage must be one of {', '.join(STAGES)}")
+    return stage_timeline.slowest_items(db, stage, hours=hours, limit=min(limit, 200))
+
+@router.get("/stats/slowest_hosts")
+def get_slowest_hosts(stage: str = "CRAWL", hours: int = 24, limit: int = 20, min_items: int = 3,
+                      db: Session = Depends(get_db)):
+    """
+    Hosts (registrable domains) with the highest average stage duration.
+    """
+    from app.services.stage_timeline import stage_timeline, STAGES
+    stage = stage.upper()
+    if stage not in STAGES:
+        raise HTTPException(status_code=400, detail=f"stage must be one of {', '.join(STAGES)}")
+    return stage_timeline.slowest_hosts(db, stage, hours=hours, limit=min(limit, 200), min_items=max(min_items, 1))
+
+@router.get("/stats/history", response_model=List[SystemMetricResponse])
+def get_metric_history(hours: int = 24, db: Session = Depends(get_db)):
+    """
+    Sampled SystemMetric rows (one per minute) for the health dashboard charts.
+    Live histograms are at /metrics.
+    """
+    from app.services.metrics_service import metrics_sampler
+    return metrics_sampler.history(db, hours=min(max(hours, 1), 24 * 30))
+
 @router.get("/health", response_model=SystemHealth)
-def get_system_health(db: Session = Depends(get_db)):
+def get_system_health(request: Request, db: Session = Depends(get_db)):
     """
-    Detailed system health check for all components
+    Detailed system health check for all components.
+    Served from cache for a few seconds: component ages move with time, not with writes.
     """
+    return cached_response(request, "pipeline:health", lambda: _compute_health(db), SystemHealth, ttl=5)
+
+def _compute_health(db: Session) -> SystemHealth:
     from app.services.orchestrator import orchestrator
     from app.services.llm_service import llm_service
     from sqlalchemy import text  # Import text for SQL query
@@ -111,7 +308,7 @@ def get_system_health(db: Session = Depends(get_db)):
     orch_status = orchestrator.get_status()
     components.append(ComponentStatus(
         name="Orchestrator",
-        status="operational" if orch_status["is_running"] else "stopped",
+        status=("draining" if orch_status["draining"] else "operational") if orch_status["is_running"] else "stopped",
         details=f"Uptime: {int(orch_status['uptime_seconds'])}s",
         last_check=now
     ))
@@ -154,7 +351,7 @@ def get_system_health(db: Session = Depends(get_db)):
     
     # 4. LLM Service
     llm_health = "operational"
-    llm_msg = f"Connected to {llm_service.model}"
+    llm_msg = f"Connected to {llm_service.local_model}"
     if not llm_service.base_url:
         llm_health = "down"
         llm_msg = "No active connection"
@@ -211,3 +408,64 @@ def get_system_health(db: Session = Depends(get_db)):
         status=system_status,
         components=components
     )
+
+# --- Live Events (server push) ---
+
+def _csv(value: Optional[str]) -> Optional[List[str]]:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+@router.get("/events")
+async def stream_events(types: Optional[str] = None, stages: Optional[str] = None, statuses: Optional[str] = None):
+    """
+    Server-Sent Events stream of pipeline activity.
+    types: comma list of status,log,tick (default all); stages filters log events (CRAWLER, LLM, ...);
+    statuses filters status events by new or previous status.
+    Slow clients get coalesced updates (latest status per item) rather than an unbounded backlog.
+    """
+    sub = event_bus.subscribe(types=_csv(types), stages=_csv(stages), statuses=_csv(statuses))
+
+    async def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                batch = await sub.get_batch(timeout=15)
+                if not batch:
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(f"event: {evt['type']}\ndata: {json.dumps(evt, default=str)}\n\n" for evt in batch)
+        finally:
+            event_bus.unsubscribe(sub)
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/ws")
+async def events_websocket(websocket: WebSocket, types: Optional[str] = None, stages: Optional[str] = None,
+                           statuses: Optional[str] = None):
+    """
+    WebSocket variant of /events. Messages are {"events": [...]} batches.
+    The client can change its filter at any time by sending {"types": [...], "stages": [...], "statuses": [...]}.
+    """
+    await websocket.accept()
+    sub = event_bus.subscribe(types=_csv(types), stages=_csv(stages), statuses=_csv(statuses))
+
+    async def receive_filters():
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if isinstance(message, dict):
+                sub.set_filter(message.get("types"), message.get("stages"), message.get("statuses"))
+
+    receiver = asyncio.create_task(receive_filters())
+    try:
+        while not receiver.done():
+            batch = await sub.get_batch(timeout=15)
+            # Sending awaits the client; meanwhile new events coalesce in the subscription buffer
+            await websocket.send_text(json.dumps({"events": batch}, default=str))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        event_bus.unsubscribe(sub)
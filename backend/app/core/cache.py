@@ -0,0 +1,184 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Cache tags: write paths invalidate these, cached endpoints declare which they depend on
+TAG_PIPELINE = "pipeline"    # item status transitions, new items
+TAG_KB = "kb"                # COMPLETED verdicts (index stage, KB edits)
+TAG_CATEGORIES = "categories"
+TAG_FEEDS = "feeds"
+
+class LocalBackend:
+    """
+    In-process store: key -> (expires_at, value), tag -> generation.
+    """
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._tags: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    def tag_versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._tags.get(tag, 0) for tag in tags)
+
+    def bump(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def clear(self):
+        self._entries.clear()
+
+class RedisBackend:
+    """
+    Same interface on Redis, so API workers in several processes share entries and invalidations.
+    """
+    PREFIX = "wintel:cache:"
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._redis.ping()
+
+    def get(self, key: str):
+        raw = self._redis.get(self.PREFIX + key)
+        if raw is None:
+            return None
+        etag, body, versions = json.loads(raw)
+        return etag, body.encode("utf-8"), tuple(versions)
+
+    def set(self, key: str, value, ttl: float):
+        etag, body, versions = value
+        payload = json.dumps([etag, body.decode("utf-8"), list(versions)])
+        self._redis.set(self.PREFIX + key, payload, px=int(ttl * 1000))
+
+    def tag_versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        tags = list(tags)
+        if not tags:
+            return ()
+        values = self._redis.mget([f"{self.PREFIX}tag:{t}" for t in tags])
+        return tuple(int(v or 0) for v in values)
+
+    def bump(self, tags: Iterable[str]):
+        pipe = self._redis.pipeline()
+        for tag in tags:
+            pipe.incr(f"{self.PREFIX}tag:{tag}")
+        pipe.execute()
+
+    def clear(self):
+        for key in self._redis.scan_iter(self.PREFIX + "*"):
+            self._redis.delete(key)
+
+class ResponseCache:
+    """
+    Serialized-response cache for hot read endpoints.
+    Entries expire after their TTL or as soon as one of their tags is invalidated
+    (tags are versioned, so invalidation is O(tags) and never scans entries).
+    Concurrent misses on the same key compute once.
+    """
+    def __init__(self):
+        settings = get_settings()
+        self.backend = LocalBackend()
+        if settings.CACHE_REDIS_URL:
+            try:
+                self.backend = RedisBackend(settings.CACHE_REDIS_URL)
+                logger.info("Response cache using Redis backend")
+            except Exception as e:
+                logger.warning(f"Redis cache unavailable ({e}), using in-process cache")
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _lookup(self, key: str, versions: Tuple[int, ...]):
+        entry = self.backend.get(key)
+        if entry is not None and entry[2] == versions:
+            return entry
+        return None
+
+    def get_or_compute(self, key: str, compute: Callable[[], bytes], ttl: float,
+                       tags: Iterable[str] = ()) -> Tuple[str, bytes]:
+        """
+        Returns (etag, body). compute() must return the serialized body.
+        """
+        tags = tuple(tags)
+        versions = self.backend.tag_versions(tags)
+        entry = self._lookup(key, versions)
+        if entry is None:
+            with self._key_lock(key):
+                entry = self._lookup(key, versions)
+                if entry is None:
+                    self.misses += 1
+                    body = compute()
+                    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+                    entry = (etag, body, versions)
+                    self.backend.set(key, entry, ttl)
+                    return etag, body
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def invalidate(self, *tags: str):
+        self.backend.bump(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+response_cache = ResponseCache()
+
+def invalidate(*tags: str):
+    """Invalidation hook for write paths; never lets a cache problem fail the write."""
+    try:
+        response_cache.invalidate(*tags)
+    except Exception as e:
+        logger.warning(f"Cache invalidation failed for {tags}: {e}")
+
+@lru_cache(maxsize=None)
+def _adapter(response_model) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+def cached_response(request: Request, key: str, compute: Callable[[], Any], response_model,
+                    ttl: float, tags: Iterable[str] = ()) -> Response:
+    """
+    Serve compute()'s result through the cache, validated/serialized with response_model.
+    Answers If-None-Match with 304 when the cached body is unchanged.
+    """
+    adapter = _adapter(response_model)
+
+    def serialize() -> bytes:
+        return adapter.dump_json(adapter.validate_python(compute(), from_attributes=True))
+
+    etag, body = response_cache.get_or_compute(key, serialize, ttl, tags)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
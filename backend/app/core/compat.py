@@ -0,0 +1,13 @@
+"""
+Pydantic v2 compatibility patch for ChromaDB/LangChain (they still import pydantic.BaseSettings).
+Import before anything that imports chromadb: app.main, app.worker and the vector service's lazy
+connect do it first.
+"""
+import pydantic
+
+try:
+    from pydantic_settings import BaseSettings
+    if not hasattr(pydantic, 'BaseSettings'):
+        pydantic.BaseSettings = BaseSettings
+except ImportError:
+    pass
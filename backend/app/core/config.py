@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict, Optional
 import os
 
 class Settings(BaseSettings):
@@ -11,6 +12,75 @@ class Settings(BaseSettings):
     BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     DATABASE_URL: str = f"sqlite:///{BASE_DIR}/w_intel.db"
     
+    # Response cache: in-process by default, shared across workers when a Redis URL is set
+    CACHE_REDIS_URL: Optional[str] = None
+    
+    # PipelineLog retention: rows older than this move to compressed daily archives
+    LOG_RETENTION_DAYS: int = 14
+    # Archive files older than this are deleted (0 = keep forever)
+    LOG_ARCHIVE_RETENTION_DAYS: int = 365
+    
+    # Fair-share scheduling: batch share per PriorityLevel (CRITICAL is always served first)
+    # and relative weight per source family ("feed", "manual", "tranco", ...; default 1.0)
+    SCHED_PRIORITY_WEIGHTS: Dict[int, float] = {2: 6.0, 3: 3.0, 4: 1.0}
+    SCHED_SOURCE_WEIGHTS: Dict[str, float] = {}
+    
+    # Analyze-now fast lane (POST /pipeline/analyze): its own crawl/LLM concurrency,
+    # how old a verdict may be and still be returned, how long a request waits, and how long
+    # a run keeps following an item that makes no progress (no workers, stalled status)
+    FAST_LANE_CRAWL_SLOTS: int = 2
+    FAST_LANE_LLM_SLOTS: int = 2
+    FAST_LANE_FRESH_HOURS: float = 24.0
+    FAST_LANE_WAIT_SECONDS: float = 60.0
+    FAST_LANE_MAX_SECONDS: float = 600.0
+    
+    # Run the pipeline stages inside the API process. Set to false when they run as
+    # separate `python -m app.worker --role ...` processes; the API is then read/control only
+    EMBEDDED_WORKERS: bool = True
+    
+    # Post-crawl CPU work (hashing, title extraction): pool processes (0 = cores - 1);
+    # pages smaller than the inline threshold are handled in a thread instead
+    POSTPROCESS_WORKERS: int = 0
+    POSTPROCESS_INLINE_BYTES: int = 256 * 1024
+    
+    # Embedding backend: "torch" (SentenceTransformer, fp32), "onnx" or "onnx-int8" (ONNX Runtime,
+    # model exported to EMBEDDING_ONNX_DIR by tools/export_onnx_embedder.py). Check retrieval
+    # agreement with tools/benchmark_embeddings.py before switching an existing KB.
+    # EMBEDDING_THREADS: intra-op threads per process (0 = all cores)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_DIR: str = "data/models/all-MiniLM-L6-v2-onnx"
+    EMBEDDING_THREADS: int = 0
+    
+    # Shared embedding server (python -m app.services.embedding_server): a Unix socket path or
+    # host:port. Empty = each process loads its own model. With fallback, a process whose
+    # server is unreachable loads the model locally instead of failing its embeddings
+    EMBEDDING_SERVER: str = ""
+    EMBEDDING_SERVER_FALLBACK: bool = True
+    # Server side: requests arriving within max-wait of each other share one model call
+    # (up to max-batch texts); recently embedded texts are answered from an LRU cache
+    EMBEDDING_MAX_BATCH: int = 256
+    EMBEDDING_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_CACHE_SIZE: int = 20000
+    
+    # Chunked evidence vectors: crawl evidence is split into ~KB_CHUNK_TOKENS chunks (at most
+    # KB_CHUNK_MAX_PER_DOMAIN), each distinct chunk embedded once and mapped to its domains in
+    # kb_chunk_refs. At query time chunk hits are aggregated per domain; chunks shared by more
+    # than KB_CHUNK_BOILERPLATE_REFS domains are treated as boilerplate and ignored
+    KB_CHUNKS_ENABLED: bool = True
+    KB_CHUNK_TOKENS: int = 128
+    KB_CHUNK_MAX_PER_DOMAIN: int = 24
+    KB_CHUNK_EVIDENCE_CHARS: int = 8000
+    KB_CHUNK_BOILERPLATE_REFS: int = 25
+
+    # SQL <-> vector KB reconciliation (kb_reconcile): how often the diff runs, changes applied
+    # per checkpointed batch, and the most changes one run applies before leaving the rest to the next
+    KB_RECONCILE_INTERVAL_MINUTES: int = 60
+    KB_RECONCILE_BATCH_SIZE: int = 500
+    KB_RECONCILE_MAX_CHANGES: int = 2000
+    
+    # Graceful shutdown: how long in-flight crawls/analyses get to finish before their leases are released
+    DRAIN_DEADLINE_SECONDS: float = 25.0
+    
     class Config:
         env_file = ".env"
 
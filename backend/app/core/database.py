@@ -1,11 +1,14 @@
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 
 engine = create_engine(
-    settings.DATABASE_URL, 
+    settings.DATABASE_URL,
     connect_args={"check_same_thread": False},
     pool_size=100,
     max_overflow=50
@@ -19,3 +22,105 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def ensure_schema():
+    """
+    Create missing tables and add columns introduced after the DB was created.
+    SQLite has no migrations here, so new nullable columns are added with ALTER TABLE.
+    """
+    from app.models.pipeline import Base
+    # Import all model modules so their tables are registered on Base.metadata
+    import app.models.category  # noqa: F401
+    import app.models.feed  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        # Read index names directly: reflection skips expression indexes, so checkfirst can't be used
+        existing_indexes = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))}
+        created_indexes = False
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+                logger.info(f"Schema: added column {table.name}.{column.name}")
+            # create_all() skips indexes on tables that already exist
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    created_indexes = True
+                    logger.info(f"Schema: created index {index.name}")
+        ensure_fqdn_search(conn)
+        ensure_kb_search(conn)
+
+        # Planner statistics: without them SQLite prefers the status index over the
+        # keyset-pagination indexes and sorts the whole result set
+        has_stats = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'")).first()
+        if created_indexes or not has_stats:
+            conn.execute(text("ANALYZE"))
+        else:
+            conn.execute(text("PRAGMA optimize"))
+
+FQDN_FTS_TABLE = "pipeline_items_fts"
+_fqdn_fts_enabled = None
+
+def ensure_fqdn_search(conn):
+    """
+    FTS5 trigram index over pipeline_items.fqdn for substring search,
+    kept in sync by triggers. Skipped when SQLite lacks the trigram tokenizer (< 3.34).
+    """
+    global _fqdn_fts_enabled
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"), {"name": FQDN_FTS_TABLE}).first()
+    try:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FQDN_FTS_TABLE} USING fts5("
+            f"fqdn, content='pipeline_items', content_rowid='id', tokenize='trigram')"))
+    except Exception as e:
+        logger.warning(f"FTS5 trigram search unavailable, falling back to LIKE: {e}")
+        _fqdn_fts_enabled = False
+        return
+
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FQDN_FTS_TABLE}_ai AFTER INSERT ON pipeline_items BEGIN
+            INSERT INTO {FQDN_FTS_TABLE}(rowid, fqdn) VALUES (new.id, new.fqdn);
+        END"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FQDN_FTS_TABLE}_ad AFTER DELETE ON pipeline_items BEGIN
+            INSERT INTO {FQDN_FTS_TABLE}({FQDN_FTS_TABLE}, rowid, fqdn) VALUES ('delete', old.id, old.fqdn);
+        END"""))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FQDN_FTS_TABLE}_au AFTER UPDATE OF fqdn ON pipeline_items BEGIN
+            INSERT INTO {FQDN_FTS_TABLE}({FQDN_FTS_TABLE}, rowid, fqdn) VALUES ('delete', old.id, old.fqdn);
+            INSERT INTO {FQDN_FTS_TABLE}(rowid, fqdn) VALUES (new.id, new.fqdn);
+        END"""))
+    if not exists:
+        logger.info("Schema: building fqdn trigram index...")
+        conn.execute(text(f"INSERT INTO {FQDN_FTS_TABLE}({FQDN_FTS_TABLE}) VALUES ('rebuild')"))
+    _fqdn_fts_enabled = True
+
+def fqdn_fts_enabled() -> bool:
+    global _fqdn_fts_enabled
+    if _fqdn_fts_enabled is None:
+        with engine.connect() as conn:
+            _fqdn_fts_enabled = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"), {"name": FQDN_FTS_TABLE}).first() is not None
+    return _fqdn_fts_enabled
+
+KB_FTS_TABLE = "kb_fts"
+
+def ensure_kb_search(conn):
+    """
+    FTS5 index over analysed domains (rowid = pipeline_items.id): fqdn, page title,
+    LLM summary and condensed crawl text. Filled by the index stage (app.services.kb_search).
+    """
+    try:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {KB_FTS_TABLE} USING fts5("
+            f"fqdn, title, summary, evidence, tokenize='unicode61 remove_diacritics 2')"))
+    except Exception as e:
+        logger.warning(f"FTS5 unavailable, KB keyword search disabled: {e}")
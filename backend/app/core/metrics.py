@@ -0,0 +1,211 @@
+"""
+Minimal Prometheus-style metrics (text exposition format 0.0.4).
+Observations are a dict lookup plus a bisect under a lock, cheap enough for per-item hot paths.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-ms commits up to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Gauge(_Metric):
+    """
+    Either set() explicitly or backed by a callback returning {label-tuple: value} at scrape time.
+    """
+    kind = "gauge"
+
+    def __init__(self, *args, callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        values = dict(self._values)
+        if self.callback:
+            try:
+                values.update(self.callback())
+            except Exception:
+                pass
+        lines = self.header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels) -> Tuple[List[int], float, int]:
+        """
+        Copy of (bucket counts, sum, count) for one label set; all label sets merged if none given.
+        """
+        with self._lock:
+            if labels:
+                series = self._series.get(self._key(labels))
+                return (list(series[0]), series[1], series[2]) if series else ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts = [0] * (len(self.buckets) + 1)
+            total, n = 0.0, 0
+            for bucket_counts, s, c in self._series.values():
+                counts = [a + b for a, b in zip(counts, bucket_counts)]
+                total += s
+                n += c
+            return counts, total, n
+
+    def quantile(self, q: float, counts: List[int]) -> Optional[float]:
+        """
+        Estimate a quantile from (delta) bucket counts, interpolating inside the bucket.
+        """
+        n = sum(counts)
+        if not n:
+            return None
+        rank = q * n
+        seen = 0
+        for idx, c in enumerate(counts):
+            if seen + c >= rank and c:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                upper = self.buckets[idx] if idx < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * ((rank - seen) / c)
+            seen += c
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in sorted(self._series.items())]
+        for key, counts, total, n in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {n}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- Pipeline metrics ---
+
+QUEUE_WAIT = registry.register(Histogram(
+    "wintel_queue_wait_seconds", "Time an item waited in its queue before a stage claimed it", ["stage"],
+    buckets=(1, 5, 15, 30, 60, 300, 900, 1800, 3600, 4 * 3600, 12 * 3600, 24 * 3600, 7 * 24 * 3600)))
+CRAWL_FETCH = registry.register(Histogram(
+    "wintel_crawl_fetch_seconds", "Crawler page fetch duration", ["outcome"]))
+ARTIFACT_WRITE = registry.register(Histogram(
+    "wintel_artifact_write_seconds", "Time to write crawl artifacts to disk"))
+LLM_REQUEST = registry.register(Histogram(
+    "wintel_llm_request_seconds", "LLM request duration (end to end)", ["outcome"]))
+LLM_TTFT = registry.register(Histogram(
+    "wintel_llm_ttft_seconds", "LLM time to first token (model load + prompt evaluation, as reported by Ollama)"))
+LLM_TOKENS = registry.register(Counter(
+    "wintel_llm_tokens_total", "Tokens processed by the LLM", ["kind"]))
+DB_COMMIT = registry.register(Histogram(
+    "wintel_db_commit_seconds", "SQLAlchemy commit duration", ["stage"]))
+INDEX_BATCH = registry.register(Histogram(
+    "wintel_index_batch_seconds", "Keyword + vector indexing time per index batch"))
+FAST_LANE_LATENCY = registry.register(Histogram(
+    "wintel_fast_lane_seconds", "Analyze-now request latency, claim to final verdict", ["outcome"]))
+STAGE_ITEMS = registry.register(Counter(
+    "wintel_stage_items_total", "Items finished per stage and outcome", ["stage", "outcome"]))
+
+def commit(db, stage: str):
+    """db.commit() recorded under wintel_db_commit_seconds{stage}."""
+    with DB_COMMIT.time(stage=stage):
+        db.commit()
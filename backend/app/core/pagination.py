@@ -0,0 +1,64 @@
+import base64
+import json
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, text, tuple_
+
+from app.core.database import FQDN_FTS_TABLE, fqdn_fts_enabled
+
+# Counting stops here; larger result sets report the cap and total_is_estimate=True
+COUNT_CAP = 10000
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    """
+    Opaque keyset cursor: the raw sort-column value and id of the last row returned.
+    """
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_page(query, sort_key, id_column, cursor: Optional[str], limit: int):
+    """
+    Apply descending keyset pagination on (sort_key, id) to a query whose last two
+    selected columns are sort_key and id_column. Fetches limit + 1 rows to detect the next page.
+    Returns (rows, next_cursor).
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(sort_key, id_column) < tuple_(sort_value, row_id))
+    rows = query.order_by(sort_key.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+    return rows, next_cursor
+
+def capped_count(query, cap: int = COUNT_CAP) -> Tuple[int, bool]:
+    """
+    Count at most cap + 1 matching rows. Returns (total, is_estimate).
+    """
+    subquery = query.order_by(None).limit(cap + 1).subquery()
+    total = query.session.execute(select(func.count()).select_from(subquery)).scalar()
+    if total > cap:
+        return cap, True
+    return total, False
+
+def fqdn_contains(fqdn_column, id_column, search: str):
+    """
+    Substring filter on fqdn. Uses the trigram index when available
+    (it needs at least 3 characters), otherwise a LIKE scan.
+    """
+    if len(search) >= 3 and fqdn_fts_enabled():
+        phrase = '"' + search.replace('"', '""') + '"'
+        matches = text(f"SELECT rowid FROM {FQDN_FTS_TABLE} WHERE {FQDN_FTS_TABLE} MATCH :q").bindparams(q=phrase)
+        return id_column.in_(matches)
+    return fqdn_column.ilike(f"%{search}%")
@@ -1,15 +1,7 @@
 import logging
 
-# --- Pydantic v2 Compatibility Patch for ChromaDB/LangChain ---
-# Must be applied BEFORE any module imports chromadb
-import pydantic
-try:
-    from pydantic_settings import BaseSettings
-    if not hasattr(pydantic, 'BaseSettings'):
-        pydantic.BaseSettings = BaseSettings
-except ImportError:
-    pass
-# --------------------------------------------------------------
+# Pydantic v2 compatibility patch for ChromaDB; must be applied BEFORE any module imports chromadb
+from app.core import compat  # noqa: F401
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -25,6 +17,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.get("/")
@@ -36,6 +29,14 @@ def health_check():
     # TODO: Check DB Connection
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus text exposition of pipeline latency histograms and counters."""
+    from fastapi.responses import PlainTextResponse
+    from app.core.metrics import registry
+    import app.services.metrics_service  # registers scrape-time gauges
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 from app.api import pipeline, policies, intelligence
 from app.services.orchestrator import orchestrator
 
@@ -43,20 +44,37 @@ from app.services.orchestrator import orchestrator
 async def startup_event():
     from app.services.orchestrator import orchestrator
     from app.services.health_monitor import health_monitor
+    from app.core.database import ensure_schema
     import asyncio
     
-    # Start orchestrator
-    orchestrator.start()
+    # Bring older DB files up to the current models (new tables/columns)
+    ensure_schema()
     
-    # Start health monitor
-    asyncio.create_task(health_monitor.start())
+    # Open the vector store in the background: the API serves requests meanwhile,
+    # and only the first KB query (if it arrives first) waits for it
+    from app.services.vector_service import vector_service
+    asyncio.get_running_loop().run_in_executor(vector_service.read_executor, lambda: vector_service.collection)
     
-    logging.info("Application started with Orchestrator and Health Monitor")
+    from app.core.config import get_settings
+    if get_settings().EMBEDDED_WORKERS:
+        # Start orchestrator
+        orchestrator.start()
+        
+        # Start health monitor
+        asyncio.create_task(health_monitor.start())
+        
+        logging.info("Application started with Orchestrator and Health Monitor")
+    else:
+        # Stages run in `python -m app.worker` processes; keep only the read/control jobs here
+        orchestrator.start(roles=())
+        logging.info("Application started as read/control plane (pipeline workers run separately)")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     from app.services.health_monitor import health_monitor
     await health_monitor.stop()
+    # Let in-flight work finish (bounded) instead of cancelling it mid-crawl
+    await orchestrator.drain()
     orchestrator.stop()
     await orchestrator.crawler.stop()
 
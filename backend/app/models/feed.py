@@ -27,6 +27,8 @@ class FeedSource(Base):
     total_items_found = Column(Integer, default=0)
     last_status = Column(String, default="pending") # success, error, pending
     last_error = Column(String, nullable=True)
+    last_fetch_duration_ms = Column(Integer, nullable=True)
+    last_new_items = Column(Integer, nullable=True) # Yield of the most recent fetch
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
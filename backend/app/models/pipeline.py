@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
-from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, ForeignKey, Float, Index, JSON
+from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, ForeignKey, Float, Index, JSON, UniqueConstraint
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 
@@ -25,6 +25,7 @@ class PipelineStatus(str, Enum):
     INDEXING = "INDEXING"           # Adding to Vector DB
     COMPLETED = "COMPLETED"         # Successfully in KB
     ARCHIVED = "ARCHIVED"           # Old data, kept for record
+    MANUAL_REVIEW = "MANUAL_REVIEW" # Dead letter: retries exhausted or failure not retryable
 
 class PriorityLevel(int, Enum):
     CRITICAL = 1  # User manual request
@@ -52,6 +53,9 @@ class PipelineItem(Base):
     retry_count = Column(Integer, default=0)
     max_retries = Column(Integer, default=3)
     next_retry_at = Column(DateTime, nullable=True) # For exponential backoff
+    last_error_class = Column(String, nullable=True) # DNS, TIMEOUT, TLS, HTTP_4XX, ... (see retry_policy)
+    lease_owner = Column(String, nullable=True) # "host:pid" of the worker holding it while CRAWLING/ANALYZING
+    lease_queued_at = Column(DateTime, nullable=True) # updated_at before the lease; restored on release (queue position)
     
     # Timestamps for "Bottleneck Detection"
     # If (now - updated_at) > Threshold AND status in [CRAWLING, ANALYZING], it's STUCK.
@@ -59,6 +63,16 @@ class PipelineItem(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), index=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
 
+    __table_args__ = (
+        # Keyset pagination for /pipeline/items: newest activity first, optionally per status
+        Index("ix_pipeline_items_activity", func.coalesce(updated_at, created_at), "id"),
+        Index("ix_pipeline_items_status_activity", "status", func.coalesce(updated_at, created_at), "id"),
+        # Retry dequeue: failed items whose backoff has elapsed
+        Index("ix_pipeline_items_status_retry", "status", "next_retry_at"),
+        # Fair-share dequeue: FIFO within each (priority, source) class of a stage queue
+        Index("ix_pipeline_items_sched", "status", "priority", "source", func.coalesce(updated_at, created_at)),
+    )
+
     # Relationships
     crawl_result = relationship("CrawlResult", uselist=False, back_populates="item")
     analysis_result = relationship("AnalysisResult", uselist=False, back_populates="item")
@@ -113,6 +127,12 @@ class AnalysisResult(Base):
     summary = Column(Text, nullable=True)
     
     analyzed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Keyset pagination for /kb/items, optionally per category
+        Index("ix_analysis_results_analyzed", "analyzed_at", "id"),
+        Index("ix_analysis_results_category_analyzed", "category_main", "analyzed_at", "id"),
+    )
     
     item = relationship("PipelineItem", back_populates="analysis_result")
 
@@ -124,16 +144,46 @@ class PipelineLog(Base):
     __tablename__ = "pipeline_logs"
 
     id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey("pipeline_items.id"))
+    item_id = Column(Integer, ForeignKey("pipeline_items.id"), index=True)
     
     stage = Column(String) # e.g., "CRAWLER", "LLM"
     level = Column(String) # INFO, ERROR, WARNING
     message = Column(Text)
     
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # Indexed for the retention rollover (rows older than LOG_RETENTION_DAYS are archived)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     item = relationship("PipelineItem", back_populates="logs")
 
+class StageTiming(Base):
+    """
+    Structured per-item timeline: one row per (item, stage), overwritten on re-runs.
+    Feeds dwell-time percentiles and the slowest items/hosts views (Bottleneck Inspector).
+    """
+    __tablename__ = "stage_timings"
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey("pipeline_items.id"), nullable=False)
+    stage = Column(String, nullable=False) # CRAWL, ANALYZE, INDEX
+    host = Column(String, index=True) # registrable domain, for per-host aggregation
+
+    enqueued_at = Column(DateTime, nullable=True) # entered the stage's input status
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    wait_ms = Column(Integer, nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+
+    outcome = Column(String) # ok, fail, timeout, http_404, ...
+    worker_id = Column(String)
+    bytes_in = Column(Integer, nullable=True) # crawl: content bytes
+    tokens = Column(Integer, nullable=True) # analyze: prompt + completion tokens
+
+    __table_args__ = (
+        UniqueConstraint("item_id", "stage", name="uq_stage_timings_item_stage"),
+        Index("ix_stage_timings_stage_finished", "stage", "finished_at"),
+        Index("ix_stage_timings_stage_duration", "stage", "duration_ms"),
+    )
+
 class SystemMetric(Base):
     """
     For the "Health" Dashboard.
@@ -153,6 +203,11 @@ class SystemMetric(Base):
     active_crawlers = Column(Integer)
     failed_last_hour = Column(Integer)
     
+    # Throughput / latency over the sampling interval (from app.core.metrics)
+    completed_per_minute = Column(Float, nullable=True)
+    llm_p50_ms = Column(Float, nullable=True)
+    llm_p95_ms = Column(Float, nullable=True)
+    
 class DomainFilter(Base):
     """
     Whitelist / Blacklist management.
@@ -165,3 +220,21 @@ class DomainFilter(Base):
     description = Column(String)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, server_default=func.now())
+
+class KBChunkRef(Base):
+    """
+    Which KB domains contain which evidence chunk. Chunk vectors live in the Chroma
+    chunk collection under chunk_hash and are shared by every domain with the same
+    chunk (templates, parking pages), so each distinct chunk is embedded and stored once.
+    """
+    __tablename__ = "kb_chunk_refs"
+
+    id = Column(Integer, primary_key=True)
+    chunk_hash = Column(String, nullable=False)
+    fqdn = Column(String, nullable=False, index=True)
+    position = Column(Integer) # chunk order within the domain's evidence
+
+    __table_args__ = (
+        # Also serves chunk -> domains lookups at query time
+        UniqueConstraint("chunk_hash", "fqdn", name="uq_kb_chunk_refs_chunk_fqdn"),
+    )
@@ -17,6 +17,7 @@ class PipelineStatus(str, Enum):
     INDEXING = "INDEXING"
     COMPLETED = "COMPLETED"
     ARCHIVED = "ARCHIVED"
+    MANUAL_REVIEW = "MANUAL_REVIEW"
 
 class PipelineItemBase(BaseModel):
     fqdn: str
@@ -26,6 +27,11 @@ class PipelineItemBase(BaseModel):
 class PipelineItemCreate(PipelineItemBase):
     pass
 
+class AnalyzeRequest(BaseModel):
+    fqdn: str
+    force: bool = False  # ignore a fresh cached verdict
+    max_age_hours: Optional[float] = None  # default FAST_LANE_FRESH_HOURS
+
 class CrawlResultRead(BaseModel):
     url: Optional[str]
     http_status: Optional[int]
@@ -45,6 +51,9 @@ class AnalysisResultRead(BaseModel):
 class PipelineItemResponse(PipelineItemBase):
     id: int
     status: PipelineStatus
+    retry_count: Optional[int] = 0
+    next_retry_at: Optional[datetime] = None
+    last_error_class: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
@@ -74,6 +83,7 @@ class PipelineLogResponse(BaseModel):
     level: str
     message: str
     timestamp: datetime
+    archived: bool = False
     class Config:
         from_attributes = True
 
@@ -92,3 +102,17 @@ class ComponentStatus(BaseModel):
 class SystemHealth(BaseModel):
     status: str # "healthy", "degraded", "critical"
     components: List[ComponentStatus]
+
+class SystemMetricResponse(BaseModel):
+    timestamp: datetime
+    cpu_usage_percent: Optional[float] = None
+    memory_usage_percent: Optional[float] = None
+    gpu_usage_percent: Optional[float] = None
+    pending_queue_size: Optional[int] = None
+    active_crawlers: Optional[int] = None
+    failed_last_hour: Optional[int] = None
+    completed_per_minute: Optional[float] = None
+    llm_p50_ms: Optional[float] = None
+    llm_p95_ms: Optional[float] = None
+    class Config:
+        from_attributes = True
@@ -0,0 +1,78 @@
+"""
+Splits crawl evidence into embedding-sized chunks for multi-vector KB indexing.
+
+Chunk boundaries are content-defined: paragraphs are packed up to the token budget,
+and a chunk may also end early (past half the budget) after a paragraph whose hash
+hits CUT_MODULUS. Boundaries therefore depend on the text around them, not on where
+the chunk started, so a shared page template (cookie banner, footer, parking page)
+produces the same chunks on every domain and is stored once (see kb_chunk_refs).
+There is no overlap between chunks for the same reason.
+"""
+import re
+import hashlib
+from typing import List, Tuple
+
+# MiniLM wordpieces per whitespace word on typical crawl text; the model reads at most 256
+TOKENS_PER_WORD = 1.3
+CUT_MODULUS = 4
+# Chunks shorter than this are not worth a vector (menus, "Home | About")
+MIN_CHUNK_TOKENS = 12
+
+_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK_RE = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_URL_RE = re.compile(r"https?://\S+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n|\n(?=\s*(?:#|[-*+] |\d+\. |\|))")
+
+def condense(text: str) -> str:
+    """Markdown crawl output minus images and link targets; paragraphs kept."""
+    text = _IMAGE_RE.sub(" ", text)
+    text = _LINK_RE.sub(r"\1", text)
+    return _URL_RE.sub(" ", text)
+
+def chunk_hash(text: str) -> str:
+    """Identity of a chunk across domains: case- and whitespace-insensitive."""
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8", errors="ignore")).hexdigest()
+
+def _tokens(words: int) -> int:
+    return int(words * TOKENS_PER_WORD)
+
+def _paragraphs(text: str, max_words: int) -> List[List[str]]:
+    paragraphs = []
+    for block in _PARAGRAPH_RE.split(text):
+        words = block.split()
+        # A paragraph longer than a chunk is cut into fixed word windows
+        for start in range(0, len(words), max_words):
+            paragraphs.append(words[start:start + max_words])
+    return [p for p in paragraphs if p]
+
+def chunk_document(text: str, chunk_tokens: int = 128, max_chunks: int = 24) -> List[Tuple[str, str]]:
+    """
+    [(chunk_hash, chunk_text)] in document order, identical chunks listed once.
+    """
+    if not text:
+        return []
+    max_words = max(int(chunk_tokens / TOKENS_PER_WORD), 8)
+    chunks: List[Tuple[str, str]] = []
+    seen = set()
+    current: List[str] = []
+
+    def flush():
+        if current and _tokens(len(current)) >= MIN_CHUNK_TOKENS:
+            chunk = " ".join(current)
+            digest = chunk_hash(chunk)
+            if digest not in seen:
+                seen.add(digest)
+                chunks.append((digest, chunk))
+        current.clear()
+
+    for paragraph in _paragraphs(condense(text), max_words):
+        if current and len(current) + len(paragraph) > max_words:
+            flush()
+        current.extend(paragraph)
+        at_cut = int(chunk_hash(" ".join(paragraph))[:8], 16) % CUT_MODULUS == 0
+        if len(current) >= max_words or (at_cut and len(current) >= max_words // 2):
+            flush()
+        if len(chunks) >= max_chunks:
+            return chunks
+    flush()
+    return chunks[:max_chunks]
@@ -2,7 +2,6 @@
 import logging
 import asyncio
 from typing import Optional, Dict, Any
-from crawl4ai import AsyncWebCrawler
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +22,8 @@ class CrawlerService:
 
         logger.info("🚀 Starting CrawlerService (Persistent Browser Session)...")
         try:
+            # Imported here: crawl4ai (and its browser stack) is only needed by the crawl stage
+            from crawl4ai import AsyncWebCrawler
             # Initialize AsyncWebCrawler
             # verbose=True helps with debugging, headless=True is default
             self.crawler = AsyncWebCrawler(verbose=True)
@@ -0,0 +1,254 @@
+"""
+Shared embedding server: one loaded model for the API, pipeline workers and tools.
+
+    python -m app.services.embedding_server                      # EMBEDDING_SERVER or data/embedding.sock
+    python -m app.services.embedding_server --address 127.0.0.1:8765
+
+Clients (RemoteEmbedder, selected by EMBEDDING_SERVER) send {"texts": [...]} frames.
+Requests that arrive within EMBEDDING_MAX_WAIT_MS of each other are answered by one
+model call of up to EMBEDDING_MAX_BATCH texts, duplicates embedded once, and recently
+seen texts come from an LRU cache without touching the model. {"op": "info"} returns
+the model name and model_id, dimension and batching/cache counters.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import struct
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.embeddings import DEFAULT_MODEL, MAX_FRAME_BYTES, local_embedder, parse_address
+
+logger = logging.getLogger("app.embedding_server")
+
+DEFAULT_ADDRESS = "data/embedding.sock"
+
+class EmbeddingBatcher:
+    """Dynamic batching + LRU cache in front of a (single-threaded) embedder."""
+    def __init__(self, embedder, max_batch: int = 256, max_wait_ms: float = 5.0, cache_size: int = 20000):
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        # The model runs on one thread: batches are serialized, the event loop keeps accepting requests
+        self._model_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-model")
+        self.dim: Optional[int] = None
+        self.stats = {"requests": 0, "texts": 0, "cache_hits": 0, "batches": 0, "batched_texts": 0, "model_seconds": 0.0}
+
+    def _cache_get(self, text: str):
+        vector = self._cache.get(text)
+        if vector is not None:
+            self._cache.move_to_end(text)
+        return vector
+
+    def _cache_put(self, text: str, vector):
+        if self.cache_size <= 0:
+            return
+        self._cache[text] = vector
+        self._cache.move_to_end(text)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def embed(self, texts: List[str]):
+        import numpy as np
+        self.stats["requests"] += 1
+        self.stats["texts"] += len(texts)
+        rows: Dict[str, object] = {}
+        missing = []
+        for text in texts:
+            if text in rows:
+                continue
+            vector = self._cache_get(text)
+            if vector is None:
+                missing.append(text)
+            else:
+                rows[text] = vector
+        self.stats["cache_hits"] += len(rows)
+        if missing or self.dim is None:
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((missing, future))
+            rows.update(zip(missing, await future))
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        return np.stack([rows[text] for text in texts]).astype("float32", copy=False)
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def run(self):
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            started = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(self._model_thread, self.embedder.embed, unique)
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(unique)} texts failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats["batches"] += 1
+            self.stats["batched_texts"] += len(unique)
+            self.stats["model_seconds"] += time.perf_counter() - started
+            self.dim = int(vectors.shape[1])
+            by_text = {}
+            for text, vector in zip(unique, vectors):
+                vector = vector.astype("float32", copy=True)
+                by_text[text] = vector
+                self._cache_put(text, vector)
+            for texts, future in batch:
+                if not future.done():
+                    future.set_result([by_text[text] for text in texts])
+
+    def info(self) -> dict:
+        batches = self.stats["batches"]
+        return {
+            "model": getattr(self.embedder, "model_name", None),
+            "model_id": getattr(self.embedder, "model_id", None),
+            "dim": self.dim,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "cache_size": len(self._cache),
+            "cache_capacity": self.cache_size,
+            "avg_batch": round(self.stats["batched_texts"] / batches, 1) if batches else 0.0,
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+        }
+
+    def close(self):
+        self._model_thread.shutdown(wait=False)
+        close = getattr(self.embedder, "close", None)
+        if close:
+            close()
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (size,) = struct.unpack(">I", await reader.readexactly(4))
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame too large ({size} bytes)")
+    return await reader.readexactly(size)
+
+def _frame(payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload)) + payload
+
+class EmbeddingServer:
+    def __init__(self, batcher: EmbeddingBatcher, address: str):
+        self.batcher = batcher
+        self.address = address
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._batcher_task: Optional[asyncio.Task] = None
+        self._socket_path: Optional[str] = None
+        self._clients: Set[asyncio.StreamWriter] = set()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        try:
+            while True:
+                try:
+                    request = json.loads(await _read_frame(reader))
+                except asyncio.IncompleteReadError:
+                    break
+                body = b""
+                try:
+                    if request.get("op") == "info":
+                        header = self.batcher.info()
+                    else:
+                        vectors = await self.batcher.embed([str(t) for t in request.get("texts", [])])
+                        header = {"n": int(vectors.shape[0]), "dim": int(vectors.shape[1])}
+                        body = vectors.astype("<f4", copy=False).tobytes()
+                except Exception as e:
+                    header = {"error": str(e)}
+                writer.write(_frame(json.dumps(header).encode("utf-8")) + _frame(body))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Embedding client dropped: {e}")
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def start(self):
+        self._batcher_task = asyncio.create_task(self.batcher.run())
+        target = parse_address(self.address)
+        if isinstance(target, tuple):
+            self._server = await asyncio.start_server(self._handle, host=target[0], port=target[1])
+        else:
+            # A socket file left by a crashed server would make bind() fail
+            if os.path.exists(target):
+                os.unlink(target)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            self._server = await asyncio.start_unix_server(self._handle, path=target)
+            self._socket_path = target
+        logger.info(f"Embedding server listening on {target} "
+                    f"(max_batch={self.batcher.max_batch}, max_wait={self.batcher.max_wait * 1000:.1f}ms)")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            # Idle client connections would otherwise keep wait_closed() (and the clients) waiting
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+        if self._batcher_task:
+            self._batcher_task.cancel()
+        if self._socket_path and os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+        self.batcher.close()
+
+async def serve(address: str, model_name: str):
+    from app.core.config import get_settings
+    settings = get_settings()
+    embedder = local_embedder(model_name=model_name, batch_size=settings.EMBEDDING_MAX_BATCH)
+    # Load before accepting connections so the first clients don't time out on the model load
+    warmup = embedder.embed(["warmup"])
+    batcher = EmbeddingBatcher(embedder, max_batch=settings.EMBEDDING_MAX_BATCH,
+                               max_wait_ms=settings.EMBEDDING_MAX_WAIT_MS, cache_size=settings.EMBEDDING_CACHE_SIZE)
+    batcher.dim = int(warmup.shape[1])
+    server = EmbeddingServer(batcher, address)
+    await server.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    logger.info(f"Embedding server stopping: {batcher.info()}")
+    await server.stop()
+
+def main():
+    from app.core.config import get_settings
+    parser = argparse.ArgumentParser(description="W-Intel shared embedding server")
+    parser.add_argument("--address", default=get_settings().EMBEDDING_SERVER or DEFAULT_ADDRESS,
+                        help="Unix socket path (relative to backend/) or host:port")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    asyncio.run(serve(args.address, args.model))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from typing import List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+# Backends selectable with EMBEDDING_BACKEND
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKEND_ONNX_INT8 = "onnx-int8"
+BACKENDS = (BACKEND_TORCH, BACKEND_ONNX, BACKEND_ONNX_INT8)
+
+def embedding_model_id(model_name: str = DEFAULT_MODEL, backend: str = BACKEND_TORCH) -> str:
+    """
+    Identity of the vector space an embedder produces (backend + model + quantization).
+    Stamped into KB metadata; vectors with a different stamp are re-embedded.
+    """
+    if backend == BACKEND_TORCH:
+        return f"sentence-transformers/{model_name}"
+    return f"onnx/{model_name}{'-int8' if backend == BACKEND_ONNX_INT8 else ''}"
+
+# Vectors written before model stamping were all produced by the torch model
+LEGACY_MODEL_ID = embedding_model_id(DEFAULT_MODEL, BACKEND_TORCH)
+
+def configured_model_id(model_name: str = DEFAULT_MODEL) -> str:
+    """model_id of the local embedder EMBEDDING_BACKEND selects, without loading it."""
+    from app.core.config import get_settings
+    return embedding_model_id(model_name, get_settings().EMBEDDING_BACKEND.lower())
+
+class SentenceTransformerEmbedder:
+    """
+    Batched SentenceTransformer inference for the Vector Store.
+    The model is loaded on first use; large inputs can optionally be spread
+    over a multi-process pool (one CPU worker per core).
+    """
+    def __init__(self, model_name: str = DEFAULT_MODEL, batch_size: int = 128,
+                 use_process_pool: bool = False, num_workers: Optional[int] = None, threads: int = 0):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.use_process_pool = use_process_pool
+        self.num_workers = num_workers or os.cpu_count() or 1
+        # Intra-op threads for torch (0 = torch default)
+        self.threads = threads
+        self._model = None
+        self._pool = None
+
+    @property
+    def model_id(self) -> str:
+        return embedding_model_id(self.model_name, BACKEND_TORCH)
+
+    def _get_model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            if self.threads:
+                import torch
+                torch.set_num_threads(self.threads)
+            logger.info(f"Loading embedding model {self.model_name}...")
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def _get_pool(self):
+        if self._pool is None:
+            model = self._get_model()
+            logger.info(f"Starting embedding process pool with {self.num_workers} workers")
+            self._pool = model.start_multi_process_pool(target_devices=["cpu"] * self.num_workers)
+        return self._pool
+
+    def embed(self, texts: List[str]):
+        """
+        Embed a list of texts. Returns a 2D numpy array (one row per text).
+        """
+        model = self._get_model()
+        if not texts:
+            import numpy as np
+            return np.zeros((0, model.get_sentence_embedding_dimension()), dtype="float32")
+
+        # The pool only pays off when every worker gets several batches
+        if self.use_process_pool and self.num_workers > 1 and len(texts) >= self.batch_size * self.num_workers:
+            return model.encode_multi_process(texts, self._get_pool(), batch_size=self.batch_size)
+
+        return model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+    def close(self):
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+class OnnxEmbedder:
+    """
+    The same model on ONNX Runtime, fp32 or dynamically int8-quantized (exported by
+    tools/export_onnx_embedder.py). Reproduces the SentenceTransformer pipeline: mean
+    pooling over the attention mask, then L2 normalisation. Texts are sorted by token
+    count and batched in that order, so each batch is padded only to its own longest text.
+    """
+    def __init__(self, model_dir: str, model_name: str = DEFAULT_MODEL, quantized: bool = True,
+                 batch_size: int = 128, threads: int = 0, max_length: int = 256):
+        self.model_dir = model_dir
+        self.model_name = model_name
+        self.quantized = quantized
+        self.batch_size = batch_size
+        self.threads = threads
+        self.max_length = max_length
+        # Kept for callers that tune the torch embedder (rebuild_kb --processes); unused here
+        self.use_process_pool = False
+        self._session = None
+        self._tokenizer = None
+        self._input_names = set()
+        self._dim: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return embedding_model_id(self.model_name, BACKEND_ONNX_INT8 if self.quantized else BACKEND_ONNX)
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.model_dir, "model_int8.onnx" if self.quantized else "model.onnx")
+
+    def _load(self):
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+            options = ort.SessionOptions()
+            # A fixed intra-op pool; inter-op parallelism buys nothing for one encoder graph
+            options.intra_op_num_threads = self.threads or os.cpu_count() or 1
+            options.inter_op_num_threads = 1
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            logger.info(f"Loading ONNX embedding model {self.model_path} ({options.intra_op_num_threads} threads)...")
+            session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.no_padding()
+            dim = session.get_outputs()[0].shape[-1]
+            self._dim = dim if isinstance(dim, int) else None
+            self._input_names = {i.name for i in session.get_inputs()}
+            self._tokenizer = tokenizer
+            self._session = session
+
+    def embed(self, texts: List[str]):
+        """
+        Embed a list of texts. Returns a 2D float32 numpy array (one row per text).
+        """
+        import numpy as np
+        self._load()
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self._dim or 0), dtype="float32")
+
+        encodings = self._tokenizer.encode_batch(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        out = None
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            width = max(len(encodings[i].ids) for i in rows)
+            input_ids = np.zeros((len(rows), width), dtype=np.int64)
+            attention = np.zeros((len(rows), width), dtype=np.int64)
+            for r, i in enumerate(rows):
+                ids = encodings[i].ids
+                input_ids[r, :len(ids)] = ids
+                attention[r, :len(ids)] = 1
+            feeds = {"input_ids": input_ids, "attention_mask": attention}
+            if "token_type_ids" in self._input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self._session.run(None, feeds)[0]
+            mask = attention[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            if out is None:
+                self._dim = pooled.shape[1]
+                out = np.empty((len(texts), self._dim), dtype=np.float32)
+            out[rows] = pooled
+        return out
+
+    def close(self):
+        pass
+
+def local_embedder(model_name: str = DEFAULT_MODEL, batch_size: int = 128, backend: Optional[str] = None):
+    """An in-process embedder for EMBEDDING_BACKEND (or the given backend)."""
+    from app.core.config import get_settings
+    settings = get_settings()
+    backend = (backend or settings.EMBEDDING_BACKEND).lower()
+    if backend in (BACKEND_ONNX, BACKEND_ONNX_INT8):
+        model_dir = settings.EMBEDDING_ONNX_DIR
+        if not os.path.isabs(model_dir):
+            model_dir = os.path.join(BACKEND_DIR, model_dir)
+        return OnnxEmbedder(model_dir, model_name=model_name, quantized=backend == BACKEND_ONNX_INT8,
+                            batch_size=batch_size, threads=settings.EMBEDDING_THREADS)
+    if backend != BACKEND_TORCH:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r} (expected one of {', '.join(BACKENDS)})")
+    return SentenceTransformerEmbedder(model_name=model_name, batch_size=batch_size, threads=settings.EMBEDDING_THREADS)
+
+# --- Embedding server client ---
+# Wire format (see app.services.embedding_server): every frame is a 4-byte big-endian
+# length + payload. Request: one JSON frame. Reply: a JSON header frame, then one frame
+# of n * dim little-endian float32.
+
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """'host:port' -> (host, port); anything else is a Unix socket path (relative to backend/)."""
+    host, sep, port = address.rpartition(":")
+    if sep and host and port.isdigit():
+        return host, int(port)
+    return address if os.path.isabs(address) else os.path.join(BACKEND_DIR, address)
+
+def send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(struct.pack(">I", len(payload)) + payload)
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        read = sock.recv_into(view[got:], n - got)
+        if not read:
+            raise ConnectionError("Embedding server closed the connection")
+        got += read
+    return bytes(buf)
+
+def recv_frame(sock: socket.socket) -> bytes:
+    (size,) = struct.unpack(">I", _recv_exact(sock, 4))
+    if size > MAX_FRAME_BYTES:
+        raise ConnectionError(f"Embedding server frame too large ({size} bytes)")
+    return _recv_exact(sock, size)
+
+class RemoteEmbedder:
+    """
+    Drop-in for SentenceTransformerEmbedder backed by the shared embedding server, so
+    the API, workers and tools use one loaded model. One connection per thread; texts
+    are sent in batch_size chunks and the server batches them with other clients'.
+    If the server is unreachable and fallback is on, the model is loaded locally.
+    """
+    def __init__(self, address: str, model_name: str = DEFAULT_MODEL, batch_size: int = 128,
+                 fallback: bool = True, timeout: float = 120.0):
+        self.address = address
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.fallback = fallback
+        self.timeout = timeout
+        # Kept for callers that tune the local embedder (rebuild_kb --processes); unused here
+        self.use_process_pool = False
+        self._local = threading.local()
+        self._fallback_embedder = None
+        self._model_id: Optional[str] = None
+        self._sockets: List[socket.socket] = []
+        self._lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        """The server's model_id (asked once), or the local fallback's."""
+        if self._fallback_embedder is not None:
+            return self._fallback_embedder.model_id
+        if self._model_id is None:
+            try:
+                self._model_id = self.info().get("model_id") or configured_model_id(self.model_name)
+            except OSError:
+                # What the fallback would load; not cached so a later call can reach the server
+                return configured_model_id(self.model_name)
+        return self._model_id
+
+    def _connect(self) -> socket.socket:
+        target = parse_address(self.address)
+        if isinstance(target, tuple):
+            sock = socket.create_connection(target, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(target)
+        with self._lock:
+            self._sockets.append(sock)
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            with self._lock:
+                if sock in self._sockets:
+                    self._sockets.remove(sock)
+            sock.close()
+
+    def _request(self, request: dict):
+        import numpy as np
+        # A pooled connection may have been closed by a server restart: retry once on a fresh one
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            fresh = sock is None
+            try:
+                if fresh:
+                    sock = self._local.sock = self._connect()
+                send_frame(sock, json.dumps(request).encode("utf-8"))
+                header = json.loads(recv_frame(sock))
+                body = recv_frame(sock)
+            except OSError:
+                self._drop_connection()
+                if fresh or attempt:
+                    raise
+                continue
+            if "error" in header:
+                raise RuntimeError(f"Embedding server error: {header['error']}")
+            if "n" not in header:
+                return header
+            return np.frombuffer(body, dtype="<f4").reshape(header["n"], header["dim"])
+
+    def info(self) -> dict:
+        return self._request({"op": "info"})
+
+    def _local_embedder(self):
+        with self._lock:
+            if self._fallback_embedder is None:
+                logger.warning(f"Embedding server {self.address} unreachable; loading {self.model_name} in this process")
+                self._fallback_embedder = local_embedder(self.model_name, batch_size=self.batch_size)
+            return self._fallback_embedder
+
+    def embed(self, texts: List[str]):
+        import numpy as np
+        if self._fallback_embedder is not None:
+            return self._fallback_embedder.embed(texts)
+        texts = list(texts)
+        try:
+            # An empty list is still sent: the reply carries the embedding dimension
+            chunks = [self._request({"texts": texts[i:i + self.batch_size]})
+                      for i in range(0, max(len(texts), 1), self.batch_size)]
+        except OSError:
+            if not self.fallback:
+                raise
+            return self._local_embedder().embed(texts)
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    def close(self):
+        with self._lock:
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local = threading.local()
+        if self._fallback_embedder is not None:
+            self._fallback_embedder.close()
+
+def get_embedder(model_name: str = DEFAULT_MODEL, batch_size: int = 128):
+    """The embedder for this process: the shared server when EMBEDDING_SERVER is set, else a local model."""
+    from app.core.config import get_settings
+    settings = get_settings()
+    if settings.EMBEDDING_SERVER:
+        return RemoteEmbedder(settings.EMBEDDING_SERVER, model_name=model_name, batch_size=batch_size,
+                              fallback=settings.EMBEDDING_SERVER_FALLBACK)
+    return local_embedder(model_name=model_name, batch_size=batch_size)
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event, func, inspect as sa_inspect
+
+from app.core.database import SessionLocal
+from app.models.pipeline import PipelineItem, PipelineLog
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("status", "log", "tick")
+# DB tail: rows per table per call, and how far each window reaches back
+TAIL_LIMIT = 2000
+TAIL_OVERLAP_SECONDS = 2
+
+class Subscription:
+    """
+    One connected client. Events are kept in a bounded, keyed buffer:
+    a newer status event for the same item replaces the queued one, so a slow
+    client sees the latest state instead of every intermediate transition.
+    When the buffer is full the oldest event is dropped and counted.
+    """
+    def __init__(self, types: Optional[Iterable[str]] = None, stages: Optional[Iterable[str]] = None,
+                 statuses: Optional[Iterable[str]] = None, max_pending: int = 1000):
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: "OrderedDict[object, dict]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self.set_filter(types, stages, statuses)
+
+    def set_filter(self, types=None, stages=None, statuses=None):
+        self.types: Set[str] = {t.lower() for t in types} if types else set(EVENT_TYPES)
+        self.stages: Optional[Set[str]] = {s.upper() for s in stages} if stages else None
+        self.statuses: Optional[Set[str]] = {s.upper() for s in statuses} if statuses else None
+
+    def matches(self, evt: dict) -> bool:
+        if evt["type"] not in self.types:
+            return False
+        if evt["type"] == "log" and self.stages is not None:
+            return (evt.get("stage") or "").upper() in self.stages
+        if evt["type"] == "status" and self.statuses is not None:
+            return evt["status"] in self.statuses or (evt.get("previous") or "") in self.statuses
+        return True
+
+    def offer(self, evt: dict, key):
+        if key in self._pending:
+            # Coalesce: keep the newest event, at its original position
+            self._pending[key] = evt
+        else:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[key] = evt
+        self._ready.set()
+
+    async def get_batch(self, timeout: Optional[float] = None) -> List[dict]:
+        """
+        Wait for events and return everything buffered. Returns [] on timeout (for heartbeats).
+        """
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self._ready.clear()
+        if self.dropped:
+            batch.append({"type": "dropped", "count": self.dropped, "ts": datetime.now().isoformat()})
+            self.dropped = 0
+        return batch
+
+class EventBus:
+    """
+    In-process fan-out of pipeline events to SSE/WebSocket clients.
+    Events come from committed SQLAlchemy sessions (status changes, new PipelineLog rows)
+    and from a periodic throughput tick, so clients never poll the database themselves.
+    Publishing is thread-safe: sessions committed in worker threads hand off to the loop.
+    """
+    def __init__(self):
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._transitions: Dict[str, int] = {}
+        self._last_tick: Optional[datetime] = None
+        # DB tail (pipeline stages in worker processes): session hooks stay quiet, tail() publishes
+        self.tail_mode = False
+        self._tail_log_id: Optional[int] = None
+        self._tail_ts: Optional[datetime] = None
+        self._tail_seen: Set[tuple] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self, **filters) -> Subscription:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        sub = Subscription(**filters)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        self._subscribers.discard(sub)
+
+    def publish(self, events: List[dict]):
+        if not events:
+            return
+        with self._lock:
+            for evt in events:
+                if evt["type"] == "status":
+                    self._transitions[evt["status"]] = self._transitions.get(evt["status"], 0) + 1
+        if not self._subscribers or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._dispatch(events)
+        else:
+            self._loop.call_soon_threadsafe(self._dispatch, events)
+
+    def _dispatch(self, events: List[dict]):
+        for sub in list(self._subscribers):
+            for evt in events:
+                if sub.matches(evt):
+                    sub.offer(evt, _event_key(evt))
+
+    def tick(self):
+        """
+        Throughput tick: one status GROUP BY per interval, shared by every client.
+        Runs in the scheduler's thread pool; skipped when nobody is listening.
+        """
+        now = datetime.now()
+        with self._lock:
+            transitions, self._transitions = self._transitions, {}
+        interval = (now - self._last_tick).total_seconds() if self._last_tick else None
+        self._last_tick = now
+        if not self._subscribers:
+            return
+
+        db = SessionLocal()
+        try:
+            counts = dict(db.query(PipelineItem.status, func.count(PipelineItem.id)).group_by(PipelineItem.status).all())
+        finally:
+            db.close()
+
+        rates = {}
+        if interval:
+            rates = {status: round(n * 60.0 / interval, 1) for status, n in transitions.items()}
+        self.publish([{
+            "type": "tick",
+            "ts": now.isoformat(),
+            "counts": counts,
+            "transitions": transitions,
+            "per_minute": rates
+        }])
+
+    def tail(self):
+        """
+        Bridge for workers in other processes: publish PipelineLog rows added and items
+        whose updated_at moved since the last call. Runs every second in the API process;
+        the watermarks reset while nobody is listening, so no backlog is replayed.
+        """
+        if not self._subscribers:
+            self._tail_log_id = self._tail_ts = None
+            return
+        db = SessionLocal()
+        try:
+            # First call with listeners: set the watermarks and remember the overlap window, publish nothing
+            priming = self._tail_log_id is None
+            if priming:
+                self._tail_log_id = db.query(func.max(PipelineLog.id)).scalar() or 0
+                self._tail_ts = datetime.now()
+                self._tail_seen = set()
+            events = []
+            logs = db.query(PipelineLog).filter(PipelineLog.id > self._tail_log_id)\
+                .order_by(PipelineLog.id.asc()).limit(TAIL_LIMIT).all()
+            for log in logs:
+                events.append({"type": "log", "id": log.id, "item_id": log.item_id, "stage": log.stage,
+                               "level": log.level, "message": log.message,
+                               "ts": log.timestamp.isoformat() if log.timestamp else None})
+            if logs:
+                self._tail_log_id = logs[-1].id
+
+            # Overlap the window a little: a row committed late may carry an earlier updated_at
+            rows = db.query(PipelineItem.id, PipelineItem.fqdn, PipelineItem.status, PipelineItem.updated_at)\
+                .filter(PipelineItem.updated_at > self._tail_ts - timedelta(seconds=TAIL_OVERLAP_SECONDS))\
+                .order_by(PipelineItem.updated_at.asc()).limit(TAIL_LIMIT).all()
+            seen = set()
+            for item_id, fqdn, status, updated_at in rows:
+                key = (item_id, updated_at)
+                seen.add(key)
+                if key in self._tail_seen:
+                    continue
+                events.append({"type": "status", "item_id": item_id, "fqdn": fqdn, "status": _status_value(status),
+                               "previous": None, "ts": updated_at.isoformat()})
+            if rows:
+                self._tail_ts = max(self._tail_ts, rows[-1][3].replace(tzinfo=None))
+            self._tail_seen = seen
+        finally:
+            db.close()
+        if not priming:
+            self.publish(events)
+
+def _event_key(evt: dict):
+    if evt["type"] == "status":
+        return ("status", evt["item_id"])
+    if evt["type"] == "tick":
+        return ("tick",)
+    return ("log", evt.get("id") or id(evt))
+
+event_bus = EventBus()
+
+# --- Session hooks: collect on flush, publish only what actually committed ---
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_events(session, flush_context):
+    pending = session.info.setdefault("bus_events", [])
+    now = datetime.now().isoformat()
+    for obj in session.new:
+        if isinstance(obj, PipelineLog):
+            pending.append({
+                "type": "log",
+                "id": obj.id,
+                "item_id": obj.item_id,
+                "stage": obj.stage,
+                "level": obj.level,
+                "message": obj.message,
+                "ts": now
+            })
+        elif isinstance(obj, PipelineItem):
+            pending.append({"type": "status", "item_id": obj.id, "fqdn": obj.fqdn,
+                            "status": _status_value(obj.status), "previous": None, "ts": now})
+    for obj in session.dirty:
+        if not isinstance(obj, PipelineItem):
+            continue
+        history = sa_inspect(obj).attrs.status.history
+        if history.has_changes() and history.added:
+            previous = history.deleted[0] if history.deleted else None
+            pending.append({"type": "status", "item_id": obj.id, "fqdn": obj.fqdn,
+                            "status": _status_value(history.added[0]), "previous": _status_value(previous), "ts": now})
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_events(session):
+    events = session.info.pop("bus_events", None)
+    if events and not event_bus.tail_mode:
+        try:
+            event_bus.publish(events)
+        except Exception as e:
+            logger.warning(f"Event bus publish failed: {e}")
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_events(session):
+    session.info.pop("bus_events", None)
+
+def _status_value(status):
+    if status is None:
+        return None
+    return getattr(status, "value", status)
@@ -0,0 +1,184 @@
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from sqlalchemy import case, func, or_
+
+from app.core.config import get_settings
+from app.models.pipeline import PipelineItem, PipelineStatus, PriorityLevel
+
+logger = logging.getLogger(__name__)
+
+# FIFO key inside a class; must match the expression in ix_pipeline_items_sched
+ACTIVITY = func.coalesce(PipelineItem.updated_at, PipelineItem.created_at)
+# Per-class queue depths are refreshed at most this often (one GROUP BY over the index)
+DEPTH_REFRESH_SECONDS = 30
+
+Class = Tuple[int, str]  # (priority, source)
+
+def source_family(source: str) -> str:
+    """'feed:PhishTank' -> 'feed'; weights are configured per family."""
+    return (source or "manual").split(":", 1)[0]
+
+class FairShareScheduler:
+    """
+    Picks work for the crawl and analysis batches.
+
+    CRITICAL items are always taken first (reserved headroom; the orchestrator's
+    critical lane also polls them every few seconds). The rest of each batch is
+    shared between (priority, source) classes with stride scheduling: every class
+    gets SCHED_PRIORITY_WEIGHTS[priority] split across the sources active at that
+    level (scaled by SCHED_SOURCE_WEIGHTS per source family), so a flood of HIGH
+    feed items slows the LOW backlog down but never stops it. Unused share is
+    redistributed (work conserving), and pass values persist across batches so
+    shares hold even with small batches.
+    """
+    def __init__(self):
+        self._pass: Dict[Tuple[str, Class], float] = {}
+        self._vtime: Dict[str, float] = {}
+        self._depths: Dict[str, Tuple[float, Dict[Class, int]]] = {}
+        self._served: Dict[Tuple[str, Class], int] = {}
+        self._lock = threading.Lock()
+
+    def _weights(self, classes: List[Class]) -> Dict[Class, float]:
+        settings = get_settings()
+        by_level: Dict[int, List[Class]] = {}
+        for cls in classes:
+            by_level.setdefault(cls[0], []).append(cls)
+        weights = {}
+        for level, members in by_level.items():
+            level_weight = settings.SCHED_PRIORITY_WEIGHTS.get(level, 1.0)
+            source_weights = {c: settings.SCHED_SOURCE_WEIGHTS.get(source_family(c[1]), 1.0) for c in members}
+            total = sum(source_weights.values()) or 1.0
+            for cls in members:
+                weights[cls] = max(level_weight * source_weights[cls] / total, 1e-6)
+        return weights
+
+    def depths(self, db, status: PipelineStatus, refresh: bool = False) -> Dict[Class, int]:
+        cached = self._depths.get(status.value)
+        if cached and not refresh and time.monotonic() - cached[0] < DEPTH_REFRESH_SECONDS:
+            return cached[1]
+        rows = db.query(PipelineItem.priority, PipelineItem.source, func.count(PipelineItem.id))\
+            .filter(PipelineItem.status == status)\
+            .group_by(PipelineItem.priority, PipelineItem.source).all()
+        depths = {(priority or PriorityLevel.MEDIUM, source or "manual"): n for priority, source, n in rows}
+        self._depths[status.value] = (time.monotonic(), depths)
+        return depths
+
+    def _allocate(self, stage: str, available: Dict[Class, int], slots: int) -> Dict[Class, int]:
+        weights = self._weights(list(available))
+        vtime = self._vtime.get(stage, 0.0)
+        alloc: Dict[Class, int] = {}
+        left = dict(available)
+        for cls in available:
+            # A class (re)joining starts at the current virtual time: no credit for idle periods
+            key = (stage, cls)
+            self._pass[key] = max(self._pass.get(key, vtime), vtime)
+        for _ in range(slots):
+            candidates = [c for c, n in left.items() if n > 0]
+            if not candidates:
+                break
+            cls = min(candidates, key=lambda c: self._pass[(stage, c)])
+            key = (stage, cls)
+            vtime = self._pass[key]
+            self._pass[key] += 1.0 / weights[cls]
+            alloc[cls] = alloc.get(cls, 0) + 1
+            left[cls] -= 1
+        self._vtime[stage] = vtime
+        return alloc
+
+    def _fetch(self, db, status: PipelineStatus, limit: int, priority=None, source=None) -> List[PipelineItem]:
+        query = db.query(PipelineItem).filter(PipelineItem.status == status)
+        # depths() counts NULL priority as MEDIUM and NULL source as "manual" (legacy/hand-inserted rows)
+        if priority is not None:
+            column = PipelineItem.priority
+            query = query.filter(or_(column == priority, column.is_(None)) if priority == PriorityLevel.MEDIUM
+                                 else column == priority)
+        if source is not None:
+            column = PipelineItem.source
+            query = query.filter(or_(column == source, column.is_(None)) if source == "manual" else column == source)
+        return query.order_by(ACTIVITY.asc(), PipelineItem.id.asc()).limit(limit).all()
+
+    def select_critical(self, db, status: PipelineStatus, limit: int) -> List[PipelineItem]:
+        items = self._fetch(db, status, limit, priority=PriorityLevel.CRITICAL)
+        self._count(status.value, [(PriorityLevel.CRITICAL.value, i.source or "manual") for i in items])
+        return items
+
+    def select(self, db, status: PipelineStatus, limit: int) -> List[PipelineItem]:
+        """
+        Up to limit items in status, CRITICAL first, then the weighted fair share.
+        """
+        with self._lock:
+            stage = status.value
+            items = self.select_critical(db, status, limit)
+            slots = limit - len(items)
+            if slots <= 0:
+                return items
+
+            depths = self.depths(db, status)
+            available = {c: n for c, n in depths.items() if c[0] != PriorityLevel.CRITICAL and n > 0}
+            picked: List[PipelineItem] = []
+            for (priority, source), k in self._allocate(stage, available, slots).items():
+                got = self._fetch(db, status, k, priority=priority, source=source)
+                # Keep cached depths honest between refreshes
+                depths[(priority, source)] = max(depths.get((priority, source), 0) - k, 0) if len(got) == k else 0
+                picked.extend(got)
+
+            if len(picked) < slots:
+                # Depths were stale (new classes arrived): fill the rest in plain priority order
+                seen = {i.id for i in items} | {i.id for i in picked}
+                query = db.query(PipelineItem).filter(PipelineItem.status == status)
+                if seen:
+                    query = query.filter(PipelineItem.id.notin_(list(seen)))
+                picked.extend(query.order_by(PipelineItem.priority.asc(), ACTIVITY.asc()).limit(slots - len(picked)).all())
+                self._depths.pop(stage, None)
+
+            self._count(stage, [(i.priority or PriorityLevel.MEDIUM, i.source or "manual") for i in picked])
+            return items + picked
+
+    def _count(self, stage: str, classes: List[Class]):
+        for cls in classes:
+            key = (stage, (int(cls[0]), cls[1]))
+            self._served[key] = self._served.get(key, 0) + 1
+
+    def class_stats(self, db) -> List[Dict]:
+        """
+        Queue depth, oldest wait and items served per (stage queue, priority, source).
+        """
+        now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = db.query(PipelineItem.status, PipelineItem.priority, PipelineItem.source,
+                        func.count(PipelineItem.id),
+                        func.min(case((PipelineItem.updated_at.is_(None), PipelineItem.created_at))),
+                        func.min(PipelineItem.updated_at))\
+            .filter(PipelineItem.status.in_([PipelineStatus.DISCOVERED, PipelineStatus.CRAWLED_SUCCESS]))\
+            .group_by(PipelineItem.status, PipelineItem.priority, PipelineItem.source).all()
+        weights = self._weights([(p or PriorityLevel.MEDIUM, s or "manual") for _, p, s, _, _, _ in rows
+                                 if p != PriorityLevel.CRITICAL])
+        result = []
+        for status, priority, source, depth, oldest_created, oldest_updated in rows:
+            priority = priority or PriorityLevel.MEDIUM
+            source = source or "manual"
+            # Oldest wait over never-touched items (created_at, UTC server default)
+            # and requeued ones (updated_at, local app time)
+            waits = []
+            if oldest_created:
+                waits.append((now_utc - oldest_created.replace(tzinfo=None)).total_seconds())
+            if oldest_updated:
+                waits.append((datetime.now() - oldest_updated.replace(tzinfo=None)).total_seconds())
+            status_value = getattr(status, "value", status)
+            result.append({
+                "queue": status_value,
+                "priority": int(priority),
+                "priority_name": PriorityLevel(int(priority)).name if int(priority) in PriorityLevel._value2member_map_ else str(priority),
+                "source": source,
+                "depth": depth,
+                "oldest_wait_seconds": int(max(waits)) if waits else None,
+                "weight": "reserved" if priority == PriorityLevel.CRITICAL else round(weights.get((priority, source), 0.0), 4),
+                "served_since_start": self._served.get((status_value, (int(priority), source)), 0)
+            })
+        result.sort(key=lambda r: (r["queue"], r["priority"], -r["depth"]))
+        return result
+
+fair_scheduler = FairShareScheduler()
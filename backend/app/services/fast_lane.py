@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.cache import invalidate, TAG_PIPELINE
+from app.core.metrics import FAST_LANE_LATENCY
+from app.models.pipeline import PipelineItem, AnalysisResult, PipelineLog, PipelineStatus, PriorityLevel
+from app.services.verdict_index import VERDICT_STATUSES
+from app.services.leases import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+# Owned by a running crawl/analysis task; the fast lane follows these instead of claiming
+ACTIVE_STATUSES = [PipelineStatus.CRAWLING, PipelineStatus.ANALYZING]
+FAILED_STATUSES = [PipelineStatus.CRAWLED_FAIL, PipelineStatus.ANALYSIS_FAIL, PipelineStatus.MANUAL_REVIEW]
+POLL_SECONDS = 0.5
+
+def _verdict(item: PipelineItem, analysis: AnalysisResult, cached: bool) -> Dict[str, Any]:
+    return {
+        "event": "verdict",
+        "fqdn": item.fqdn,
+        "item_id": item.id,
+        "cached": cached,
+        "category": analysis.category_main or "Unknown",
+        "is_malicious": bool(analysis.is_malicious),
+        "confidence": analysis.confidence_score or 0.0,
+        "summary": analysis.summary,
+        "analyzed_at": analysis.analyzed_at.isoformat() if analysis.analyzed_at else None,
+        "status": getattr(item.status, "value", item.status)
+    }
+
+class _Run:
+    """
+    One in-flight fast-lane analysis. Every request for the fqdn follows the same
+    run and receives the full event history, so late joiners see earlier progress.
+    """
+    def __init__(self, fqdn: str):
+        self.fqdn = fqdn
+        self.started = time.perf_counter()
+        # Past this the run stops polling for an outcome (FAST_LANE_MAX_SECONDS)
+        self.deadline = time.monotonic() + get_settings().FAST_LANE_MAX_SECONDS
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self.followers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def emit(self, event: str, final: bool = False, **data):
+        async with self._changed:
+            self.events.append({"event": event, "fqdn": self.fqdn,
+                                "elapsed_ms": int((time.perf_counter() - self.started) * 1000), **data})
+            self.done = self.done or final
+            self._changed.notify_all()
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    async def give_up(self, item_id: Optional[int], status=None):
+        await self.emit("pending", final=True, item_id=item_id, status=status,
+                        detail="No outcome within FAST_LANE_MAX_SECONDS; the item stays queued")
+
+    @property
+    def result(self) -> Optional[Dict[str, Any]]:
+        return self.events[-1] if self.done else None
+
+    async def follow(self, timeout: float) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield events as they happen; ends with the final event or, past timeout, a 'pending' event.
+        """
+        deadline = time.monotonic() + timeout
+        seen = 0
+        while True:
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait_for(lambda: self.done or len(self.events) > seen),
+                                           max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    yield {"event": "pending", "fqdn": self.fqdn,
+                           "elapsed_ms": int((time.perf_counter() - self.started) * 1000),
+                           "detail": "Still running; the verdict will appear on the item"}
+                    return
+                batch, seen = self.events[seen:], len(self.events)
+                finished = self.done
+            for event in batch:
+                yield event
+            if finished:
+                return
+
+class FastLane:
+    """
+    Synchronous "analyze now" path for analysts: crawl and analyse one domain right
+    away instead of waiting for the crawl/analysis ticks and their batches. Runs on
+    its own small crawl and LLM slot pools (FAST_LANE_*_SLOTS), so it never queues
+    behind bulk work. Requests for the same fqdn are coalesced into one run, and a
+    verdict younger than FAST_LANE_FRESH_HOURS is returned without any work.
+    """
+    def __init__(self):
+        self._runs: Dict[str, _Run] = {}
+        self._slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore, asyncio.Semaphore]] = None
+
+    def _semaphores(self) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            settings = get_settings()
+            self._slots = (loop, asyncio.Semaphore(settings.FAST_LANE_CRAWL_SLOTS),
+                           asyncio.Semaphore(settings.FAST_LANE_LLM_SLOTS))
+        return self._slots[1], self._slots[2]
+
+    def cached_verdict(self, fqdn: str, max_age_hours: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        hours = get_settings().FAST_LANE_FRESH_HOURS if max_age_hours is None else max_age_hours
+        if hours <= 0:
+            return None
+        # analyzed_at is UTC, but rows re-analysed by older versions hold local time; use the stricter cutoff
+        cutoff = max(datetime.now(), datetime.now(timezone.utc).replace(tzinfo=None)) - timedelta(hours=hours)
+        db = SessionLocal()
+        try:
+            row = db.query(PipelineItem, AnalysisResult)\
+                .join(AnalysisResult, PipelineItem.id == AnalysisResult.item_id)\
+                .filter(PipelineItem.fqdn == fqdn,
+                        PipelineItem.status.in_(VERDICT_STATUSES),
+                        AnalysisResult.analyzed_at >= cutoff).first()
+            return _verdict(row[0], row[1], cached=True) if row else None
+        finally:
+            db.close()
+
+    def start(self, fqdn: str) -> Tuple[_Run, bool]:
+        """
+        The run for fqdn, started if none is in flight. Returns (run, coalesced).
+        """
+        run = self._runs.get(fqdn)
+        if run is not None:
+            run.followers += 1
+            return run, True
+        run = self._runs[fqdn] = _Run(fqdn)
+        run.followers = 1
+        run.task = asyncio.create_task(self._execute(run))
+        run.task.add_done_callback(lambda _: self._runs.pop(fqdn, None) if self._runs.get(fqdn) is run else None)
+        return run, False
+
+    def in_flight(self) -> List[Dict[str, Any]]:
+        return [{"fqdn": run.fqdn, "followers": run.followers,
+                 "elapsed_ms": int((time.perf_counter() - run.started) * 1000),
+                 "last_event": run.events[-1]["event"] if run.events else None}
+                for run in self._runs.values()]
+
+    async def _execute(self, run: _Run):
+        try:
+            await self._analyze(run)
+        except Exception as e:
+            logger.error(f"Fast lane failed for {run.fqdn}: {e}", exc_info=True)
+            await run.emit("failed", final=True, error=str(e)[:200])
+        finally:
+            if not run.done:
+                await run.emit("failed", final=True, error="Fast lane run ended without a result")
+            FAST_LANE_LATENCY.observe(time.perf_counter() - run.started, outcome=run.result["event"])
+
+    def _claim(self, fqdn: str, reclaim_verdict: bool) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Take the item for the next stage it needs: (item_id, 'crawl' | 'analyze'), or
+        (item_id, None) if a worker owns it or it already has its outcome. Runs without
+        awaiting, so the batch loops and the critical lane in this process never claim
+        the same item.
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            item = db.query(PipelineItem).filter(PipelineItem.fqdn == fqdn).first()
+            if item is None:
+                item = PipelineItem(fqdn=fqdn, source="manual", priority=PriorityLevel.CRITICAL,
+                                    status=PipelineStatus.CRAWLING, updated_at=now)
+                db.add(item)
+                try:
+                    db.flush()
+                except IntegrityError:
+                    # Inserted concurrently (feed, another process); claim the existing row next time round
+                    db.rollback()
+                    return None, None
+                stage = "crawl"
+            elif item.status in ACTIVE_STATUSES:
+                return item.id, None
+            elif item.status == PipelineStatus.CRAWLED_SUCCESS:
+                item.status = PipelineStatus.ANALYZING
+                stage = "analyze"
+            elif not reclaim_verdict and (item.status in VERDICT_STATUSES or item.status in FAILED_STATUSES):
+                return item.id, None
+            else:
+                item.status = PipelineStatus.CRAWLING
+                stage = "crawl"
+            item.priority = PriorityLevel.CRITICAL
+            item.next_retry_at = None
+            item.lease_owner = WORKER_ID
+            item.lease_queued_at = item.updated_at
+            item.updated_at = now
+            db.add(PipelineLog(item_id=item.id, stage="FAST_LANE", level="INFO",
+                               message=f"Claimed for {stage} by analyze-now request"))
+            db.commit()
+            invalidate(TAG_PIPELINE)
+            return item.id, stage
+        finally:
+            db.close()
+
+    def _enqueue(self, fqdn: str) -> Optional[int]:
+        """
+        Worker-process mode: hand the item to the workers' critical lane as CRITICAL
+        (requeued for a fresh crawl unless it is in flight or already crawled).
+        """
+        db = SessionLocal()
+        try:
+            item = db.query(PipelineItem).filter(PipelineItem.fqdn == fqdn).first()
+            if item is None:
+                item = PipelineItem(fqdn=fqdn, source="manual", status=PipelineStatus.DISCOVERED)
+                db.add(item)
+                try:
+                    db.flush()
+                except IntegrityError:
+                    db.rollback()
+                    item = db.query(PipelineItem).filter(PipelineItem.fqdn == fqdn).first()
+                    if item is None:
+                        return None
+            elif item.status not in ACTIVE_STATUSES and item.status != PipelineStatus.CRAWLED_SUCCESS:
+                item.status = PipelineStatus.DISCOVERED
+                item.next_retry_at = None
+                item.updated_at = datetime.now()
+            item.priority = PriorityLevel.CRITICAL
+            db.add(PipelineLog(item_id=item.id, stage="FAST_LANE", level="INFO",
+                               message="Queued as CRITICAL by analyze-now request"))
+            db.commit()
+            invalidate(TAG_PIPELINE)
+            return item.id
+        finally:
+            db.close()
+
+    def _outcome(self, item_id: int) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        db = SessionLocal()
+        try:
+            row = db.query(PipelineItem, AnalysisResult)\
+                .outerjoin(AnalysisResult, PipelineItem.id == AnalysisResult.item_id)\
+                .filter(PipelineItem.id == item_id).first()
+            if not row:
+                return None, None
+            item, analysis = row
+            status = getattr(item.status, "value", item.status)
+            if item.status in VERDICT_STATUSES and analysis is not None:
+                return status, _verdict(item, analysis, cached=False)
+            if item.status in FAILED_STATUSES or item.status == PipelineStatus.BLOCKED:
+                return status, {"event": "failed", "item_id": item.id, "status": status,
+                                "error_class": item.last_error_class,
+                                "next_retry_at": item.next_retry_at.isoformat() if item.next_retry_at else None}
+            return status, None
+        finally:
+            db.close()
+
+    async def _analyze(self, run: _Run):
+        from app.services.orchestrator import orchestrator
+        from app.services.policy_service import policy_service
+        fqdn = run.fqdn
+        policy_service.ensure_loaded()
+        if policy_service.is_blocked(fqdn):
+            await run.emit("blocked", final=True, detail="Blocked by policy (OISD/DB)")
+            return
+
+        if not get_settings().EMBEDDED_WORKERS:
+            await self._follow_workers(run)
+            return
+
+        crawl_slots, llm_slots = self._semaphores()
+        reclaim_verdict = True
+        while True:
+            if orchestrator.draining:
+                await run.emit("failed", final=True, error="Pipeline is draining")
+                return
+            item_id, stage = self._claim(fqdn, reclaim_verdict)
+            reclaim_verdict = False
+            if stage == "crawl":
+                await run.emit("crawling", item_id=item_id)
+                async with crawl_slots:
+                    await orchestrator.process_crawl(item_id, fqdn, datetime.now())
+                status, final = self._outcome(item_id)
+                if final:
+                    await run.emit(final.pop("event"), final=True, **final)
+                    return
+                await run.emit("crawled", item_id=item_id, status=status)
+                continue
+            if stage == "analyze":
+                await run.emit("analyzing", item_id=item_id)
+                async with llm_slots:
+                    await orchestrator.process_analysis(item_id, fqdn, datetime.now())
+                _, final = self._outcome(item_id)
+                if final:
+                    await run.emit(final.pop("event"), final=True, **final)
+                    return
+                continue
+
+            # A batch worker owns the item (or the insert raced): follow it
+            if item_id is not None:
+                status, final = self._outcome(item_id)
+                if final:
+                    await run.emit(final.pop("event"), final=True, **final)
+                    return
+                # Left its worker without a usable outcome (e.g. requeued): claim it ourselves
+                reclaim_verdict = status not in ACTIVE_STATUSES
+                if not run.events or run.events[-1]["event"] != "waiting":
+                    await run.emit("waiting", item_id=item_id, status=status)
+            if run.expired:
+                await run.give_up(item_id, run.events[-1].get("status") if run.events else None)
+                return
+            await asyncio.sleep(POLL_SECONDS)
+
+    async def _follow_workers(self, run: _Run):
+        item_id = self._enqueue(run.fqdn)
+        if item_id is None:
+            await run.emit("failed", final=True, error="Could not queue the item")
+            return
+        await run.emit("queued", item_id=item_id)
+        last_status = None
+        while True:
+            status, final = self._outcome(item_id)
+            if final:
+                await run.emit(final.pop("event"), final=True, **final)
+                return
+            if status != last_status:
+                # Stage progress as seen in the DB (CRAWLING, CRAWLED_SUCCESS, ANALYZING, ...)
+                await run.emit("status", item_id=item_id, status=status)
+                last_status = status
+            if run.expired:
+                await run.give_up(item_id, status)
+                return
+            await asyncio.sleep(POLL_SECONDS)
+
+fast_lane = FastLane()
@@ -1,19 +1,40 @@
 import logging
+import asyncio
+import random
+import time
 import httpx
 import csv
 import io
+import json
 from datetime import datetime
+from typing import List, Optional
+from urllib.parse import urlparse
 from sqlalchemy.orm import Session
 from app.models.feed import FeedSource, FeedType
 from app.models.pipeline import PipelineItem, PipelineStatus, PipelineLog, PriorityLevel
 from app.core.database import SessionLocal
-import feedparser # Need to ensure this is installed, otherwise fallback or skip RSS for now
+from app.core.cache import invalidate, TAG_FEEDS, TAG_PIPELINE
 
 logger = logging.getLogger(__name__)
 
+# Keys commonly used by JSON threat feeds (PhishStats, URLHaus API, custom exports)
+JSON_URL_KEYS = ("url", "domain", "fqdn", "host", "hostname")
+# Keys holding plain lists of URLs/domains
+JSON_URL_LIST_KEYS = ("urls", "domains", "fqdns", "hosts", "hostnames")
+
 class FeedService:
+    def __init__(self):
+        # Scheduler settings: feeds are fetched concurrently, but never more than this many at once
+        self.max_concurrency = 8
+        self.fetch_timeout_seconds = 90
+        # Spread start times so feeds sharing an interval don't all fire on the same tick
+        self.max_jitter_seconds = 15
+        self._in_flight = set()
+
     async def fetch_feed(self, feed_id: int):
         db = SessionLocal()
+        feed = None
+        started = time.monotonic()
         try:
             feed = db.query(FeedSource).filter(FeedSource.id == feed_id).first()
             if not feed:
@@ -21,113 +42,256 @@ class FeedService:
                 return
 
             logger.info(f"Fetching feed: {feed.name} ({feed.url})")
-            
+
             # Update status
             feed.last_status = "fetching"
             db.commit()
 
-            new_items_count = 0
-            
             async with httpx.AsyncClient(verify=False, timeout=60.0) as client:
                 response = await client.get(feed.url)
-                
-                if response.status_code != 200:
-                    raise Exception(f"HTTP {response.status_code}")
-                
-                content = response.text
-                extracted_urls = []
-
-                # Parse based on type
-                if feed.source_type == FeedType.CSV:
-                    # Heuristic: assume column 0 or find 'url' header
-                    f = io.StringIO(content)
-                    reader = csv.reader(f)
-                    for row in reader:
-                        if not row: continue
-                        if row[0].startswith("http"): # Simple heuristic
-                            extracted_urls.append(row[0])
-                        # Handle specific formats like URLHaus (id,dateadded,url,...)
-                        elif len(row) > 1 and row[2].startswith("http"): 
-                             extracted_urls.append(row[2])
-
-                elif feed.source_type == FeedType.TEXT:
-                    for line in content.splitlines():
-                        line = line.strip()
-                        if line.startswith("http"):
-                            extracted_urls.append(line)
-
-                elif feed.source_type == FeedType.RSS:
-                    # Using feedparser synchronously if needed, or simple XML parsing
-                    # allowing simple XML check
-                    import xml.etree.ElementTree as ET
-                    try:
-                        root = ET.fromstring(content)
-                        # RSS 2.0 / Atom generic
-                        for link in root.findall(".//item/link"):
-                             extracted_urls.append(link.text)
-                        for link in root.findall(".//entry/link"):
-                             extracted_urls.append(link.attrib.get('href'))
-                    except:
-                        pass
-                
-                # Deduplicate and Insert
-                for url in extracted_urls:
-                    try:
-                        # Extract domain/fqdn logic (simplified)
-                        from urllib.parse import urlparse
-                        parsed = urlparse(url)
-                        fqdn = parsed.netloc
-                        if not fqdn: continue
-                        
-                        # Check exist
-                        exists = db.query(PipelineItem).filter(PipelineItem.fqdn == fqdn).first()
-                        if not exists:
-                            item = PipelineItem(
-                                fqdn=fqdn,
-                                source=f"feed:{feed.name}",
-                                status=PipelineStatus.DISCOVERED,
-                                priority=PriorityLevel.HIGH # Feeds are usually fresh threats
-                            )
-                            db.add(item)
-                            db.add(PipelineLog(item=item, stage="FEED", level="INFO", message=f"Discovered from {feed.name}"))
-                            new_items_count += 1
-                    except:
-                        continue
-                
-                db.commit()
-                
-                # Update Feed Stats
-                feed.last_fetched_at = datetime.now()
-                feed.total_items_found += new_items_count
-                feed.last_status = "success"
-                feed.last_error = None
-                db.commit()
-                
-                logger.info(f"Feed {feed.name} processing complete. Added {new_items_count} new items.")
-                return new_items_count
+
+            if response.status_code != 200:
+                raise Exception(f"HTTP {response.status_code}")
+
+            extracted_urls = self._extract_urls(feed.source_type, response.text)
+            new_items_count = self._insert_new_items(db, feed, extracted_urls)
+
+            # Update Feed Stats
+            feed.last_fetched_at = datetime.now()
+            feed.total_items_found += new_items_count
+            feed.last_new_items = new_items_count
+            feed.last_fetch_duration_ms = int((time.monotonic() - started) * 1000)
+            feed.last_status = "success"
+            feed.last_error = None
+            db.commit()
+
+            logger.info(f"Feed {feed.name} processing complete. Added {new_items_count} new items "
+                        f"({len(extracted_urls)} extracted, {feed.last_fetch_duration_ms}ms).")
+            return new_items_count
 
         except Exception as e:
             logger.error(f"Feed {feed_id} failed: {e}")
+            db.rollback()
             if feed:
                 feed.last_status = "error"
                 feed.last_error = str(e)
                 feed.last_fetched_at = datetime.now()
+                feed.last_new_items = 0
+                feed.last_fetch_duration_ms = int((time.monotonic() - started) * 1000)
                 db.commit()
         finally:
             db.close()
+            invalidate(TAG_FEEDS)
 
-    async def fetch_all_active(self):
+    def _extract_urls(self, source_type: str, content: str) -> List[str]:
+        """
+        Parse the raw feed body into a list of URLs (or bare domains for JSON feeds).
+        """
+        extracted_urls = []
+
+        if source_type == FeedType.CSV:
+            # Heuristic: assume column 0 or find 'url' header
+            f = io.StringIO(content)
+            reader = csv.reader(f)
+            for row in reader:
+                if not row: continue
+                if row[0].startswith("http"): # Simple heuristic
+                    extracted_urls.append(row[0])
+                # Handle specific formats like URLHaus (id,dateadded,url,...)
+                elif len(row) > 2 and row[2].startswith("http"):
+                     extracted_urls.append(row[2])
+
+        elif source_type == FeedType.TEXT:
+            for line in content.splitlines():
+                line = line.strip()
+                if line.startswith("http"):
+                    extracted_urls.append(line)
+
+        elif source_type == FeedType.JSON:
+            try:
+                data = json.loads(content)
+            except ValueError:
+                # Some feeds serve JSON Lines instead of a single document
+                data = []
+                for line in content.splitlines():
+                    line = line.strip()
+                    if not line: continue
+                    try:
+                        data.append(json.loads(line))
+                    except ValueError:
+                        continue
+            self._walk_json(data, extracted_urls)
+
+        elif source_type == FeedType.RSS:
+            # Using feedparser synchronously if needed, or simple XML parsing
+            # allowing simple XML check
+            import xml.etree.ElementTree as ET
+            try:
+                root = ET.fromstring(content)
+                # RSS 2.0 / Atom generic
+                for link in root.findall(".//item/link"):
+                     extracted_urls.append(link.text)
+                for link in root.findall(".//entry/link"):
+                     extracted_urls.append(link.attrib.get('href'))
+            except:
+                pass
+
+        return [u for u in extracted_urls if u]
+
+    def _walk_json(self, node, out: List[str], key: Optional[str] = None):
+        """
+        Collect URL/domain values from an arbitrary JSON document.
+        Only strings under known keys count (objects, or lists held by such a key, e.g.
+        {"domains": [...]}); a top-level list of plain strings is the feed itself.
+        Other strings (tags, descriptions, reporters) are ignored.
+        """
+        if isinstance(node, dict):
+            for child_key, value in node.items():
+                if isinstance(value, str):
+                    if child_key.lower() in JSON_URL_KEYS:
+                        out.append(value)
+                elif isinstance(value, (dict, list)):
+                    self._walk_json(value, out, child_key)
+        elif isinstance(node, list):
+            take_strings = key is None or key.lower() in JSON_URL_KEYS or key.lower() in JSON_URL_LIST_KEYS
+            for value in node:
+                if isinstance(value, str):
+                    if take_strings and self._to_fqdn(value):
+                        out.append(value)
+                else:
+                    # List items inherit the key of the list ({"urls": [{"url": ...}]} or [[...]])
+                    self._walk_json(value, out, key if isinstance(value, list) else None)
+
+    @staticmethod
+    def _to_fqdn(value: str) -> Optional[str]:
+        value = value.strip()
+        if not value or " " in value:
+            return None
+        if "://" not in value:
+            value = f"http://{value}"
+        try:
+            host = urlparse(value).hostname
+        except ValueError:
+            return None
+        if not host or "." not in host:
+            return None
+        return host.lower().rstrip(".")
+
+    def _insert_new_items(self, db: Session, feed: FeedSource, urls: List[str]) -> int:
+        """
+        Deduplicate against the pipeline in one pass and insert the new FQDNs.
+        """
+        fqdns = []
+        seen = set()
+        for url in urls:
+            fqdn = self._to_fqdn(url)
+            if fqdn and fqdn not in seen:
+                seen.add(fqdn)
+                fqdns.append(fqdn)
+
+        existing = set()
+        # Chunked IN() to stay below SQLite's bound-parameter limit
+        for i in range(0, len(fqdns), 500):
+            chunk = fqdns[i:i + 500]
+            rows = db.query(PipelineItem.fqdn).filter(PipelineItem.fqdn.in_(chunk)).all()
+            existing.update(r[0] for r in rows)
+
+        new_items_count = 0
+        for fqdn in fqdns:
+            if fqdn in existing:
+                continue
+            item = PipelineItem(
+                fqdn=fqdn,
+                source=f"feed:{feed.name}",
+                status=PipelineStatus.DISCOVERED,
+                priority=PriorityLevel.HIGH # Feeds are usually fresh threats
+            )
+            db.add(item)
+            db.add(PipelineLog(item=item, stage="FEED", level="INFO", message=f"Discovered from {feed.name}"))
+            new_items_count += 1
+
+        db.commit()
+        if new_items_count:
+            invalidate(TAG_PIPELINE)
+        return new_items_count
+
+    def get_due_feed_ids(self) -> List[int]:
+        """
+        Active feeds whose fetch interval has elapsed and that are not already being fetched.
+        """
         db = SessionLocal()
-        feeds = db.query(FeedSource).filter(FeedSource.is_active == True).all()
-        db.close()
-        
-        for feed in feeds:
-            # Check interval
-            if feed.last_fetched_at:
-                diff = (datetime.now() - feed.last_fetched_at).total_seconds() / 60
-                if diff < feed.fetch_interval_minutes:
+        try:
+            feeds = db.query(FeedSource).filter(FeedSource.is_active == True).all()
+            now = datetime.now()
+            due = []
+            for feed in feeds:
+                if feed.id in self._in_flight:
                     continue
-            
-            await self.fetch_feed(feed.id)
+                if feed.last_fetched_at:
+                    diff = (now - feed.last_fetched_at.replace(tzinfo=None)).total_seconds() / 60
+                    if diff < (feed.fetch_interval_minutes or 60):
+                        continue
+                due.append(feed.id)
+            return due
+        finally:
+            db.close()
+
+    async def _fetch_with_limits(self, feed_id: int, semaphore: asyncio.Semaphore):
+        # The whole body (jitter and slot wait included) releases the in-flight mark,
+        # so a fetch cancelled before it starts (drain, shutdown) doesn't block the feed forever
+        try:
+            # Jitter before taking a slot, so waiting doesn't hold concurrency
+            await asyncio.sleep(random.uniform(0, self.max_jitter_seconds))
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(self.fetch_feed(feed_id), timeout=self.fetch_timeout_seconds)
+                except asyncio.TimeoutError:
+                    logger.error(f"Feed {feed_id} timed out after {self.fetch_timeout_seconds}s")
+                    db = SessionLocal()
+                    try:
+                        feed = db.query(FeedSource).filter(FeedSource.id == feed_id).first()
+                        if feed:
+                            feed.last_status = "error"
+                            feed.last_error = f"Timeout after {self.fetch_timeout_seconds}s"
+                            feed.last_fetched_at = datetime.now()
+                            feed.last_new_items = 0
+                            feed.last_fetch_duration_ms = self.fetch_timeout_seconds * 1000
+                            db.commit()
+                    finally:
+                        db.close()
+        finally:
+            self._in_flight.discard(feed_id)
+
+    async def fetch_due_feeds(self) -> int:
+        """
+        Fetch all due feeds concurrently (bounded by max_concurrency, each with its own timeout).
+        Returns the number of new pipeline items discovered.
+        """
+        due = self.get_due_feed_ids()
+        if not due:
+            return 0
+
+        logger.info(f"Feed scheduler: {len(due)} feeds due")
+        self._in_flight.update(due)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            results = await asyncio.gather(
+                *[self._fetch_with_limits(feed_id, semaphore) for feed_id in due],
+                return_exceptions=True
+            )
+        finally:
+            # Tasks cancelled before their first step never run their own finally
+            self._in_flight.difference_update(due)
+
+        total_new = 0
+        for feed_id, result in zip(due, results):
+            if isinstance(result, Exception):
+                logger.error(f"Feed task {feed_id} failed: {result}")
+            elif result:
+                total_new += result
+        return total_new
+
+    async def fetch_all_active(self):
+        return await self.fetch_due_feeds()
 
 feed_service = FeedService()
@@ -36,38 +36,23 @@ class HealthMonitor:
         try:
             now = datetime.now()
             
-            # 1. Check for stuck CRAWLING items (>10 minutes)
-            stuck_crawling = db.query(PipelineItem).filter(
-                PipelineItem.status == PipelineStatus.CRAWLING,
-                PipelineItem.updated_at < now - timedelta(minutes=10)
-            ).count()
-            
-            if stuck_crawling > 0:
-                logger.warning(f"Found {stuck_crawling} stuck CRAWLING items, resetting...")
-                db.query(PipelineItem).filter(
-                    PipelineItem.status == PipelineStatus.CRAWLING,
-                    PipelineItem.updated_at < now - timedelta(minutes=10)
-                ).update({
-                    "status": PipelineStatus.DISCOVERED,
-                    "retry_count": PipelineItem.retry_count + 1
-                })
-                db.commit()
-            
-            # 2. Check for stuck ANALYZING items (>10 minutes)
-            stuck_analyzing = db.query(PipelineItem).filter(
-                PipelineItem.status == PipelineStatus.ANALYZING,
-                PipelineItem.updated_at < now - timedelta(minutes=10)
-            ).count()
-            
-            if stuck_analyzing > 0:
-                logger.warning(f"Found {stuck_analyzing} stuck ANALYZING items, resetting...")
-                db.query(PipelineItem).filter(
-                    PipelineItem.status == PipelineStatus.ANALYZING,
-                    PipelineItem.updated_at < now - timedelta(minutes=10)
-                ).update({
-                    "status": PipelineStatus.CRAWLED_SUCCESS,
-                    "retry_count": PipelineItem.retry_count + 1
-                })
+            # 1-2. Items stuck in an active state (>10 minutes) count as a STALLED failure:
+            # they go through the retry policy, so an item that keeps hanging a worker ends in manual review
+            from app.services.retry_policy import retry_policy, STALLED
+            threshold = now - timedelta(minutes=10)
+            for active, failed, stage in (
+                (PipelineStatus.CRAWLING, PipelineStatus.CRAWLED_FAIL, "CRAWLER"),
+                (PipelineStatus.ANALYZING, PipelineStatus.ANALYSIS_FAIL, "LLM"),
+            ):
+                stuck = db.query(PipelineItem).filter(
+                    PipelineItem.status == active,
+                    PipelineItem.updated_at < threshold
+                ).all()
+                if not stuck:
+                    continue
+                logger.warning(f"Found {len(stuck)} stuck {active.value} items, rescheduling...")
+                for item in stuck:
+                    retry_policy.schedule(db, item, failed, STALLED, stage, detail=f"stuck in {active.value}")
                 db.commit()
             
             # 3. Check orchestrator activity
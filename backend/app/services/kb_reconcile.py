@@ -0,0 +1,266 @@
+"""
+SQL <-> vector KB reconciliation: finds and repairs drift without a full rebuild.
+
+Every KB vector carries two fingerprints, recomputed from SQL on the other side:
+  src_hash   what the document was built from (summary, category, crawl artifact path),
+             stamped into the vector metadata by the indexer
+  meta hash  the filterable metadata (category, is_malicious), derived from the stored metadata
+
+Both sides are read as id streams sorted by fqdn (SQL: ORDER BY fqdn; Chroma has no ordered
+scan, so its ids + metadata are paged in and sorted in memory) and merge-joined in one pass:
+  in SQL only        -> upsert (missing)
+  in the KB only     -> delete (orphaned; archived items count as absent)
+  src_hash differs   -> upsert (source changed; unstamped legacy vectors land here too, and
+                        add_items only re-embeds them if the document hash differs; vectors
+                        stamped with another embedding model count as changed)
+  meta hash differs  -> upsert (metadata only, no embedding)
+Items that are in flight (not COMPLETED, or waiting for index_loop with no vector_id) are left alone.
+
+Changes are applied in batches in fqdn order; after each batch the last fqdn is checkpointed
+so a crashed or budget-limited run resumes where it stopped instead of starting over.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from app.core.database import SessionLocal
+from app.models.pipeline import PipelineItem, AnalysisResult, CrawlResult, PipelineStatus
+
+logger = logging.getLogger(__name__)
+
+KB_RECONCILE_STATE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                  "data", "kb_reconcile.json")
+
+ACTION_UPSERT = "upsert"
+ACTION_DELETE = "delete"
+
+REASON_MISSING = "missing"
+REASON_ORPHANED = "orphaned"
+REASON_SOURCE = "source_changed"
+REASON_METADATA = "metadata_changed"
+REASONS = (REASON_MISSING, REASON_ORPHANED, REASON_SOURCE, REASON_METADATA)
+
+# Chroma get() page size for the KB id stream (ids + small metadata only)
+KB_PAGE_SIZE = 5000
+
+def _digest(*parts) -> str:
+    return hashlib.sha1("\x1f".join("" if p is None else str(p) for p in parts).encode("utf-8", errors="ignore")).hexdigest()
+
+def source_hash(summary: Optional[str], category: Optional[str], content_path: Optional[str]) -> str:
+    """Fingerprint of the inputs of a KB document (the crawl artifact path is unique per crawl)."""
+    return _digest(summary, category or "Unknown", content_path)
+
+def meta_hash(category: Optional[str], is_malicious) -> str:
+    """Fingerprint of the metadata; is_malicious may be the SQL bool or the stored "True"/"False"."""
+    if isinstance(is_malicious, str):
+        is_malicious = is_malicious == "True"
+    return _digest(category or "Unknown", bool(is_malicious))
+
+# (fqdn, pending, src_hash, meta_hash, index snapshot row) / (fqdn, src_hash or None, meta_hash)
+SqlRow = Tuple[str, bool, str, str, tuple]
+KbRow = Tuple[str, Optional[str], str]
+
+def diff_streams(sql_rows: Iterator[SqlRow], kb_rows: Iterator[KbRow]) -> Iterator[Tuple[str, str, str, Optional[tuple]]]:
+    """
+    Sorted merge of the SQL and KB streams; yields (action, reason, fqdn, snapshot row).
+    """
+    kb_iter = iter(kb_rows)
+    kb = next(kb_iter, None)
+    for fqdn, pending, src, meta, snapshot in sql_rows:
+        while kb is not None and kb[0] < fqdn:
+            yield ACTION_DELETE, REASON_ORPHANED, kb[0], None
+            kb = next(kb_iter, None)
+        stored = kb if kb is not None and kb[0] == fqdn else None
+        if stored is not None:
+            kb = next(kb_iter, None)
+        if pending:
+            continue
+        if stored is None:
+            yield ACTION_UPSERT, REASON_MISSING, fqdn, snapshot
+        elif stored[1] != src:
+            yield ACTION_UPSERT, REASON_SOURCE, fqdn, snapshot
+        elif stored[2] != meta:
+            yield ACTION_UPSERT, REASON_METADATA, fqdn, snapshot
+    while kb is not None:
+        yield ACTION_DELETE, REASON_ORPHANED, kb[0], None
+        kb = next(kb_iter, None)
+
+class KBReconciler:
+    """
+    Incremental SQL -> KB sync (see module docstring). run() is synchronous and does the
+    vector writes itself; the orchestrator calls it on the vector write executor.
+    """
+    def __init__(self, state_path: str = KB_RECONCILE_STATE):
+        self.state_path = state_path
+        self._lock = threading.Lock()
+
+    def get_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"KB reconcile state unreadable, starting a new pass: {e}")
+            return {}
+
+    def _write_state(self, state: dict):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def reset(self):
+        """Forget the checkpoint: the next run starts a full pass."""
+        state = self.get_state()
+        state.pop("last_fqdn", None)
+        state.pop("pass", None)
+        self._write_state(state)
+
+    def _sql_stream(self, db, after: Optional[str]) -> Iterator[SqlRow]:
+        query = db.query(PipelineItem.id, PipelineItem.fqdn, PipelineItem.status, AnalysisResult.vector_id,
+                         AnalysisResult.summary, AnalysisResult.category_main, AnalysisResult.is_malicious,
+                         CrawlResult.html_content_path, CrawlResult.title)\
+            .join(AnalysisResult, PipelineItem.id == AnalysisResult.item_id)\
+            .outerjoin(CrawlResult, PipelineItem.id == CrawlResult.item_id)\
+            .filter(PipelineItem.status != PipelineStatus.ARCHIVED)
+        if after:
+            query = query.filter(PipelineItem.fqdn > after)
+        for item_id, fqdn, status, vector_id, summary, category, is_malicious, content_path, title \
+                in query.order_by(PipelineItem.fqdn).yield_per(2000):
+            category = category or "Unknown"
+            # Re-analysis in progress, or COMPLETED but queued for index_loop's backfill
+            pending = status != PipelineStatus.COMPLETED or vector_id is None
+            yield (fqdn, pending, source_hash(summary, category, content_path), meta_hash(category, is_malicious),
+                   (item_id, fqdn, summary, category, bool(is_malicious), content_path, title))
+
+    @staticmethod
+    def _kb_stream(collection, after: Optional[str], model_id: str) -> List[KbRow]:
+        from app.services.embeddings import LEGACY_MODEL_ID
+        rows = []
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=KB_PAGE_SIZE, offset=offset)
+            ids = page["ids"]
+            if not ids:
+                break
+            for fqdn, meta in zip(ids, page["metadatas"]):
+                if after and fqdn <= after:
+                    continue
+                meta = meta or {}
+                src = meta.get("src_hash")
+                if meta.get("embedding_model", LEGACY_MODEL_ID) != model_id:
+                    # Embedded by another backend/model: source_changed, add_items re-embeds it
+                    src = None
+                rows.append((fqdn, src, meta_hash(meta.get("category"), meta.get("is_malicious"))))
+            offset += len(ids)
+        rows.sort()
+        return rows
+
+    def diff(self, after: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[tuple], dict]:
+        """
+        The changes after `after` (up to `limit`) and scan counts. Read-only.
+        """
+        from app.services.vector_service import vector_service
+        kb_rows = self._kb_stream(vector_service.collection, after, vector_service.embedder.model_id)
+        counts = {"kb_scanned": len(kb_rows), "sql_scanned": 0, "pending": 0, "truncated": False,
+                  **{reason: 0 for reason in REASONS}}
+
+        def counted(rows):
+            for row in rows:
+                counts["sql_scanned"] += 1
+                counts["pending"] += row[1]
+                yield row
+
+        changes = []
+        db = SessionLocal()
+        try:
+            for change in diff_streams(counted(self._sql_stream(db, after)), kb_rows):
+                if limit is not None and len(changes) >= limit:
+                    counts["truncated"] = True
+                    break
+                changes.append(change)
+                counts[change[1]] += 1
+        finally:
+            db.close()
+        return changes, counts
+
+    def _apply(self, batch: List[tuple]) -> dict:
+        from app.services.orchestrator import Orchestrator
+        from app.services.vector_service import vector_service
+        stats = {"upserted": 0, "metadata_only": 0, "skipped": 0, "deleted": 0, "failed": 0}
+        deletes = [fqdn for action, _, fqdn, _ in batch if action == ACTION_DELETE]
+        snapshot = [row for action, _, _, row in batch if action == ACTION_UPSERT]
+        if snapshot:
+            # Same path as index_loop: keyword index + add_items (re-embeds only changed documents)
+            result = Orchestrator._index_batch(snapshot)
+            for key in ("upserted", "metadata_only", "skipped", "failed"):
+                stats[key] += result[key]
+        if deletes:
+            vector_service.delete_items(deletes)
+            stats["deleted"] += len(deletes)
+        return stats
+
+    def run(self, apply: bool = True, batch_size: int = 500, max_changes: Optional[int] = None) -> dict:
+        """
+        One reconciliation run from the checkpoint. Without apply, only reports the diff.
+        A run that reaches max_changes leaves the checkpoint at its last change; the next
+        run continues from there. Returns the run summary (also kept in the state file).
+        """
+        from app.services.vector_service import vector_service
+        if not vector_service.collection:
+            return {"error": "Vector collection not available"}
+        if not self._lock.acquire(blocking=False):
+            return {"error": "Reconciliation already running"}
+        try:
+            state = self.get_state()
+            after = state.get("last_fqdn")
+            started_at = datetime.now().isoformat()
+            changes, counts = self.diff(after, max_changes)
+            summary = {"started_at": started_at, "resumed_from": after, "applied": apply, **counts}
+            if not apply:
+                summary["finished_at"] = datetime.now().isoformat()
+                return summary
+
+            totals = {"upserted": 0, "metadata_only": 0, "skipped": 0, "deleted": 0, "failed": 0}
+            progress = state.get("pass") if after else None
+            progress = progress or {"started_at": started_at, **{reason: 0 for reason in REASONS}, **totals}
+            for i in range(0, len(changes), max(batch_size, 1)):
+                batch = changes[i:i + batch_size]
+                for key, value in self._apply(batch).items():
+                    totals[key] += value
+                    progress[key] = progress.get(key, 0) + value
+                for _, reason, _, _ in batch:
+                    progress[reason] = progress.get(reason, 0) + 1
+                state["last_fqdn"] = batch[-1][2]
+                state["pass"] = progress
+                self._write_state(state)
+
+            summary.update(totals)
+            summary["finished_at"] = datetime.now().isoformat()
+            if not counts["truncated"]:
+                # Reached the end of both streams: the pass is complete
+                state.pop("last_fqdn", None)
+                state.pop("pass", None)
+                state["last_pass"] = {**progress, "completed_at": summary["finished_at"]}
+            state["last_run"] = summary
+            self._write_state(state)
+
+            drift = sum(counts[reason] for reason in REASONS)
+            if drift:
+                logger.warning(f"KB reconcile: {drift} drifted items after {after or 'start'} "
+                               f"({', '.join(f'{r}={counts[r]}' for r in REASONS if counts[r])}); "
+                               f"embedded={totals['upserted']}, metadata_only={totals['metadata_only']}, "
+                               f"deleted={totals['deleted']}, failed={totals['failed']}")
+            else:
+                logger.info(f"KB reconcile: no drift ({counts['sql_scanned']} SQL / {counts['kb_scanned']} KB items scanned)")
+            return summary
+        finally:
+            self._lock.release()
+
+kb_reconciler = KBReconciler()
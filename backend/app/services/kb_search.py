@@ -0,0 +1,170 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional
+from sqlalchemy import bindparam, text
+from app.core.database import engine, KB_FTS_TABLE
+from app.models.pipeline import PipelineStatus
+
+logger = logging.getLogger(__name__)
+
+# Crawl text kept per domain in the keyword index (the vector store only keeps ~1000 chars)
+EVIDENCE_CHARS = 4000
+# bm25 column weights: fqdn, title, summary, evidence
+BM25_WEIGHTS = (4.0, 3.0, 1.5, 1.0)
+# Reciprocal Rank Fusion constant (standard value from the RRF paper)
+RRF_K = 60
+
+INDEXED_STATUSES = (PipelineStatus.COMPLETED.value, PipelineStatus.INDEXING.value)
+
+def _statuses_param():
+    return bindparam("statuses", value=list(INDEXED_STATUSES), expanding=True)
+
+def to_match_query(query: str, match: str = "all") -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 query: every word becomes a quoted prefix term,
+    joined with AND (match="all") or OR (match="any").
+    """
+    terms = [t for t in re.findall(r"\w+", query.lower()) if len(t) > 1]
+    if not terms:
+        return None
+    joiner = " OR " if match == "any" else " AND "
+    return joiner.join(f'"{t}"*' for t in terms)
+
+def rrf_fuse(*result_lists: List[Dict[str, Any]], limit: int = 5, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists by fqdn with Reciprocal Rank Fusion.
+    The first list's entry wins when a domain appears in several; "score" becomes the fused score.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = {}
+    for results in result_lists:
+        for rank, res in enumerate(results):
+            key = res["fqdn"]
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            if key not in fused:
+                fused[key] = dict(res)
+            else:
+                fused[key]["match"] = "hybrid"
+    ranked = sorted(fused.values(), key=lambda r: scores[r["fqdn"]], reverse=True)[:limit]
+    for res in ranked:
+        res["score"] = scores[res["fqdn"]]
+    return ranked
+
+class KBSearchIndex:
+    """
+    Keyword (BM25) search over analysed domains, backed by the kb_fts FTS5 table.
+    Rows are written by the index stage next to the vector upsert, so exact strings
+    (brand names, kit markers) stay searchable even when embeddings miss them.
+    """
+    def upsert_many(self, rows: List[Dict[str, Any]]):
+        """
+        rows: [{"id", "fqdn", "title", "summary", "evidence"}]
+        """
+        if not rows:
+            return
+        with engine.begin() as conn:
+            ids = [r["id"] for r in rows]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                params = {f"id{j}": v for j, v in enumerate(chunk)}
+                placeholders = ", ".join(f":id{j}" for j in range(len(chunk)))
+                conn.execute(text(f"DELETE FROM {KB_FTS_TABLE} WHERE rowid IN ({placeholders})"), params)
+            conn.execute(
+                text(f"INSERT INTO {KB_FTS_TABLE}(rowid, fqdn, title, summary, evidence) "
+                     f"VALUES (:id, :fqdn, :title, :summary, :evidence)"),
+                [{
+                    "id": r["id"],
+                    "fqdn": r["fqdn"],
+                    "title": r.get("title") or "",
+                    "summary": r.get("summary") or "",
+                    "evidence": (r.get("evidence") or "")[:EVIDENCE_CHARS]
+                } for r in rows]
+            )
+
+    def remove(self, item_id: int):
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {KB_FTS_TABLE} WHERE rowid = :id"), {"id": item_id})
+
+    def search(self, query: str, limit: int = 20, match: str = "all", category: Optional[str] = None,
+               is_malicious: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """
+        BM25-ranked keyword search. Returns dicts shaped like VectorService.search results
+        (fqdn, category, is_malicious, snippet, score) plus item_id, title and confidence.
+        """
+        match_query = to_match_query(query, match)
+        if not match_query:
+            return []
+
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        sql = f"""
+            SELECT f.rowid, f.fqdn, f.title,
+                   snippet({KB_FTS_TABLE}, -1, '[', ']', '...', 16) AS snippet,
+                   bm25({KB_FTS_TABLE}, {weights}) AS rank,
+                   a.category_main, a.is_malicious, a.confidence_score
+            FROM {KB_FTS_TABLE} f
+            JOIN pipeline_items p ON p.id = f.rowid
+            JOIN analysis_results a ON a.item_id = p.id
+            WHERE {KB_FTS_TABLE} MATCH :q AND p.status IN :statuses
+        """
+        params: Dict[str, Any] = {"q": match_query, "limit": limit}
+        if category:
+            sql += " AND a.category_main = :category"
+            params["category"] = category
+        if is_malicious is not None:
+            sql += " AND a.is_malicious = :is_malicious"
+            params["is_malicious"] = is_malicious
+        sql += " ORDER BY rank LIMIT :limit"
+
+        stmt = text(sql).bindparams(_statuses_param())
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(stmt, params).fetchall()
+        except Exception as e:
+            logger.error(f"KB keyword search failed for {query!r}: {e}")
+            return []
+
+        return [{
+            "id": fqdn,
+            "item_id": item_id,
+            "fqdn": fqdn,
+            "title": title or None,
+            "category": category_main,
+            "is_malicious": bool(malicious),
+            "confidence": confidence,
+            "snippet": snippet,
+            "score": -rank,  # bm25() is lower-is-better
+            "match": "keyword"
+        } for item_id, fqdn, title, snippet, rank, category_main, malicious, confidence in rows]
+
+    def backfill(self, batch_size: int = 500) -> int:
+        """
+        Index analysed domains that are missing from kb_fts (first run, or rows
+        written by import tools). Reads crawl evidence from disk, so run it off the loop.
+        """
+        from app.services.vector_service import read_crawl_evidence
+        total = 0
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(text(f"""
+                    SELECT p.id, p.fqdn, c.title, a.summary, c.html_content_path
+                    FROM pipeline_items p
+                    JOIN analysis_results a ON a.item_id = p.id
+                    LEFT JOIN crawl_results c ON c.item_id = p.id
+                    WHERE p.status IN :statuses AND p.id NOT IN (SELECT rowid FROM {KB_FTS_TABLE})
+                    LIMIT :limit
+                """).bindparams(_statuses_param()), {"limit": batch_size}).fetchall()
+            if not rows:
+                break
+            self.upsert_many([{
+                "id": item_id,
+                "fqdn": fqdn,
+                "title": title,
+                "summary": summary,
+                "evidence": read_crawl_evidence(content_path, EVIDENCE_CHARS)
+            } for item_id, fqdn, title, summary, content_path in rows])
+            total += len(rows)
+        if total:
+            logger.info(f"KB keyword index: backfilled {total} domains")
+        return total
+
+kb_search = KBSearchIndex()
@@ -0,0 +1,133 @@
+import os
+import socket
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import or_, update
+
+from app.core.cache import invalidate, TAG_PIPELINE
+from app.core.database import SessionLocal
+from app.models.pipeline import PipelineItem, PipelineLog, PipelineStatus
+
+logger = logging.getLogger(__name__)
+
+HOSTNAME = socket.gethostname()
+# Identifies this process as lease owner (and in stage timings)
+WORKER_ID = f"{HOSTNAME}:{os.getpid()}"
+
+# Active status -> the queue an item returns to when its lease is released
+RELEASE_TARGETS = {
+    PipelineStatus.CRAWLING: PipelineStatus.DISCOVERED,
+    # The crawl is kept: a released analysis never needs a recrawl
+    PipelineStatus.ANALYZING: PipelineStatus.CRAWLED_SUCCESS,
+}
+
+def claim(db, items: List[PipelineItem], from_status: PipelineStatus, to_status: PipelineStatus) -> List[PipelineItem]:
+    """
+    Move the selected items from_status -> to_status under this process's lease with one
+    conditional UPDATE .. RETURNING and commit. When several workers select the same
+    rows, each row is claimed by exactly one of them; the rest are dropped from the batch.
+    """
+    if not items:
+        return []
+    now = datetime.now()
+    # Read before the commit expires the instances
+    fqdns = {item.id: item.fqdn for item in items}
+    result = db.execute(
+        update(PipelineItem)
+        .where(PipelineItem.id.in_([item.id for item in items]), PipelineItem.status == from_status)
+        # SET sees the pre-update row: lease_queued_at keeps the queue position for release()
+        .values(status=to_status, lease_owner=WORKER_ID, lease_queued_at=PipelineItem.updated_at, updated_at=now)
+        .returning(PipelineItem.id)
+        .execution_options(synchronize_session=False)
+    )
+    claimed_ids = {row[0] for row in result}
+    db.commit()
+    claimed = [item for item in items if item.id in claimed_ids]
+    from app.services.event_bus import event_bus
+    if claimed and not event_bus.tail_mode:
+        # Bulk updates bypass the session hooks; announce the transitions ourselves
+        ts = now.isoformat()
+        event_bus.publish([{"type": "status", "item_id": item.id, "fqdn": fqdns[item.id], "status": to_status.value,
+                            "previous": from_status.value, "ts": ts} for item in claimed])
+    lost = len(items) - len(claimed)
+    if lost:
+        logger.info(f"{lost} of {len(items)} {from_status.value} items were claimed by another worker")
+    return claimed
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+def orphaned_owners(db, statuses: Iterable[PipelineStatus]) -> Set[Optional[str]]:
+    """
+    Lease owners of active items that are known to be gone: no owner (pre-lease rows)
+    or a process on this host that no longer exists. Leases held on other hosts are
+    left to the health monitor's stall detection.
+    """
+    owners = {row[0] for row in db.query(PipelineItem.lease_owner)
+              .filter(PipelineItem.status.in_(list(statuses))).distinct()}
+    orphaned = set()
+    for owner in owners:
+        if owner is None:
+            orphaned.add(None)
+            continue
+        host, _, pid = owner.rpartition(":")
+        if host == HOSTNAME and owner != WORKER_ID and pid.isdigit() and not _pid_alive(int(pid)):
+            orphaned.add(owner)
+    return orphaned
+
+def release(statuses: Iterable[PipelineStatus], item_ids: Optional[List[int]] = None,
+            owners: Optional[Set[Optional[str]]] = None, orphaned_only: bool = False,
+            reason: str = "Released") -> Dict[str, int]:
+    """
+    Return active items to their queue with one UPDATE per status and a single summary
+    log row. item_ids / owners narrow the release (None = no restriction); orphaned_only
+    restricts it to owners found by orphaned_owners(). updated_at is restored to its
+    pre-claim value (lease_queued_at), so released items keep their place in the FIFO.
+    """
+    statuses = list(statuses)
+    counts = {status.value: 0 for status in statuses}
+    if item_ids is not None and not item_ids:
+        return counts
+    db = SessionLocal()
+    try:
+        if orphaned_only:
+            owners = orphaned_owners(db, statuses)
+            if not owners:
+                return counts
+        for status in statuses:
+            query = db.query(PipelineItem).filter(PipelineItem.status == status)
+            if item_ids is not None:
+                query = query.filter(PipelineItem.id.in_(item_ids))
+            if owners is not None:
+                named = [owner for owner in owners if owner is not None]
+                conditions = [PipelineItem.lease_owner.in_(named)] if named else []
+                if None in owners:
+                    conditions.append(PipelineItem.lease_owner.is_(None))
+                query = query.filter(or_(*conditions))
+            counts[status.value] = query.update({
+                PipelineItem.status: RELEASE_TARGETS[status],
+                PipelineItem.lease_owner: None,
+                # NULL (never requeued before the claim) falls back to created_at in the FIFO key
+                PipelineItem.updated_at: PipelineItem.lease_queued_at,
+                PipelineItem.lease_queued_at: None
+            }, synchronize_session=False)
+        if any(counts.values()):
+            detail = " and ".join(f"{n} {status.lower()}" for status, n in counts.items())
+            db.add(PipelineLog(item_id=None, stage="SYSTEM", level="WARNING", message=f"{reason}: released {detail} items"))
+        db.commit()
+    except Exception as e:
+        logger.error(f"Lease release failed ({reason}): {e}")
+        db.rollback()
+    finally:
+        db.close()
+    if any(counts.values()):
+        invalidate(TAG_PIPELINE)
+    return counts
@@ -1,18 +1,21 @@
 
-print("DEBUG: LOADED NEW LLM_SERVICE MODULE WITH EXTERNAL HOST FIX V3")
-import requests
 import logging
 import json
 import os
 import random
 import asyncio
+import time
+import contextvars
 from typing import Optional, Dict, Any, List
-from dotenv import load_dotenv
-
-load_dotenv()
+from app.core.metrics import LLM_REQUEST, LLM_TTFT, LLM_TOKENS
 
 logger = logging.getLogger(__name__)
 
+# Token usage of the last generate call made in the current task (prompt + completion)
+last_token_usage: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("last_token_usage", default=None)
+# Outcome of that call: ok, parse_error, http_<code>, unavailable, error (drives retry classification)
+last_outcome: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("last_llm_outcome", default=None)
+
 class LLMService:
     def __init__(self):
         self.internal_host = "192.168.8.190"
@@ -21,27 +24,27 @@ class LLMService:
         self.local_model = "llama3:latest"
         self.base_url = None 
         self.use_public_llm = False
-        print(f"DEBUG: LLMService Initialized. External Host: {self.external_host}")
 
     def refresh_connection_status(self):
-        print(f"DEBUG: Checking connectivity to {self.external_host}...")
+        logger.debug(f"Checking connectivity to {self.external_host}...")
         if self._check_host(self.external_host):
             self.base_url = f"http://{self.external_host}:{self.port}"
-            print(f"✅ Connected to External GPU LLM: {self.base_url}")
+            logger.info(f"Connected to External GPU LLM: {self.base_url}")
         elif self._check_host(self.internal_host):
             self.base_url = f"http://{self.internal_host}:{self.port}"
-            print(f"✅ Connected to Internal GPU LLM: {self.base_url}")
+            logger.info(f"Connected to Internal GPU LLM: {self.base_url}")
         else:
-            print("❌ Failed to connect to any GPU LLM Host.")
+            logger.error("Failed to connect to any GPU LLM Host.")
             self.base_url = None
             
     def _check_host(self, host: str, timeout: float = 10.0) -> bool:
+        import requests
         try:
             url = f"http://{host}:{self.port}/api/version"
             resp = requests.get(url, timeout=timeout)
             return resp.status_code == 200
         except Exception as e:
-            print(f"DEBUG: Connection Error to {host}: {e}")
+            logger.debug(f"Connection Error to {host}: {e}")
             return False
 
     def get_base_url(self):
@@ -70,7 +73,7 @@ class LLMService:
             url = self.get_base_url()
             if not url: return []
 
-            print(f"Sending Batch Request (Size {len(items)}) to {url}...")
+            logger.info(f"Sending Batch Request (Size {len(items)}) to {url}...")
             client = httpx.AsyncClient(timeout=180.0)
             payload = {"model": self.local_model, "prompt": prompt, "stream": False, "format": "json"}
             
@@ -79,9 +82,9 @@ class LLMService:
             
             if resp.status_code == 200:
                 res = resp.json()
-                print(f"DEBUG: Raw LLM Response: {str(res)[:200]}...") # Print snippet
+                logger.debug(f"Raw LLM Response: {str(res)[:200]}...")
                 response_text = res.get("response", "[]")
-                print(f"DEBUG: Extracted Text: {response_text[:200]}...")
+                logger.debug(f"Extracted Text: {response_text[:200]}...")
                 
                 try:
                     data = json.loads(response_text)
@@ -97,33 +100,60 @@ class LLMService:
                         if "fqdn" in data or "category_main" in data:
                             return [data]
                         
-                        print(f"DEBUG: Dictionary response but no known list key found. Keys: {list(data.keys())}")
+                        logger.warning(f"Dictionary response but no known list key found. Keys: {list(data.keys())}")
                         return []
                 except Exception as e:
-                    print(f"Failed to parse JSON: {e}")
+                    logger.error(f"Failed to parse JSON: {e}")
                     return []
             else:
-                print(f"Batch Request Failed: {resp.status_code} - {resp.text}")
+                logger.error(f"Batch Request Failed: {resp.status_code} - {resp.text}")
                     
         except Exception as e:
-             print(f"Local Batch LLM Failed: {e}")
+             logger.error(f"Local Batch LLM Failed: {e}")
         return []
 
     async def _analyze_with_local(self, title: str, content: str, category_definitions: Optional[Dict[str, str]]) -> Dict[str, Any]:
         import httpx
         url = self.get_base_url()
-        if not url: return None
+        if not url:
+            last_outcome.set("unavailable")
+            return None
         client = httpx.AsyncClient(timeout=60.0)
         prompt = f"Analyze: {title}\n{content[:2000]}\nJSON Output keys: category_main, is_malicious, summary."
         payload = {"model": self.local_model, "prompt": prompt, "stream": False, "format": "json"}
+        started = time.perf_counter()
+        outcome = "error"
         try:
             resp = await client.post(f"{url}/api/generate", json=payload)
             await client.aclose()
             if resp.status_code == 200:
                 res = resp.json()
-                return json.loads(res.get("response", "{}"))
+                self._record_generation_stats(res)
+                outcome = "parse_error"
+                data = json.loads(res.get("response", "{}"))
+                outcome = "ok"
+                return data
+            outcome = f"http_{resp.status_code}"
         except:
             await client.aclose()
+        finally:
+            LLM_REQUEST.observe(time.perf_counter() - started, outcome=outcome)
+            last_outcome.set(outcome)
         return None
 
+    @staticmethod
+    def _record_generation_stats(res: Dict[str, Any]):
+        """
+        Ollama reports its own timings (nanoseconds) in non-streaming responses;
+        model load + prompt evaluation is the time to first token.
+        """
+        ttft_ns = (res.get("load_duration") or 0) + (res.get("prompt_eval_duration") or 0)
+        if ttft_ns:
+            LLM_TTFT.observe(ttft_ns / 1e9)
+        if res.get("prompt_eval_count"):
+            LLM_TOKENS.inc(res["prompt_eval_count"], kind="prompt")
+        if res.get("eval_count"):
+            LLM_TOKENS.inc(res["eval_count"], kind="completion")
+        last_token_usage.set((res.get("prompt_eval_count") or 0) + (res.get("eval_count") or 0) or None)
+
 llm_service = LLMService()
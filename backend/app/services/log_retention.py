@@ -0,0 +1,158 @@
+import os
+import gzip
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import text
+
+from app.core.config import get_settings
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+LOG_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "log_archive")
+# Rows moved per archive+delete transaction; keeps write locks short
+BATCH_SIZE = 5000
+# Upper bound per run so a large first rollover is spread over several job runs
+MAX_BATCHES_PER_RUN = 200
+
+class LogRetentionService:
+    """
+    Keeps pipeline_logs small. Rows older than LOG_RETENTION_DAYS are appended to one
+    gzip'd JSONL partition per day (data/log_archive/pipeline_logs-YYYY-MM-DD.jsonl.gz)
+    and deleted from the table in id-ordered batches. Each partition has a sidecar
+    listing the item ids it contains, so a single item's history is found without
+    decompressing every day.
+    """
+    def __init__(self, archive_dir: str = LOG_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+        self._sidecars: Dict[str, tuple] = {}  # day -> (mtime, item id set)
+
+    def _partition_path(self, day: str) -> str:
+        return os.path.join(self.archive_dir, f"pipeline_logs-{day}.jsonl.gz")
+
+    def _sidecar_path(self, day: str) -> str:
+        return os.path.join(self.archive_dir, f"pipeline_logs-{day}.items.json")
+
+    def _days(self) -> List[str]:
+        if not os.path.isdir(self.archive_dir):
+            return []
+        return sorted(name[len("pipeline_logs-"):-len(".jsonl.gz")]
+                      for name in os.listdir(self.archive_dir)
+                      if name.startswith("pipeline_logs-") and name.endswith(".jsonl.gz"))
+
+    def _item_ids(self, day: str) -> Set[int]:
+        path = self._sidecar_path(day)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return set()
+        cached = self._sidecars.get(day)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            ids = set(json.load(f))
+        self._sidecars[day] = (mtime, ids)
+        return ids
+
+    def _append(self, day: str, rows: List[tuple]):
+        # Each append adds a gzip member; gzip readers treat the file as one stream
+        with gzip.open(self._partition_path(day), "at", encoding="utf-8") as f:
+            for log_id, item_id, stage, level, message, timestamp in rows:
+                f.write(json.dumps({"item_id": item_id, "id": log_id, "stage": stage, "level": level,
+                                    "message": message, "timestamp": str(timestamp)},
+                                   separators=(",", ":"), ensure_ascii=False) + "\n")
+        ids = self._item_ids(day) | {r[1] for r in rows if r[1] is not None}
+        tmp = self._sidecar_path(day) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(sorted(ids), f, separators=(",", ":"))
+        os.replace(tmp, self._sidecar_path(day))
+
+    def rollover(self, retention_days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Archive and delete logs older than the retention window (cut at a UTC day
+        boundary, so every archived day is complete). Safe to re-run after a crash:
+        partitions are written before rows are deleted and readers de-duplicate by id.
+        """
+        settings = get_settings()
+        days = settings.LOG_RETENTION_DAYS if retention_days is None else retention_days
+        # timestamp is SQLite's CURRENT_TIMESTAMP (UTC text)
+        cutoff = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d 00:00:00")
+        archived = 0
+        if not self._lock.acquire(blocking=False):
+            return {"archived": 0, "cutoff": cutoff, "skipped": "rollover already running"}
+        try:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            for _ in range(MAX_BATCHES_PER_RUN):
+                with engine.begin() as conn:
+                    rows = conn.execute(text(
+                        "SELECT id, item_id, stage, level, message, timestamp FROM pipeline_logs "
+                        "WHERE timestamp < :cutoff ORDER BY id LIMIT :limit"
+                    ), {"cutoff": cutoff, "limit": BATCH_SIZE}).fetchall()
+                    if not rows:
+                        break
+                    by_day: Dict[str, List[tuple]] = {}
+                    for row in rows:
+                        by_day.setdefault(str(row[5])[:10], []).append(tuple(row))
+                    for day, day_rows in by_day.items():
+                        self._append(day, day_rows)
+                    # Every row below the cutoff with id <= max was in this batch
+                    conn.execute(text("DELETE FROM pipeline_logs WHERE id <= :max_id AND timestamp < :cutoff"),
+                                 {"max_id": rows[-1][0], "cutoff": cutoff})
+                archived += len(rows)
+                if len(rows) < BATCH_SIZE:
+                    break
+            if archived:
+                with engine.begin() as conn:
+                    conn.execute(text("PRAGMA optimize"))
+                logger.info(f"Log retention: archived {archived} log rows older than {cutoff}")
+            pruned = self._prune(settings.LOG_ARCHIVE_RETENTION_DAYS)
+        finally:
+            self._lock.release()
+        return {"archived": archived, "cutoff": cutoff, "pruned_partitions": pruned}
+
+    def _prune(self, keep_days: int) -> int:
+        if keep_days <= 0:
+            return 0
+        oldest = (datetime.utcnow() - timedelta(days=keep_days)).strftime("%Y-%m-%d")
+        pruned = 0
+        for day in self._days():
+            if day >= oldest:
+                break
+            for path in (self._partition_path(day), self._sidecar_path(day)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._sidecars.pop(day, None)
+            pruned += 1
+        return pruned
+
+    def archived_logs(self, item_id: int) -> List[Dict[str, Any]]:
+        """
+        One item's archived log rows, oldest first. Only partitions whose sidecar lists the item are read.
+        """
+        prefix = f'{{"item_id":{item_id},'
+        found: Dict[int, Dict[str, Any]] = {}
+        for day in self._days():
+            if item_id not in self._item_ids(day):
+                continue
+            with gzip.open(self._partition_path(day), "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith(prefix):
+                        row = json.loads(line)
+                        found[row["id"]] = row
+        return [found[k] for k in sorted(found)]
+
+    def partitions(self) -> List[Dict[str, Any]]:
+        return [{
+            "day": day,
+            "bytes": os.path.getsize(self._partition_path(day)),
+            "items": len(self._item_ids(day))
+        } for day in self._days()]
+
+log_retention = LogRetentionService()
@@ -0,0 +1,101 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import psutil
+from sqlalchemy import func
+
+from app.core.database import SessionLocal
+from app.core.metrics import registry, Gauge, LLM_REQUEST, STAGE_ITEMS
+from app.models.pipeline import PipelineItem, PipelineStatus, SystemMetric
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = (
+    PipelineStatus.DISCOVERED, PipelineStatus.QUEUED,
+    PipelineStatus.CRAWLED_SUCCESS, PipelineStatus.INDEXING
+)
+FAILED_STATUSES = (PipelineStatus.CRAWLED_FAIL, PipelineStatus.ANALYSIS_FAIL)
+
+_process = psutil.Process()
+
+def _status_counts():
+    db = SessionLocal()
+    try:
+        rows = db.query(PipelineItem.status, func.count(PipelineItem.id)).group_by(PipelineItem.status).all()
+    finally:
+        db.close()
+    return {(getattr(status, "value", status),): count for status, count in rows}
+
+def _process_stats():
+    return {
+        ("cpu_percent",): _process.cpu_percent(None),
+        ("rss_bytes",): _process.memory_info().rss,
+        ("threads",): _process.num_threads()
+    }
+
+# Scrape-time gauges: one GROUP BY per scrape, no bookkeeping on the write path
+registry.register(Gauge("wintel_pipeline_items", "Pipeline items per status", ["status"], callback=_status_counts))
+registry.register(Gauge("wintel_process", "API process resource usage", ["resource"], callback=_process_stats))
+
+class MetricsSampler:
+    """
+    Persists a SystemMetric row per interval: host load, queue sizes, and the
+    throughput / LLM latency observed since the previous sample.
+    """
+    def __init__(self):
+        self._last_ts: Optional[float] = None
+        self._last_completed = 0.0
+        self._last_llm_counts: Optional[List[int]] = None
+
+    def sample(self):
+        now = time.monotonic()
+        completed = STAGE_ITEMS.value(stage="index", outcome="ok")
+        llm_counts, _, _ = LLM_REQUEST.snapshot(outcome="ok")
+
+        completed_per_minute = None
+        llm_p50 = llm_p95 = None
+        if self._last_ts is not None:
+            elapsed = now - self._last_ts
+            if elapsed > 0:
+                completed_per_minute = round((completed - self._last_completed) * 60.0 / elapsed, 2)
+            delta = [a - b for a, b in zip(llm_counts, self._last_llm_counts)]
+            p50, p95 = LLM_REQUEST.quantile(0.5, delta), LLM_REQUEST.quantile(0.95, delta)
+            llm_p50 = round(p50 * 1000, 1) if p50 is not None else None
+            llm_p95 = round(p95 * 1000, 1) if p95 is not None else None
+        self._last_ts, self._last_completed, self._last_llm_counts = now, completed, llm_counts
+
+        db = SessionLocal()
+        try:
+            counts = dict(db.query(PipelineItem.status, func.count(PipelineItem.id)).group_by(PipelineItem.status).all())
+            hour_ago = datetime.now() - timedelta(hours=1)
+            failed_last_hour = db.query(func.count(PipelineItem.id)).filter(
+                PipelineItem.status.in_(FAILED_STATUSES),
+                PipelineItem.updated_at >= hour_ago
+            ).scalar()
+            db.add(SystemMetric(
+                cpu_usage_percent=psutil.cpu_percent(None),
+                memory_usage_percent=psutil.virtual_memory().percent,
+                pending_queue_size=sum(counts.get(s, 0) for s in PENDING_STATUSES),
+                active_crawlers=counts.get(PipelineStatus.CRAWLING, 0),
+                failed_last_hour=failed_last_hour,
+                completed_per_minute=completed_per_minute,
+                llm_p50_ms=llm_p50,
+                llm_p95_ms=llm_p95
+            ))
+            db.commit()
+        except Exception as e:
+            logger.error(f"System metric sample failed: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def history(self, db, hours: int = 24, limit: int = 1440) -> List[SystemMetric]:
+        # timestamp is SQLite's CURRENT_TIMESTAMP (UTC)
+        since = datetime.utcnow() - timedelta(hours=hours)
+        rows = db.query(SystemMetric).filter(SystemMetric.timestamp >= since)\
+            .order_by(SystemMetric.id.desc()).limit(limit).all()
+        return list(reversed(rows))
+
+metrics_sampler = MetricsSampler()
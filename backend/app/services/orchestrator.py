@@ -1,64 +1,174 @@
 import logging
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal, engine
+from app.core.config import get_settings
+from app.core.cache import invalidate, TAG_PIPELINE, TAG_KB, TAG_CATEGORIES
+from app.core import metrics
+from app.core.metrics import QUEUE_WAIT, CRAWL_FETCH, ARTIFACT_WRITE, INDEX_BATCH, STAGE_ITEMS
 from app.models.pipeline import PipelineItem, CrawlResult, AnalysisResult, PipelineLog, PipelineStatus, PriorityLevel
 from app.models.category import CategoryDefinition
 from app.services.crawler_service import crawler_service
+from app.services.stage_timeline import stage_timeline, enqueued_at, STAGE_CRAWL, STAGE_ANALYZE, STAGE_INDEX
+from app.services import retry_policy as retry
+from app.services.retry_policy import retry_policy
+from app.services.fair_scheduler import fair_scheduler
+from app.services import leases
+from app.services.postprocess import postprocessor, write_artifact, read_artifact
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import os
+import time
 
 logger = logging.getLogger(__name__)
 
+# Pipeline stages a process can run (see app.worker); maintenance = feeds, retries, log/metric housekeeping
+ROLE_CRAWL = "crawl"
+ROLE_ANALYZE = "analyze"
+ROLE_INDEX = "index"
+ROLE_MAINTENANCE = "maintenance"
+ROLES = (ROLE_CRAWL, ROLE_ANALYZE, ROLE_INDEX, ROLE_MAINTENANCE)
+
+def _claim(item: PipelineItem, stage: str, enqueued: Optional[datetime] = None):
+    """
+    Record queue wait for an item being claimed; returns when it entered the queue.
+    """
+    enqueued = enqueued or enqueued_at(item)
+    if enqueued:
+        QUEUE_WAIT.observe(max((datetime.now() - enqueued).total_seconds(), 0.0), stage=stage)
+    return enqueued
+
+def _write_artifact_timed(path: str, data: bytes):
+    with ARTIFACT_WRITE.time():
+        write_artifact(path, data)
+
 class Orchestrator:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
         self.crawler = crawler_service
         self.is_running = False
+        self.roles = set(ROLES)
         # Increase batch size for higher throughput, capitalizing on HTTPX speed
         self.crawl_batch_size = 30
         self.analysis_batch_size = 20
+        # Embeddings are cheap per item once batched, so index in larger micro-batches
+        self.index_batch_size = 64
+        # Reserved headroom: the critical lane claims up to this many CRITICAL items per stage every few seconds
+        self.critical_batch_size = 5
+        
+        # Drain mode: no new claims; in-flight crawl/analysis tasks by item id
+        self.draining = False
+        self._inflight: Dict[int, Tuple[str, asyncio.Task]] = {}
+        self._index_busy = False
         
         # Monitoring
         self.start_time = datetime.now()
         self.last_run = {
             "crawl_loop": None,
-            "analysis_loop": None
+            "analysis_loop": None,
+            "index_loop": None,
+            "feed_loop": None,
+            "reconcile_kb": None
         }
 
     def get_status(self):
         return {
             "is_running": self.is_running,
+            "roles": sorted(self.roles),
+            "worker_id": leases.WORKER_ID,
             "uptime_seconds": (datetime.now() - self.start_time).total_seconds() if self.is_running else 0,
             "last_crawl_run": self.last_run["crawl_loop"],
             "last_analysis_run": self.last_run["analysis_loop"],
+            "last_index_run": self.last_run["index_loop"],
+            "last_feed_run": self.last_run["feed_loop"],
+            "last_reconcile_run": self.last_run["reconcile_kb"],
+            "draining": self.draining,
+            "in_flight": {
+                "crawl": sum(1 for stage, _ in self._inflight.values() if stage == STAGE_CRAWL),
+                "analysis": sum(1 for stage, _ in self._inflight.values() if stage == STAGE_ANALYZE),
+                "index": self._index_busy
+            },
             "batch_sizes": {
                 "crawl": self.crawl_batch_size,
-                "analysis": self.analysis_batch_size
+                "analysis": self.analysis_batch_size,
+                "index": self.index_batch_size
             }
         }
-    def start(self):
+    def start(self, roles: Iterable[str] = ROLES, control_plane: bool = True):
+        """
+        roles: pipeline stages run in this process (all of them when EMBEDDED_WORKERS,
+        otherwise one or more per `python -m app.worker --role ...` process).
+        control_plane: API-side jobs (verdict index refresh, live event ticks).
+        """
         if not self.is_running:
+            self.roles = set(roles)
             self.recover_on_startup()
             
             # Add separate jobs for decoupled processing
             # Reduced frequency to prevent DB Lock (SQLite) contention with API calls
             # Phase 1: Crawl
-            self.scheduler.add_job(
-                self.crawl_loop, 
-                'interval', 
-                seconds=10, 
-                id='crawl_loop',
-                max_instances=2
-            )
-            self.scheduler.add_job(self.analysis_loop, 'interval', seconds=5, max_instances=2)
+            if ROLE_CRAWL in self.roles:
+                self.scheduler.add_job(
+                    self.crawl_loop, 
+                    'interval', 
+                    seconds=10, 
+                    id='crawl_loop',
+                    max_instances=2
+                )
+            if ROLE_ANALYZE in self.roles:
+                self.scheduler.add_job(self.analysis_loop, 'interval', seconds=5, max_instances=2)
+            if self.roles & {ROLE_CRAWL, ROLE_ANALYZE}:
+                # CRITICAL lane: reserved capacity for analyst submissions, independent of in-flight batches
+                self.scheduler.add_job(self.critical_lane, 'interval', seconds=2, id='critical_lane', max_instances=1)
+            if ROLE_INDEX in self.roles:
+                # Phase 3: Vector indexing, decoupled from the LLM loop. Single instance = no double pickup
+                self.scheduler.add_job(self.index_loop, 'interval', seconds=5, id='index_loop', max_instances=1)
+                # SQL <-> KB drift repair: fingerprint diff from the last checkpoint, bounded per run
+                self.scheduler.add_job(self.reconcile_kb, 'interval', minutes=get_settings().KB_RECONCILE_INTERVAL_MINUTES,
+                                       id='kb_reconcile', max_instances=1)
             
-            # Periodic LLM connection optimization (Every 5 mins)
-            from app.services.llm_service import llm_service
-            self.scheduler.add_job(llm_service.refresh_connection_status, 'interval', minutes=5)
-            # Run once immediately
-            llm_service.refresh_connection_status()
+            if ROLE_MAINTENANCE in self.roles:
+                # Phase 0: Feeds. Ticks every minute; each feed is only fetched once its own interval elapsed
+                self.scheduler.add_job(self.feed_loop, 'interval', seconds=60, id='feed_loop', max_instances=1)
+                # Edge snapshot export; the build is a no-op when verdicts are unchanged
+                from app.services.snapshot_service import snapshot_service
+                self.scheduler.add_job(snapshot_service.build, 'interval', minutes=15, id='snapshot_build', max_instances=1)
+                # Retry dequeue: failed items whose jittered backoff elapsed go back to their stage's queue
+                self.scheduler.add_job(retry_policy.promote_due, 'interval', seconds=30, id='retry_promote', max_instances=1)
+                # Move PipelineLog rows past the retention window into compressed daily archives
+                from app.services.log_retention import log_retention
+                self.scheduler.add_job(log_retention.rollover, 'interval', hours=1, id='log_rollover', max_instances=1)
+                # Persist host load, queue sizes and per-interval latency for the history charts
+                from app.services.metrics_service import metrics_sampler
+                self.scheduler.add_job(metrics_sampler.sample, 'interval', seconds=60, id='metrics_sample', max_instances=1)
+            
+            # Stage timeline rows are buffered and written in batches
+            self.scheduler.add_job(stage_timeline.flush, 'interval', seconds=5, id='timeline_flush', max_instances=1)
+            
+            from app.services.verdict_index import verdict_index
+            from app.services.event_bus import event_bus
+            event_bus.bind_loop(asyncio.get_event_loop())
+            if control_plane:
+                embedded = self.roles.issuperset(ROLES)
+                # Keep the in-memory verdict index in sync with writes from other processes/tools;
+                # with separate workers every new verdict arrives this way
+                self.scheduler.add_job(verdict_index.refresh, 'interval', seconds=60 if embedded else 5,
+                                       id='verdict_refresh', max_instances=1)
+                # Live event throughput ticks (one shared status query, skipped without listeners)
+                self.scheduler.add_job(event_bus.tick, 'interval', seconds=5, id='event_tick', max_instances=1)
+                if not embedded:
+                    # Worker sessions publish into their own process; tail the DB for live events instead
+                    event_bus.tail_mode = True
+                    self.scheduler.add_job(event_bus.tail, 'interval', seconds=1, id='event_tail', max_instances=1)
+            
+            if ROLE_ANALYZE in self.roles:
+                # Periodic LLM connection optimization (Every 5 mins)
+                from app.services.llm_service import llm_service
+                self.scheduler.add_job(llm_service.refresh_connection_status, 'interval', minutes=5)
+                # Run once immediately
+                llm_service.refresh_connection_status()
             
             self.scheduler.start()
             self.is_running = True
@@ -67,64 +177,132 @@ class Orchestrator:
             from app.services.policy_service import policy_service
             loop = asyncio.get_event_loop()
             loop.run_in_executor(None, policy_service.load_policies)
+            if control_plane:
+                loop.run_in_executor(None, verdict_index.ensure_loaded)
+            if ROLE_INDEX in self.roles:
+                # Index analysed domains missing from the keyword index (first run / imports)
+                from app.services.kb_search import kb_search
+                loop.run_in_executor(None, kb_search.backfill)
             
-            logger.info("Orchestrator started with decoupled pipelines (Crawl & Analysis).")
+            logger.info(f"Orchestrator started (roles: {', '.join(sorted(self.roles)) or 'none, control plane only'}).")
 
     def stop(self):
         if self.is_running:
             self.scheduler.shutdown()
+            stage_timeline.flush()
+            postprocessor.shutdown()
             self.is_running = False
             logger.info("Orchestrator stopped.")
 
     def recover_on_startup(self):
         """
-        Reset items stuck in active states from previous runs/crashes.
+        Reset items stuck in active states from previous runs/crashes: every lease when
+        this process runs all stages, otherwise only orphaned leases of its own stages.
         """
-        db = SessionLocal()
+        statuses = [status for role, status in ((ROLE_CRAWL, PipelineStatus.CRAWLING),
+                                                (ROLE_ANALYZE, PipelineStatus.ANALYZING)) if role in self.roles]
+        if not statuses:
+            return
+        counts = leases.release(statuses, orphaned_only=not self.roles.issuperset(ROLES), reason="Startup recovery")
+        if any(counts.values()):
+            logger.info(f"Recovery: Reset {counts.get('CRAWLING', 0)} crawling and {counts.get('ANALYZING', 0)} analyzing items.")
+
+    async def drain(self, deadline_seconds: Optional[float] = None) -> Dict[str, object]:
+        """
+        Stop claiming, give in-flight crawls/analyses (batch, critical lane, fast lane) until
+        the deadline to finish, then cancel the rest and release their leases in bulk.
+        Crawl and analysis results are committed as soon as their network call returns,
+        so finished work is never redone; buffered stage timings are flushed.
+        """
+        if deadline_seconds is None:
+            deadline_seconds = get_settings().DRAIN_DEADLINE_SECONDS
+        self.draining = True
+        started = time.monotonic()
+        in_flight = len(self._inflight)
+        logger.info(f"Draining: {in_flight} in-flight items, deadline {deadline_seconds}s")
+        # Sleep first: tasks for a batch claimed just before the drain start on the next loop turn
+        while True:
+            await asyncio.sleep(0.2)
+            if not (self._inflight or self._index_busy) or time.monotonic() - started >= deadline_seconds:
+                break
+
+        leftovers = dict(self._inflight)
+        for _, task in leftovers.values():
+            task.cancel()
+        if leftovers:
+            await asyncio.gather(*(task for _, task in leftovers.values()), return_exceptions=True)
+        released = leases.release([PipelineStatus.CRAWLING, PipelineStatus.ANALYZING], item_ids=list(leftovers),
+                                  owners={leases.WORKER_ID}, reason="Drain deadline")
+        stage_timeline.flush()
+        summary = {
+            "in_flight": in_flight,
+            "finished": in_flight - len(leftovers),
+            "cancelled": len(leftovers),
+            "released": released,
+            "seconds": round(time.monotonic() - started, 2)
+        }
+        logger.info(f"Drain complete: {summary}")
+        return summary
+
+    def resume(self):
+        self.draining = False
+        logger.info("Drain lifted, claiming resumed")
+
+    def _track(self, item_id: int, stage: str):
+        task = asyncio.current_task()
+        if task is not None:
+            self._inflight[item_id] = (stage, task)
+
+    async def feed_loop(self):
+        """
+        Phase 0: Fetch due threat feeds concurrently -> new DISCOVERED items
+        """
+        self.last_run["feed_loop"] = datetime.now()
+        if self.draining:
+            return
+        from app.services.feed_service import feed_service
         try:
-            # 1. Reset CRAWLING -> DISCOVERED (So they get picked up again)
-            stuck_crawling = db.query(PipelineItem).filter(PipelineItem.status == PipelineStatus.CRAWLING).all()
-            for item in stuck_crawling:
-                item.status = PipelineStatus.DISCOVERED
-                db.add(PipelineLog(item_id=item.id, stage="SYSTEM", level="WARNING", message="Reset from stuck CRAWLING state"))
-            
-            # 2. Reset ANALYZING -> CRAWLED_SUCCESS (So they get picked up by analysis loop)
-            stuck_analyzing = db.query(PipelineItem).filter(PipelineItem.status == PipelineStatus.ANALYZING).all()
-            for item in stuck_analyzing:
-                item.status = PipelineStatus.CRAWLED_SUCCESS
-                db.add(PipelineLog(item_id=item.id, stage="SYSTEM", level="WARNING", message="Reset from stuck ANALYZING state"))
-                
-            db.commit()
-            if stuck_crawling or stuck_analyzing:
-                logger.info(f"Recovery: Reset {len(stuck_crawling)} crawling and {len(stuck_analyzing)} analyzing items.")
+            new_items = await feed_service.fetch_due_feeds()
+            if new_items:
+                logger.info(f"Feed loop discovered {new_items} new items")
+        except asyncio.CancelledError:
+            logger.warning("Feed loop was cancelled - shutting down gracefully")
+            raise
         except Exception as e:
-            logger.error(f"Recovery failed: {e}")
-        finally:
-            db.close()
+            logger.error(f"Feed Loop Error: {e}", exc_info=True)
+
+    async def critical_lane(self):
+        """
+        CRITICAL items (analyst submissions) bypass the batch loops: picked up within
+        seconds with their own small concurrency, even while bulk batches are in flight.
+        Claims commit before any await, so the lane and the batch loops never double-pick.
+        """
+        lanes = []
+        if ROLE_CRAWL in self.roles:
+            lanes.append(self.crawl_loop(critical_only=True))
+        if ROLE_ANALYZE in self.roles:
+            lanes.append(self.analysis_loop(critical_only=True))
+        await asyncio.gather(*lanes)
 
-    async def crawl_loop(self):
+    async def crawl_loop(self, critical_only: bool = False):
         """
         Phase 1: DISCOVERED -> CRAWLING -> CRAWLED_SUCCESS (or FAIL)
         """
-        self.last_run["crawl_loop"] = datetime.now()
-        # print("[DEBUG] Crawl Loop Heartbeat")
+        if not critical_only:
+            self.last_run["crawl_loop"] = datetime.now()
+        if self.draining:
+            return
         db = SessionLocal()
         try:
-            # Fetch DISCOVERED items
-            print("[DEBUG] Fetching DISCOVERED items...")
-            items = db.query(PipelineItem).filter(
-                PipelineItem.status == PipelineStatus.DISCOVERED
-            ).order_by(
-                PipelineItem.priority.asc(),
-                PipelineItem.created_at.asc()
-            ).limit(self.crawl_batch_size).all()
+            # Fetch DISCOVERED items: CRITICAL first, then each (priority, source) class's fair share
+            if critical_only:
+                items = fair_scheduler.select_critical(db, PipelineStatus.DISCOVERED, self.critical_batch_size)
+            else:
+                items = fair_scheduler.select(db, PipelineStatus.DISCOVERED, self.crawl_batch_size)
 
             if not items:
-                print("[DEBUG] No items found to crawl.")
                 return
 
-            print(f"[DEBUG] Found {len(items)} items. Checking policies...")
-
             logger.info(f"--- Processing Crawl Batch: {len(items)} items ---")
 
             # Filter Blocked Items
@@ -132,24 +310,28 @@ class Orchestrator:
             if not policy_service.oisd_loaded:
                 policy_service.load_policies()
             
-            valid_items = []
+            candidates = []
             for item in items:
                 if policy_service.is_blocked(item.fqdn):
                     item.status = PipelineStatus.BLOCKED
                     db.add(PipelineLog(item_id=item.id, stage="POLICY", level="WARNING", message="Blocked by policy (OISD/DB)"))
                 else:
-                    item.status = PipelineStatus.CRAWLING
-                    item.updated_at = datetime.now()
-                    valid_items.append(item)
+                    candidates.append(item)
+            metrics.commit(db, "crawl_policy")
             
-            db.commit()
+            # Conditional claim: another worker may have selected the same rows
+            enqueued = {item.id: enqueued_at(item) for item in candidates}
+            with metrics.DB_COMMIT.time(stage="crawl_claim"):
+                claimed = leases.claim(db, candidates, PipelineStatus.DISCOVERED, PipelineStatus.CRAWLING)
+            valid_items = [(item, _claim(item, "crawl", enqueued[item.id])) for item in claimed]
+            invalidate(TAG_PIPELINE)
 
             # Process concurrently
             if valid_items:
                 logger.info(f"Executing crawl for {len(valid_items)} non-blocked items")
                 tasks = []
-                for item in valid_items:
-                    tasks.append(self.process_crawl(item.id, item.fqdn))
+                for item, enqueued in valid_items:
+                    tasks.append(self.process_crawl(item.id, item.fqdn, enqueued))
                 
                 # Use return_exceptions to prevent one failure from killing all tasks
                 results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -158,6 +340,7 @@ class Orchestrator:
                 for i, result in enumerate(results):
                     if isinstance(result, Exception):
                         logger.error(f"Crawl task {i} failed: {result}")
+                invalidate(TAG_PIPELINE)
             else:
                 logger.info("No valid items to crawl in this batch after policy filter.")
 
@@ -170,32 +353,51 @@ class Orchestrator:
         finally:
             db.close()
 
-    async def process_crawl(self, item_id: int, fqdn: str):
+    async def process_crawl(self, item_id: int, fqdn: str, enqueued: Optional[datetime] = None):
+        self._track(item_id, STAGE_CRAWL)
         db = SessionLocal()
+        started_at = datetime.now()
+        outcome, bytes_in = "error", None
         try:
             url = f"https://{fqdn}"
+            started = time.perf_counter()
             result = await self.crawler.crawl_page(url)
+            CRAWL_FETCH.observe(time.perf_counter() - started, outcome="ok" if result.get("content") else "fail")
             
             content_path = None
             status = PipelineStatus.CRAWLED_FAIL
+            features = {}
             
             if result.get("content"):
                 data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data/crawled")
-                os.makedirs(data_dir, exist_ok=True)
                 filename = f"{fqdn}_{datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
                 filepath = os.path.join(data_dir, filename)
                 
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(result["content"])
+                # Hashing/title extraction in the process pool while a thread writes the artifact
+                content_bytes = result["content"].encode("utf-8")
+                features, _ = await asyncio.gather(
+                    postprocessor.features(content_bytes, result.get("html")),
+                    asyncio.to_thread(_write_artifact_timed, filepath, content_bytes)
+                )
                 
                 content_path = f"data/crawled/{filename}"
                 status = PipelineStatus.CRAWLED_SUCCESS
+                bytes_in = len(content_bytes)
             
             # Update DB
             item = db.query(PipelineItem).filter(PipelineItem.id == item_id).first()
             if item:
-                item.status = status
-                item.updated_at = datetime.now()
+                if status == PipelineStatus.CRAWLED_SUCCESS:
+                    item.status = status
+                    item.updated_at = datetime.now()
+                    item.retry_count = 0
+                    item.next_retry_at = None
+                    item.last_error_class = None
+                    outcome = "ok"
+                else:
+                    outcome = retry.classify_crawl_failure(result.get("status"), result.get("error"))
+                    retry_policy.schedule(db, item, PipelineStatus.CRAWLED_FAIL, outcome, "CRAWLER",
+                                          detail=f"status {result.get('status')}, {(result.get('error') or '')[:200]}")
                 
                 # Upsert CrawlResult
                 existing_res = db.query(CrawlResult).filter(CrawlResult.item_id == item.id).first()
@@ -203,7 +405,8 @@ class Orchestrator:
                     existing_res.url = result.get("url")
                     existing_res.http_status = result.get("status")
                     existing_res.html_content_path = content_path
-                    existing_res.title = result.get("error") if result.get("error") else None
+                    existing_res.title = result.get("error") if result.get("error") else features.get("title")
+                    existing_res.content_hash = features.get("content_hash")
                     existing_res.crawled_at = datetime.now() # Update timestamp if schema has it, otherwise default update
                 else:
                     crawl_res = CrawlResult(
@@ -211,18 +414,14 @@ class Orchestrator:
                         url=result.get("url"),
                         http_status=result.get("status"),
                         html_content_path=content_path,
-                        title=result.get("error") if result.get("error") else None 
+                        title=result.get("error") if result.get("error") else features.get("title"),
+                        content_hash=features.get("content_hash")
                     )
                     db.add(crawl_res)
                 
-                log = PipelineLog(
-                    item_id=item.id,
-                    stage="CRAWLER",
-                    level="INFO" if status == PipelineStatus.CRAWLED_SUCCESS else "ERROR",
-                    message=f"Crawl finished with status {result.get('status')}"
-                )
-                db.add(log)
-                db.commit()
+                # Successful crawls are recorded in the stage timeline only; failures log via retry_policy
+                metrics.commit(db, "crawl")
+                STAGE_ITEMS.inc(stage="crawl", outcome="ok" if status == PipelineStatus.CRAWLED_SUCCESS else "fail")
                 
         except Exception as e:
             logger.error(f"Failed to crawl item {item_id} ({fqdn}): {e}")
@@ -230,43 +429,46 @@ class Orchestrator:
             try:
                 item = db.query(PipelineItem).filter(PipelineItem.id == item_id).first()
                 if item:
-                    item.status = PipelineStatus.CRAWLED_FAIL
+                    outcome = retry.classify_crawl_failure(None, str(e))
+                    retry_policy.schedule(db, item, PipelineStatus.CRAWLED_FAIL, outcome, "CRAWLER", detail=str(e)[:200])
                     db.commit()
             except:
                 pass
         finally:
             db.close()
+            self._inflight.pop(item_id, None)
+            stage_timeline.record(item_id, STAGE_CRAWL, fqdn, started_at, datetime.now(), outcome,
+                                  enqueued=enqueued, bytes_in=bytes_in)
 
-    async def analysis_loop(self):
+    async def analysis_loop(self, critical_only: bool = False):
         """
-        Phase 2: CRAWLED_SUCCESS -> ANALYZING -> COMPLETED
+        Phase 2: CRAWLED_SUCCESS -> ANALYZING -> INDEXING
         """
-        self.last_run["analysis_loop"] = datetime.now()
-        # logger.info("[DEBUG] Analysis Loop Triggered")
+        if not critical_only:
+            self.last_run["analysis_loop"] = datetime.now()
+        if self.draining:
+            return
         db = SessionLocal()
         try:
-            items = db.query(PipelineItem).filter(
-                PipelineItem.status == PipelineStatus.CRAWLED_SUCCESS
-            ).order_by(
-                PipelineItem.priority.asc(),
-                PipelineItem.updated_at.asc()
-            ).limit(self.analysis_batch_size).all()
-
-            logger.info(f"[DEBUG] Analysis Loop found {len(items)} items")
+            if critical_only:
+                items = fair_scheduler.select_critical(db, PipelineStatus.CRAWLED_SUCCESS, self.critical_batch_size)
+            else:
+                items = fair_scheduler.select(db, PipelineStatus.CRAWLED_SUCCESS, self.analysis_batch_size)
 
             if not items:
                 return
 
-            # Mark as ANALYZING immediately to avoid double pickup
-            for item in items:
-                item.status = PipelineStatus.ANALYZING
-                item.updated_at = datetime.now()
-            db.commit()
+            # Mark as ANALYZING immediately (conditionally) to avoid double pickup across workers
+            enqueued = {item.id: enqueued_at(item) for item in items}
+            with metrics.DB_COMMIT.time(stage="analysis_claim"):
+                claimed = leases.claim(db, items, PipelineStatus.CRAWLED_SUCCESS, PipelineStatus.ANALYZING)
+            claims = [(item, _claim(item, "analysis", enqueued[item.id])) for item in claimed]
+            invalidate(TAG_PIPELINE)
 
             # Process concurrently (LLM calls are I/O bound on network)
             tasks = []
-            for item in items:
-                tasks.append(self.process_analysis(item.id, item.fqdn))
+            for item, enqueued in claims:
+                tasks.append(self.process_analysis(item.id, item.fqdn, enqueued))
             
             if tasks:
                 # Use return_exceptions to prevent one failure from killing all tasks
@@ -276,6 +478,7 @@ class Orchestrator:
                 for i, result in enumerate(results):
                     if isinstance(result, Exception):
                         logger.error(f"Analysis task {i} failed: {result}")
+                invalidate(TAG_PIPELINE, TAG_CATEGORIES)
 
         except asyncio.CancelledError:
             logger.warning("Analysis loop was cancelled - shutting down gracefully")
@@ -286,42 +489,54 @@ class Orchestrator:
         finally:
             db.close()
 
-    async def process_analysis(self, item_id: int, fqdn: str):
+    async def process_analysis(self, item_id: int, fqdn: str, enqueued: Optional[datetime] = None):
+        self._track(item_id, STAGE_ANALYZE)
+        started_at = datetime.now()
+        outcome, tokens = "error", None
         # Determine strict timeout for LLM task wrapper to prevent hanging forever
         try:
-            await asyncio.wait_for(self._process_analysis_logic(item_id, fqdn), timeout=120)
+            outcome, tokens = await asyncio.wait_for(self._process_analysis_logic(item_id, fqdn), timeout=120)
         except asyncio.TimeoutError:
+            outcome = "timeout"
             logger.error(f"Analysis Task Timeout for {fqdn}")
             # Correct db status in a fresh session
             db = SessionLocal()
             try:
                 item = db.query(PipelineItem).filter(PipelineItem.id == item_id).first()
                 if item:
-                    item.status = PipelineStatus.ANALYSIS_FAIL
-                    db.add(PipelineLog(item_id=item.id, stage="LLM", level="ERROR", message="Analysis Task Timeout"))
+                    retry_policy.schedule(db, item, PipelineStatus.ANALYSIS_FAIL, retry.TIMEOUT, "LLM",
+                                          detail="Analysis Task Timeout")
                     db.commit()
             finally:
                 db.close()
+        finally:
+            self._inflight.pop(item_id, None)
+            stage_timeline.record(item_id, STAGE_ANALYZE, fqdn, started_at, datetime.now(), outcome,
+                                  enqueued=enqueued, tokens=tokens)
 
     async def _process_analysis_logic(self, item_id: int, fqdn: str):
+        """
+        Returns (outcome, llm_tokens) for the stage timeline.
+        """
         logger.info(f"Starting analysis logic for {item_id} ({fqdn})")
         db = SessionLocal()
+        tokens = None
         try:
             item = db.query(PipelineItem).filter(PipelineItem.id == item_id).first()
             if not item: 
-                return
+                return "missing", None
 
             # Need to read the content to send to LLM
             # We fetch the CrawlResult associated
             from app.models.pipeline import CrawlResult, AnalysisResult
-            from app.services.llm_service import llm_service
+            from app.services.llm_service import llm_service, last_token_usage, last_outcome
             
             crawl_res = db.query(CrawlResult).filter(CrawlResult.item_id == item.id).first()
             if not crawl_res or not crawl_res.html_content_path:
-                item.status = PipelineStatus.ANALYSIS_FAIL
-                db.add(PipelineLog(item_id=item.id, stage="LLM", level="ERROR", message="No content found for analysis"))
+                retry_policy.schedule(db, item, PipelineStatus.ANALYSIS_FAIL, retry.EMPTY_CONTENT, "LLM",
+                                      detail="No content found for analysis")
                 db.commit()
-                return
+                return retry.EMPTY_CONTENT, None
 
             # Read content from file
             # content is saved in backend folder so we need absolute path logic or relative to cwd
@@ -338,13 +553,12 @@ class Orchestrator:
                 base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
                 full_path = os.path.join(base_dir, crawl_res.html_content_path) 
                 
-                with open(full_path, "r", encoding="utf-8") as f:
-                    content = f.read()
+                content = await asyncio.to_thread(read_artifact, full_path)
             except Exception as e:
-                item.status = PipelineStatus.ANALYSIS_FAIL
-                db.add(PipelineLog(item_id=item.id, stage="LLM", level="ERROR", message=f"File read error: {e}"))
+                retry_policy.schedule(db, item, PipelineStatus.ANALYSIS_FAIL, retry.EMPTY_CONTENT, "LLM",
+                                      detail=f"File read error: {e}")
                 db.commit()
-                return
+                return retry.EMPTY_CONTENT, None
 
             # Call LLM
             # Note: llm_service.analyze_content IS synchronous (requests library), 
@@ -360,12 +574,17 @@ class Orchestrator:
             # so we should run it in an executor to avoid blocking the asyncio loop!
             # UPDATE: Using Async HTTPX client now for better concurrency
             logger.info(f"DEBUG: Processing {fqdn} via Async HTTPX...")
+            started = time.perf_counter()
+            last_token_usage.set(None)
+            last_outcome.set(None)
             try:
                 analysis_data = await llm_service.analyze_content_async(fqdn, content, category_defs)
                 logger.info(f"DEBUG: LLM returned for {fqdn}: {analysis_data is not None}")
             except Exception as e:
                  logger.error(f"DEBUG: Critical Error in Async LLM call for {fqdn}: {e}")
                  analysis_data = None
+            processing_time_ms = int((time.perf_counter() - started) * 1000)
+            tokens = last_token_usage.get()
 
             if analysis_data:
                 # Upsert AnalysisResult
@@ -376,7 +595,10 @@ class Orchestrator:
                     existing_analysis.confidence_score = analysis_data.get("confidence_score", 0.0)
                     existing_analysis.summary = analysis_data.get("summary", "")
                     existing_analysis.llm_model_used = analysis_data.get("llm_model_used", "unknown")
-                    existing_analysis.analyzed_at = datetime.now()
+                    # UTC like the column's server default (CURRENT_TIMESTAMP): verdict_index.refresh uses it as a watermark
+                    existing_analysis.analyzed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+                    existing_analysis.processing_time_ms = processing_time_ms
+                    existing_analysis.vector_id = None # Stale until index_loop re-embeds it
                 else:
                     analysis_res = AnalysisResult(
                         item_id=item.id,
@@ -384,51 +606,233 @@ class Orchestrator:
                         is_malicious=analysis_data.get("is_malicious", False),
                         confidence_score=analysis_data.get("confidence_score", 0.0),
                         summary=analysis_data.get("summary", ""),
-                        llm_model_used=analysis_data.get("llm_model_used", "unknown")
+                        llm_model_used=analysis_data.get("llm_model_used", "unknown"),
+                        processing_time_ms=processing_time_ms
                     )
                     db.add(analysis_res)
                 
-                item.status = PipelineStatus.COMPLETED
-                item.completed_at = datetime.now()
+                # Vector indexing happens in index_loop, so the LLM loop never waits on embeddings
+                item.status = PipelineStatus.INDEXING
+                item.retry_count = 0
+                item.next_retry_at = None
+                item.last_error_class = None
                 db.add(PipelineLog(item_id=item.id, stage="LLM", level="INFO", message=f"Classified as {analysis_data.get('category_main')}"))
-                
-                # --- Step 3: Index to Vector DB ---
-                # TEMPORARILY DISABLED TO STABILIZE PIPELINE
-                # try:
-                #     from app.services.vector_service import vector_service
-                #     rich_summary = f"Summary: {analysis_data.get('summary', '')}\n\nEvidence: {content[:1000]}"
-                #     vector_service.add_item(
-                #         fqdn=fqdn,
-                #         content_summary=rich_summary,
-                #         category=analysis_data.get("category_main", "Unknown"),
-                #         is_malicious=analysis_data.get("is_malicious", False)
-                #     )
-                #     if 'analysis_res' in locals():
-                #         analysis_res.vector_id = fqdn
-                #     db.add(PipelineLog(item_id=item.id, stage="VECTOR", level="INFO", message="Indexed to KB"))
-                # except Exception as ve:
-                #     logger.error(f"Vector Indexing Failed for {fqdn}: {ve}")
-                #     db.add(PipelineLog(item_id=item.id, stage="VECTOR", level="ERROR", message=f"Indexing failed: {ve}"))
 
             else:
-                item.status = PipelineStatus.ANALYSIS_FAIL
-                db.add(PipelineLog(item_id=item.id, stage="LLM", level="ERROR", message="LLM returned no data"))
+                llm_outcome = last_outcome.get() or "error"
+                failure_class = retry.LLM_PARSE if llm_outcome == "parse_error" else retry.LLM_UNAVAILABLE
+                retry_policy.schedule(db, item, PipelineStatus.ANALYSIS_FAIL, failure_class, "LLM",
+                                      detail=f"LLM returned no data ({llm_outcome})")
             
             logger.warning(f"DEBUG: committing transaction for {fqdn}...")
-            db.commit()
+            metrics.commit(db, "analysis")
+            STAGE_ITEMS.inc(stage="analysis", outcome="ok" if analysis_data else "fail")
             logger.warning(f"DEBUG: transaction committed for {fqdn} (Status: {item.status})")
 
+            if analysis_data:
+                from app.services.verdict_index import verdict_index
+                verdict_index.upsert(
+                    fqdn,
+                    analysis_data.get("category_main", "Unknown"),
+                    analysis_data.get("is_malicious", False),
+                    analysis_data.get("confidence_score", 0.0)
+                )
+            return ("ok" if analysis_data else failure_class), tokens
+
         except Exception as e:
             logger.error(f"Analysis Logic Error for {fqdn}: {e}")
             db.rollback()
             try:
                 item = db.query(PipelineItem).filter(PipelineItem.id == item_id).first()
                 if item:
-                    item.status = PipelineStatus.ANALYSIS_FAIL
+                    retry_policy.schedule(db, item, PipelineStatus.ANALYSIS_FAIL, retry.UNKNOWN, "LLM", detail=str(e)[:200])
                     db.commit()
             except:
                 pass
+            return retry.UNKNOWN, tokens
+        finally:
+            db.close()
+
+    async def index_loop(self):
+        """
+        Phase 3: INDEXING -> COMPLETED (embed + upsert into the Vector KB)
+        Also backfills COMPLETED items that have no vector_id (manual KB edits, drift).
+        Failed writes back off via retry_policy (VECTOR_WRITE) and dead-letter to MANUAL_REVIEW.
+        """
+        self.last_run["index_loop"] = datetime.now()
+        if self.draining:
+            return
+        from app.services.vector_service import vector_service
+        if not await vector_service.available_async():
+            self._complete_unindexed()
+            return
+
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            due = or_(PipelineItem.next_retry_at.is_(None), PipelineItem.next_retry_at <= now)
+            base = db.query(PipelineItem, AnalysisResult, CrawlResult)\
+                .join(AnalysisResult, PipelineItem.id == AnalysisResult.item_id)\
+                .outerjoin(CrawlResult, PipelineItem.id == CrawlResult.item_id)\
+                .filter(due)
+
+            rows = base.filter(PipelineItem.status == PipelineStatus.INDEXING)\
+                .order_by(PipelineItem.priority.asc(), PipelineItem.updated_at.asc())\
+                .limit(self.index_batch_size).all()
+
+            # Only backfill when fresh analyses are not waiting
+            if not rows:
+                rows = base.filter(
+                    PipelineItem.status == PipelineStatus.COMPLETED,
+                    AnalysisResult.vector_id.is_(None)
+                ).limit(self.index_batch_size).all()
+
+            if not rows:
+                return
+
+            snapshot = [
+                (item.id, item.fqdn, analysis.summary, analysis.category_main or "Unknown", bool(analysis.is_malicious),
+                 crawl.html_content_path if crawl else None, crawl.title if crawl else None)
+                for item, analysis, crawl in rows
+            ]
+
+            # Backfill rows (already COMPLETED) are not queue work; only time fresh ones
+            claims = {item.id: _claim(item, "index") for item, _, _ in rows if item.status == PipelineStatus.INDEXING}
+            started_at = datetime.now()
+
+            self._index_busy = True
+            error = "vector write failed"
+            try:
+                with INDEX_BATCH.time():
+                    stats = await vector_service.run_write(self._index_batch, snapshot)
+            except Exception as e:
+                # The whole batch failed (e.g. Chroma went away mid-write): every row backs off
+                logger.error(f"Index batch failed: {e}")
+                error = str(e)[:200]
+                stats = {"failed_ids": [row[1] for row in snapshot], "upserted": 0, "skipped": 0, "metadata_only": 0}
+            finally:
+                self._index_busy = False
+
+            failed = set(stats["failed_ids"])
+            now = datetime.now()
+            indexed = 0
+            for item, analysis, crawl in rows:
+                if item.id in claims:
+                    stage_timeline.record(item.id, STAGE_INDEX, item.fqdn, started_at, now,
+                                          "fail" if item.fqdn in failed else "ok", enqueued=claims[item.id])
+                if item.fqdn in failed:
+                    # Status stays (INDEXING, or COMPLETED for backfill) with next_retry_at set
+                    retry_policy.schedule(db, item, item.status, retry.VECTOR_WRITE, "VECTOR", detail=error)
+                    continue
+                analysis.vector_id = item.fqdn
+                if item.last_error_class == retry.VECTOR_WRITE:
+                    item.retry_count = 0
+                    item.next_retry_at = None
+                    item.last_error_class = None
+                if item.status == PipelineStatus.INDEXING:
+                    item.status = PipelineStatus.COMPLETED
+                    item.completed_at = now
+                    item.updated_at = now
+                indexed += 1
+            metrics.commit(db, "index")
+            STAGE_ITEMS.inc(indexed, stage="index", outcome="ok")
+            if failed:
+                STAGE_ITEMS.inc(len(failed), stage="index", outcome="fail")
+            invalidate(TAG_PIPELINE, TAG_KB, TAG_CATEGORIES)
+            logger.info(f"Index loop: {indexed} indexed, {len(failed)} failed "
+                        f"(embedded={stats['upserted']}, unchanged={stats['skipped'] + stats['metadata_only']})")
+
+        except asyncio.CancelledError:
+            logger.warning("Index loop was cancelled - shutting down gracefully")
+            raise
+        except Exception as e:
+            logger.error(f"Index Loop Error: {e}", exc_info=True)
+            db.rollback()
         finally:
             db.close()
 
+    def _complete_unindexed(self):
+        """
+        Vector store down: finish analysed items without a vector so the KB views still list
+        them (vector_status "Pending"); index_loop backfills them once the store is back.
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            completed = db.query(PipelineItem).filter(PipelineItem.status == PipelineStatus.INDEXING)\
+                .update({PipelineItem.status: PipelineStatus.COMPLETED, PipelineItem.completed_at: now,
+                         PipelineItem.updated_at: now, PipelineItem.next_retry_at: None},
+                        synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            logger.error(f"Completing unindexed items failed: {e}")
+            db.rollback()
+            return
+        finally:
+            db.close()
+        if completed:
+            logger.warning(f"Vector store unavailable: {completed} items completed without a vector (backfilled later)")
+            invalidate(TAG_PIPELINE, TAG_KB)
+
+    async def reconcile_kb(self):
+        """
+        Incremental SQL <-> vector KB reconciliation (see kb_reconcile). Runs on the vector
+        write executor, so it never interleaves with an index batch.
+        """
+        self.last_run["reconcile_kb"] = datetime.now()
+        if self.draining:
+            return
+        from app.services.kb_reconcile import kb_reconciler, REASONS
+        from app.services.vector_service import vector_service
+        settings = get_settings()
+        try:
+            summary = await vector_service.run_write(kb_reconciler.run, True, settings.KB_RECONCILE_BATCH_SIZE,
+                                                     settings.KB_RECONCILE_MAX_CHANGES)
+        except Exception as e:
+            logger.error(f"KB reconcile failed: {e}", exc_info=True)
+            return
+        drift = {reason: summary.get(reason, 0) for reason in REASONS if summary.get(reason)}
+        if not drift:
+            return
+        invalidate(TAG_KB, TAG_CATEGORIES)
+        db = SessionLocal()
+        try:
+            db.add(PipelineLog(item_id=None, stage="KB_RECONCILE", level="WARNING",
+                               message=f"Repaired KB drift: {', '.join(f'{k}={v}' for k, v in drift.items())}"))
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _index_batch(snapshot):
+        """
+        Runs in a worker thread: read crawl evidence once, then update the keyword
+        index and embed/upsert the batch into the vector store.
+        """
+        from app.services.vector_service import vector_service, read_crawl_evidence, compose_kb_summary
+        from app.services.kb_search import kb_search, EVIDENCE_CHARS
+        from app.services.kb_reconcile import source_hash
+        chunk_chars = get_settings().KB_CHUNK_EVIDENCE_CHARS
+        payloads = []
+        fts_rows = []
+        for item_id, fqdn, summary, category, is_malicious, content_path, title in snapshot:
+            # One read serves the document, the evidence chunks and the keyword index
+            evidence = read_crawl_evidence(content_path, max(EVIDENCE_CHARS, chunk_chars))
+            payloads.append({
+                "fqdn": fqdn,
+                "content_summary": compose_kb_summary(summary, evidence[:1000]),
+                "category": category,
+                "is_malicious": is_malicious,
+                "evidence": evidence[:chunk_chars],
+                "src_hash": source_hash(summary, category, content_path)
+            })
+            fts_rows.append({"id": item_id, "fqdn": fqdn, "title": title, "summary": summary,
+                             "evidence": evidence[:EVIDENCE_CHARS]})
+
+        try:
+            kb_search.upsert_many(fts_rows)
+        except Exception as e:
+            logger.error(f"KB keyword index update failed: {e}")
+        return vector_service.add_items(payloads)
+
 orchestrator = Orchestrator()
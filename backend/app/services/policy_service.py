@@ -11,6 +11,7 @@ class PolicyService:
         self.blacklist_trie = set()  # Using set for suffix checking optimization
         self.whitelist_set = set() # Exact matches for now, or use same logic
         self.oisd_loaded = False
+        self.loaded = False # DB + file policies loaded at least once
         
         # Paths
         self.project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
@@ -61,10 +62,15 @@ class PolicyService:
             logger.info(f"Loaded {len(filters)} policies from DB.")
         finally:
             db.close()
+        self.loaded = True
 
-    def is_blocked(self, fqdn: str) -> bool:
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load_policies()
+
+    def classify(self, fqdn: str):
         """
-        Check if FQDN is blocked.
+        Return "WHITELIST", "BLACKLIST" or None for an FQDN.
         Logic:
         1. Check Whitelist (Allow if match)
         2. Check Blacklist (Block if match)
@@ -73,27 +79,29 @@ class PolicyService:
         """
         fqdn = fqdn.lower().strip()
         
-        # 1. Whitelist Check (Pass-through)
         # Check all parent domains
         parts = fqdn.split('.')
         # Candidates: continued.com, example.continued.com ...
         # Range len(parts)-1 because TLD (com) usually isn't blocked alone, but maybe?
         # Let's check all segments down to TLD just in case.
+        candidates = [".".join(parts[i:]) for i in range(len(parts) - 1)] # stop before TLD alone? OISD includes domains.
         
-        for i in range(len(parts) - 1): # stop before TLD alone? OISD includes domains.
-            # i=0: full fqdn
-            # i=len-2: example.com
-            # i=len-1: com (Avoid)
-            sub = ".".join(parts[i:])
+        # 1. Whitelist Check (Pass-through)
+        for sub in candidates:
             if sub in self.whitelist_set:
-                return False # Explicitly Allowed
+                return "WHITELIST" # Explicitly Allowed
 
         # 2. Blacklist Check
-        for i in range(len(parts) - 1):
-            sub = ".".join(parts[i:])
+        for sub in candidates:
             if sub in self.blacklist_trie:
-                return True # Blocked
+                return "BLACKLIST" # Blocked
 
-        return False
+        return None
+
+    def is_blocked(self, fqdn: str) -> bool:
+        """
+        Check if FQDN is blocked (whitelist wins over blacklist).
+        """
+        return self.classify(fqdn) == "BLACKLIST"
 
 policy_service = PolicyService()
@@ -0,0 +1,131 @@
+"""
+CPU-bound post-crawl work (content hashing, title extraction) off the event loop.
+
+Large pages go to a process pool: the page bytes are placed in one shared memory
+block and only its name crosses the process boundary, so the payload is never
+pickled. Small pages are cheaper to handle in a thread than to ship to a process.
+This module only imports the standard library at the top: pool processes are
+spawned and import nothing else.
+"""
+import asyncio
+import hashlib
+import html
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_TITLE_RE = re.compile(rb"<title[^>]*>(.*?)</title\s*>", re.I | re.S)
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$", re.M)
+_WS_RE = re.compile(rb"\s+")
+TITLE_CHARS = 300
+# The <title> is in the first few KB of any sane page
+TITLE_SCAN_BYTES = 64 * 1024
+
+def extract_features(content: memoryview, page_html: memoryview) -> Dict[str, Any]:
+    """
+    content: the crawled markdown/text (UTF-8), page_html: the raw HTML (may be empty).
+    content_hash is over whitespace-normalised content, so re-crawls that only differ in
+    layout whitespace hash the same.
+    """
+    normalized = _WS_RE.sub(b" ", bytes(content)).strip()
+    title = None
+    match = _TITLE_RE.search(bytes(page_html[:TITLE_SCAN_BYTES]))
+    if match:
+        title = html.unescape(match.group(1).decode("utf-8", "replace"))
+    else:
+        heading = _HEADING_RE.search(bytes(content[:TITLE_SCAN_BYTES]).decode("utf-8", "replace"))
+        if heading:
+            title = heading.group(1)
+    if title:
+        title = " ".join(title.split())[:TITLE_CHARS] or None
+    return {
+        "content_hash": hashlib.sha256(normalized).hexdigest(),
+        "title": title,
+        "chars": len(normalized)
+    }
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Before 3.13 attaching registers the block again, but spawned pool processes
+        # share the parent's resource tracker, so that registration is a no-op
+        return shared_memory.SharedMemory(name=name)
+
+def _features_from_shm(name: str, content_len: int, html_len: int) -> Dict[str, Any]:
+    """Runs in a pool process."""
+    shm = _attach(name)
+    try:
+        buf = shm.buf
+        try:
+            return extract_features(buf[:content_len], buf[content_len:content_len + html_len])
+        finally:
+            del buf
+    finally:
+        shm.close()
+
+def _pool_size(configured: int) -> int:
+    if configured > 0:
+        return configured
+    # Leave one core to the event loop (browser driving, LLM I/O, DB)
+    return max((os.cpu_count() or 2) - 1, 1)
+
+class PostProcessor:
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            from app.core.config import get_settings
+            workers = _pool_size(get_settings().POSTPROCESS_WORKERS)
+            # spawn, not fork: the parent runs threads (scheduler pool, DB connections)
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Post-processing pool started with {workers} processes")
+        return self._pool
+
+    async def features(self, content: bytes, page_html: Optional[str] = None) -> Dict[str, Any]:
+        from app.core.config import get_settings
+        html_bytes = page_html.encode("utf-8", "replace") if page_html else b""
+        total = len(content) + len(html_bytes)
+        if total < get_settings().POSTPROCESS_INLINE_BYTES:
+            return await asyncio.to_thread(extract_features, memoryview(content), memoryview(html_bytes))
+
+        shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        try:
+            shm.buf[:len(content)] = content
+            shm.buf[len(content):total] = html_bytes
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._executor(), _features_from_shm, shm.name,
+                                                  len(content), len(html_bytes))
+            except BrokenProcessPool:
+                logger.error("Post-processing pool broke; restarting it, this page is handled in a thread")
+                self._pool = None
+                return await asyncio.to_thread(extract_features, memoryview(content), memoryview(html_bytes))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+def write_artifact(path: str, data: bytes):
+    """Blocking write of a crawl artifact; call via asyncio.to_thread."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def read_artifact(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+postprocessor = PostProcessor()
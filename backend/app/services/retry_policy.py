@@ -0,0 +1,186 @@
+import re
+import random
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_
+
+from app.core.database import SessionLocal
+from app.core.cache import invalidate, TAG_PIPELINE
+from app.models.pipeline import PipelineItem, PipelineLog, PipelineStatus
+
+logger = logging.getLogger(__name__)
+
+# Failure classes
+DNS = "DNS"
+TIMEOUT = "TIMEOUT"
+TLS = "TLS"
+CONNECTION = "CONNECTION"
+HTTP_4XX = "HTTP_4XX"
+HTTP_GONE = "HTTP_GONE"          # 404 / 410: the page is not coming back
+RATE_LIMITED = "RATE_LIMITED"    # 429
+HTTP_5XX = "HTTP_5XX"
+EMPTY_CONTENT = "EMPTY_CONTENT"  # fetched, but nothing to analyse (or the artifact is gone)
+LLM_PARSE = "LLM_PARSE"
+LLM_UNAVAILABLE = "LLM_UNAVAILABLE"
+STALLED = "STALLED"              # worker never finished (health monitor)
+VECTOR_WRITE = "VECTOR_WRITE"    # analysed, but the embed/upsert into the KB failed
+UNKNOWN = "UNKNOWN"
+
+@dataclass(frozen=True)
+class Rule:
+    max_attempts: int     # retries allowed for this class (further capped by item.max_retries)
+    base_delay: float     # seconds before the first retry; doubles per attempt
+    max_delay: float
+
+RULES = {
+    DNS: Rule(2, 6 * 3600, 24 * 3600),
+    TIMEOUT: Rule(4, 300, 6 * 3600),
+    TLS: Rule(2, 3600, 24 * 3600),
+    CONNECTION: Rule(3, 900, 12 * 3600),
+    HTTP_4XX: Rule(2, 6 * 3600, 24 * 3600),
+    HTTP_GONE: Rule(0, 0, 0),
+    RATE_LIMITED: Rule(5, 600, 6 * 3600),
+    HTTP_5XX: Rule(4, 600, 6 * 3600),
+    EMPTY_CONTENT: Rule(2, 3600, 24 * 3600),
+    LLM_PARSE: Rule(3, 120, 3600),
+    # The model server being down says nothing about the domain; retry patiently
+    LLM_UNAVAILABLE: Rule(8, 60, 1800),
+    STALLED: Rule(3, 300, 3600),
+    VECTOR_WRITE: Rule(5, 60, 3600),
+    UNKNOWN: Rule(3, 900, 12 * 3600),
+}
+
+_PATTERNS = [
+    (DNS, re.compile(r"ERR_NAME_NOT_RESOLVED|NXDOMAIN|getaddrinfo|Name or service not known|nodename nor servname|No address associated", re.I)),
+    (TLS, re.compile(r"ERR_CERT|ERR_SSL|SSL|TLS|certificate", re.I)),
+    (TIMEOUT, re.compile(r"timed? ?out|ERR_TIMED_OUT|Timeout", re.I)),
+    (CONNECTION, re.compile(r"ERR_CONNECTION|Connection (refused|reset|closed)|ERR_ADDRESS_UNREACHABLE|ERR_EMPTY_RESPONSE|network", re.I)),
+]
+
+def classify_crawl_failure(status: Optional[int], error: Optional[str]) -> str:
+    if status:
+        if status in (404, 410):
+            return HTTP_GONE
+        if status == 429:
+            return RATE_LIMITED
+        if 400 <= status < 500:
+            return HTTP_4XX
+        if status >= 500:
+            return HTTP_5XX
+    text = error or ""
+    for failure_class, pattern in _PATTERNS:
+        if pattern.search(text):
+            return failure_class
+    if status == 200 or "too short" in text.lower():
+        return EMPTY_CONTENT
+    return UNKNOWN
+
+def backoff_seconds(rule: Rule, attempt: int) -> float:
+    """
+    Exponential backoff with equal jitter: half the delay is fixed, half random,
+    so items failing together don't come back as one burst.
+    """
+    delay = min(rule.max_delay, rule.base_delay * (2 ** max(attempt - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def retry_target(status: str, failure_class: Optional[str]) -> PipelineStatus:
+    """
+    The status an item returns to when its retry is due.
+    """
+    if failure_class == VECTOR_WRITE:
+        return PipelineStatus.INDEXING
+    if failure_class in (LLM_PARSE, LLM_UNAVAILABLE):
+        return PipelineStatus.CRAWLED_SUCCESS
+    if status == PipelineStatus.ANALYSIS_FAIL and failure_class != EMPTY_CONTENT:
+        return PipelineStatus.CRAWLED_SUCCESS
+    return PipelineStatus.DISCOVERED
+
+class RetryPolicy:
+    """
+    Failure handling for pipeline items: classify, then either schedule a jittered
+    retry (status stays *_FAIL with next_retry_at) or move the item to MANUAL_REVIEW.
+    promote_due() is the retry dequeue: it returns due items to their stage's input status.
+    """
+    def schedule(self, db, item: PipelineItem, failed_status: PipelineStatus, failure_class: str,
+                 stage: str, detail: str = "") -> Optional[datetime]:
+        """
+        Mark item as failed (no commit). Returns the retry time, or None if dead-lettered.
+        """
+        rule = RULES.get(failure_class, RULES[UNKNOWN])
+        attempt = (item.retry_count or 0) + 1
+        allowed = min(rule.max_attempts, item.max_retries if item.max_retries is not None else 3)
+        item.retry_count = attempt
+        item.last_error_class = failure_class
+        item.updated_at = datetime.now()
+        suffix = f": {detail}" if detail else ""
+
+        if attempt > allowed:
+            item.status = PipelineStatus.MANUAL_REVIEW
+            item.next_retry_at = None
+            db.add(PipelineLog(item_id=item.id, stage=stage, level="WARNING",
+                               message=f"{failure_class} failure, moved to manual review after {attempt - 1} retries{suffix}"))
+            return None
+
+        item.status = failed_status
+        item.next_retry_at = datetime.now() + timedelta(seconds=backoff_seconds(rule, attempt))
+        db.add(PipelineLog(item_id=item.id, stage=stage, level="ERROR",
+                           message=f"{failure_class} failure, retry {attempt}/{allowed} at "
+                                   f"{item.next_retry_at.strftime('%Y-%m-%d %H:%M')}{suffix}"))
+        return item.next_retry_at
+
+    def promote_due(self) -> int:
+        """
+        Return failed items whose backoff elapsed to their stage's queue. Uses
+        ix_pipeline_items_status_retry; also drains legacy QUEUED items, which no loop reads.
+        """
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            due = PipelineItem.next_retry_at <= now
+            promoted = db.query(PipelineItem).filter(
+                or_(
+                    and_(PipelineItem.status == PipelineStatus.CRAWLED_FAIL, due),
+                    and_(PipelineItem.status == PipelineStatus.ANALYSIS_FAIL, due,
+                         PipelineItem.last_error_class == EMPTY_CONTENT),
+                    PipelineItem.status == PipelineStatus.QUEUED
+                )
+            ).update({
+                PipelineItem.status: PipelineStatus.DISCOVERED,
+                PipelineItem.next_retry_at: None,
+                PipelineItem.updated_at: now
+            }, synchronize_session=False)
+            promoted += db.query(PipelineItem).filter(
+                PipelineItem.status == PipelineStatus.ANALYSIS_FAIL, due
+            ).update({
+                PipelineItem.status: PipelineStatus.CRAWLED_SUCCESS,
+                PipelineItem.next_retry_at: None,
+                PipelineItem.updated_at: now
+            }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            logger.error(f"Retry promotion failed: {e}")
+            db.rollback()
+            return 0
+        finally:
+            db.close()
+        if promoted:
+            logger.info(f"Retry scheduler: {promoted} items due for retry")
+            invalidate(TAG_PIPELINE)
+        return promoted
+
+    def retry_now(self, db, item: PipelineItem) -> PipelineStatus:
+        """
+        Manual retry from the UI: resets the retry budget and requeues immediately (no commit).
+        """
+        target = retry_target(item.status, item.last_error_class)
+        item.status = target
+        item.retry_count = 0
+        item.next_retry_at = None
+        item.updated_at = datetime.now()
+        db.add(PipelineLog(item_id=item.id, stage="RETRY", level="INFO", message=f"Manual retry, requeued as {target.value}"))
+        return target
+
+retry_policy = RetryPolicy()
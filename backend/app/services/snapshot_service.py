@@ -0,0 +1,338 @@
+import os
+import io
+import gzip
+import json
+import math
+import mmap
+import struct
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.database import SessionLocal
+from app.models.pipeline import PipelineItem, AnalysisResult
+from app.services.verdict_index import VERDICT_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Verdict snapshot format (little-endian), one file per version: kb-v{version}.snap
+#
+#   header     HEADER (see below)
+#   categories u16 length + utf-8 name, repeated category_count times (id = position)
+#   bloom      bloom_bits / 8 bytes: Bloom filter over malicious fqdns
+#   records    RECORD per fqdn, sorted by fqdn bytes (binary-searchable in place)
+#   strings    concatenated utf-8 fqdns referenced by records
+#
+# Bloom bit positions: h1, h2 = two u64 from blake2b(fqdn, digest_size=16);
+# bit_i = (h1 + i * h2) mod bloom_bits for i in range(bloom_k).
+#
+# Delta files (kb-v{from}-v{to}.delta) are gzip NDJSON: a header line
+# {"from", "to"} followed by {"fqdn", "category", "malicious", "confidence"}
+# for added/changed entries and {"fqdn", "deleted": true} for removals.
+
+MAGIC = b"WINTSNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHHIQIIQIIII")
+RECORD = struct.Struct("<IHHBBxx")
+FLAG_MALICIOUS = 0x01
+
+BLOOM_FP_RATE = 0.001
+# Older full snapshots kept around (and diffed against) so edges can catch up with one delta
+KEEP_VERSIONS = 5
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "snapshots")
+
+Entry = Tuple[str, str, bool, int]  # fqdn, category, is_malicious, confidence (0-100)
+
+def _bloom_hashes(key: bytes) -> Tuple[int, int]:
+    digest = hashlib.blake2b(key, digest_size=16).digest()
+    h1, h2 = struct.unpack("<QQ", digest)
+    return h1, h2 | 1
+
+def bloom_size(n: int, fp_rate: float = BLOOM_FP_RATE) -> Tuple[int, int]:
+    """
+    Optimal (bits, hash count) for n items, bits rounded up to whole bytes.
+    """
+    n = max(n, 1)
+    bits = int(math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2)))
+    bits = max(64, (bits + 7) // 8 * 8)
+    k = max(1, int(round(bits / n * math.log(2))))
+    return bits, k
+
+def write_snapshot(path: str, version: int, entries: List[Entry]):
+    """
+    Serialize sorted entries into the snapshot format. Written to a temp file and renamed.
+    """
+    categories: Dict[str, int] = {}
+    for _, category, _, _ in entries:
+        if category not in categories:
+            categories[category] = len(categories)
+
+    cat_block = io.BytesIO()
+    for name in categories:
+        raw = name.encode("utf-8")
+        cat_block.write(struct.pack("<H", len(raw)))
+        cat_block.write(raw)
+    cat_bytes = cat_block.getvalue()
+
+    malicious = [fqdn for fqdn, _, is_malicious, _ in entries if is_malicious]
+    bloom_bits, bloom_k = bloom_size(len(malicious))
+    bloom = bytearray(bloom_bits // 8)
+    for fqdn in malicious:
+        h1, h2 = _bloom_hashes(fqdn.encode("utf-8"))
+        for i in range(bloom_k):
+            bit = (h1 + i * h2) % bloom_bits
+            bloom[bit >> 3] |= 1 << (bit & 7)
+
+    records = bytearray(RECORD.size * len(entries))
+    strings = io.BytesIO()
+    offset = 0
+    for idx, (fqdn, category, is_malicious, confidence) in enumerate(entries):
+        raw = fqdn.encode("utf-8")
+        RECORD.pack_into(records, idx * RECORD.size, offset, len(raw), categories[category],
+                         FLAG_MALICIOUS if is_malicious else 0, confidence)
+        strings.write(raw)
+        offset += len(raw)
+
+    cat_off = HEADER.size
+    bloom_off = cat_off + len(cat_bytes)
+    rec_off = bloom_off + len(bloom)
+    str_off = rec_off + len(records)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, bloom_k, version, int(datetime.now().timestamp()),
+                         len(entries), len(categories), bloom_bits, cat_off, bloom_off, rec_off, str_off)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(cat_bytes)
+        f.write(bloom)
+        f.write(records)
+        f.write(strings.getvalue())
+    os.replace(tmp_path, path)
+
+class SnapshotReader:
+    """
+    Memory-mapped reader for a snapshot file. Lookups binary-search the record
+    table in place, so nothing beyond the category names is loaded into memory.
+    """
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, fmt, self.bloom_k, self.version, self.created, self.count, n_categories,
+         self.bloom_bits, cat_off, self._bloom_off, self._rec_off, self._str_off) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"Not a verdict snapshot (format {fmt}): {path}")
+
+        self.categories: List[str] = []
+        pos = cat_off
+        for _ in range(n_categories):
+            (length,) = struct.unpack_from("<H", self._mm, pos)
+            self.categories.append(self._mm[pos + 2:pos + 2 + length].decode("utf-8"))
+            pos += 2 + length
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, idx: int) -> bytes:
+        offset, length, _, _, _ = RECORD.unpack_from(self._mm, self._rec_off + idx * RECORD.size)
+        start = self._str_off + offset
+        return self._mm[start:start + length]
+
+    def _entry(self, idx: int) -> Entry:
+        offset, length, category_id, flags, confidence = RECORD.unpack_from(self._mm, self._rec_off + idx * RECORD.size)
+        start = self._str_off + offset
+        fqdn = self._mm[start:start + length].decode("utf-8")
+        return fqdn, self.categories[category_id], bool(flags & FLAG_MALICIOUS), confidence
+
+    def might_be_malicious(self, fqdn: str) -> bool:
+        """
+        Bloom filter check: False is definitive, True needs confirming via lookup().
+        """
+        h1, h2 = _bloom_hashes(fqdn.encode("utf-8"))
+        for i in range(self.bloom_k):
+            bit = (h1 + i * h2) % self.bloom_bits
+            if not self._mm[self._bloom_off + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def lookup(self, fqdn: str) -> Optional[Entry]:
+        key = fqdn.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._key(lo) == key:
+            return self._entry(lo)
+        return None
+
+    def __iter__(self) -> Iterator[Entry]:
+        for idx in range(self.count):
+            yield self._entry(idx)
+
+def diff_entries(old: Iterator[Entry], new: List[Entry]) -> Iterator[dict]:
+    """
+    Sorted merge of two snapshots' entries; yields delta records.
+    """
+    old_iter = iter(old)
+    old_entry = next(old_iter, None)
+    for entry in new:
+        while old_entry is not None and old_entry[0].encode("utf-8") < entry[0].encode("utf-8"):
+            yield {"fqdn": old_entry[0], "deleted": True}
+            old_entry = next(old_iter, None)
+        if old_entry is not None and old_entry[0] == entry[0]:
+            if old_entry != entry:
+                yield {"fqdn": entry[0], "category": entry[1], "malicious": entry[2], "confidence": entry[3]}
+            old_entry = next(old_iter, None)
+        else:
+            yield {"fqdn": entry[0], "category": entry[1], "malicious": entry[2], "confidence": entry[3]}
+    while old_entry is not None:
+        yield {"fqdn": old_entry[0], "deleted": True}
+        old_entry = next(old_iter, None)
+
+class SnapshotService:
+    """
+    Compiles analysed verdicts into versioned snapshot files for edge proxies,
+    plus deltas from the last KEEP_VERSIONS versions to the newest one.
+    """
+    def __init__(self, snapshot_dir: str = SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self.manifest_path = os.path.join(snapshot_dir, "manifest.json")
+        self._build_lock = threading.Lock()
+
+    def snapshot_path(self, version: int) -> str:
+        return os.path.join(self.snapshot_dir, f"kb-v{version}.snap")
+
+    def delta_path(self, from_version: int, to_version: int) -> str:
+        return os.path.join(self.snapshot_dir, f"kb-v{from_version}-v{to_version}.delta")
+
+    def get_manifest(self) -> Optional[dict]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _collect_entries(self) -> List[Entry]:
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                PipelineItem.fqdn,
+                AnalysisResult.category_main,
+                AnalysisResult.is_malicious,
+                AnalysisResult.confidence_score
+            ).join(AnalysisResult, PipelineItem.id == AnalysisResult.item_id)\
+             .filter(PipelineItem.status.in_(VERDICT_STATUSES))\
+             .yield_per(10000)
+            entries = {}
+            for fqdn, category, is_malicious, confidence in rows:
+                confidence = int(round(min(max(float(confidence or 0.0), 0.0), 1.0) * 100))
+                entries[fqdn.lower()] = (fqdn.lower(), category or "Unknown", bool(is_malicious), confidence)
+        finally:
+            db.close()
+        return sorted(entries.values(), key=lambda e: e[0].encode("utf-8"))
+
+    @staticmethod
+    def _content_hash(entries: List[Entry]) -> str:
+        h = hashlib.sha256()
+        for fqdn, category, is_malicious, confidence in entries:
+            h.update(f"{fqdn}\t{category}\t{int(is_malicious)}\t{confidence}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def _file_hash(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def _write_delta(self, from_version: int, to_version: int, entries: List[Entry]) -> Optional[int]:
+        old_path = self.snapshot_path(from_version)
+        if not os.path.exists(old_path):
+            return None
+        path = self.delta_path(from_version, to_version)
+        count = 0
+        with SnapshotReader(old_path) as old, gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"from": from_version, "to": to_version}) + "\n")
+            for record in diff_entries(iter(old), entries):
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                count += 1
+        os.replace(f"{path}.tmp", path)
+        return count
+
+    def build(self, force: bool = False) -> dict:
+        """
+        Build a new snapshot version if verdicts changed since the last one.
+        """
+        with self._build_lock:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            manifest = self.get_manifest() or {"version": 0, "history": []}
+
+            entries = self._collect_entries()
+            content_hash = self._content_hash(entries)
+            if not force and manifest.get("content_hash") == content_hash:
+                logger.info(f"Snapshot v{manifest['version']} is current ({len(entries)} entries), skipping build")
+                return manifest
+
+            version = manifest["version"] + 1
+            path = self.snapshot_path(version)
+            write_snapshot(path, version, entries)
+
+            history = [v for v in manifest.get("history", []) if os.path.exists(self.snapshot_path(v))]
+            deltas = {}
+            for old_version in history[-KEEP_VERSIONS:]:
+                changes = self._write_delta(old_version, version, entries)
+                if changes is not None:
+                    deltas[str(old_version)] = {"file": os.path.basename(self.delta_path(old_version, version)),
+                                                "changes": changes}
+
+            new_manifest = {
+                "version": version,
+                "file": os.path.basename(path),
+                "sha256": self._file_hash(path),
+                "size": os.path.getsize(path),
+                "entries": len(entries),
+                "malicious": sum(1 for e in entries if e[2]),
+                "content_hash": content_hash,
+                "created_at": datetime.now().isoformat(),
+                "format_version": FORMAT_VERSION,
+                "deltas": deltas,
+                "history": (history + [version])[-(KEEP_VERSIONS + 1):]
+            }
+            self._write_manifest(new_manifest)
+            self._prune(new_manifest)
+            logger.info(f"Snapshot v{version} built: {len(entries)} entries, "
+                        f"{new_manifest['malicious']} malicious, {len(deltas)} deltas")
+            return new_manifest
+
+    def _prune(self, manifest: dict):
+        keep = {manifest["file"]} | {d["file"] for d in manifest["deltas"].values()}
+        keep |= {os.path.basename(self.snapshot_path(v)) for v in manifest["history"]}
+        for name in os.listdir(self.snapshot_dir):
+            if name.startswith("kb-v") and name not in keep:
+                try:
+                    os.remove(os.path.join(self.snapshot_dir, name))
+                except OSError as e:
+                    logger.warning(f"Failed to prune snapshot file {name}: {e}")
+
+snapshot_service = SnapshotService()
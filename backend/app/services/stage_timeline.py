@@ -0,0 +1,175 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.core.database import engine
+from app.models.pipeline import PipelineItem, StageTiming
+from app.services.leases import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+STAGE_CRAWL = "CRAWL"
+STAGE_ANALYZE = "ANALYZE"
+STAGE_INDEX = "INDEX"
+STAGES = (STAGE_CRAWL, STAGE_ANALYZE, STAGE_INDEX)
+
+# Rows buffered before a synchronous flush; the scheduler also flushes every few seconds
+FLUSH_THRESHOLD = 200
+# Percentiles are computed over at most this many recent rows per stage
+PERCENTILE_SAMPLE = 50000
+
+# Second-level labels that sit under a country TLD (example.co.kr, example.com.au)
+_SECOND_LEVEL = {"co", "com", "net", "org", "or", "ac", "go", "ne", "gov", "edu"}
+
+def host_key(fqdn: str) -> str:
+    """
+    Registrable domain approximation for per-host aggregation (no public suffix list).
+    """
+    labels = fqdn.lower().rstrip(".").split(".")
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+def enqueued_at(item: PipelineItem) -> Optional[datetime]:
+    """
+    When the item entered its current status, as local naive time. updated_at is written
+    by the app (local time); created_at comes from SQLite's CURRENT_TIMESTAMP (UTC).
+    """
+    if item.updated_at:
+        return item.updated_at.replace(tzinfo=None)
+    if item.created_at:
+        return item.created_at.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return None
+
+def _ms(delta: timedelta) -> int:
+    return max(int(delta.total_seconds() * 1000), 0)
+
+class StageTimeline:
+    """
+    Buffers StageTiming rows and writes them in batches with one upsert per flush,
+    so timing never adds a commit to the per-item hot path.
+    """
+    def __init__(self):
+        self._buffer: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, item_id: int, stage: str, fqdn: str, started_at: datetime, finished_at: datetime,
+               outcome: str, enqueued: Optional[datetime] = None, bytes_in: Optional[int] = None,
+               tokens: Optional[int] = None):
+        row = {
+            "item_id": item_id,
+            "stage": stage,
+            "host": host_key(fqdn),
+            "enqueued_at": enqueued,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "wait_ms": _ms(started_at - enqueued) if enqueued else None,
+            "duration_ms": _ms(finished_at - started_at),
+            "outcome": outcome,
+            "worker_id": WORKER_ID,
+            "bytes_in": bytes_in,
+            "tokens": tokens
+        }
+        with self._lock:
+            self._buffer[(item_id, stage)] = row
+            full = len(self._buffer) >= FLUSH_THRESHOLD
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._buffer = list(self._buffer.values()), {}
+        if not rows:
+            return 0
+        stmt = sqlite_insert(StageTiming.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["item_id", "stage"],
+            set_={col: stmt.excluded[col] for col in rows[0] if col not in ("item_id", "stage")}
+        )
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception as e:
+            logger.error(f"Stage timeline flush failed ({len(rows)} rows): {e}")
+            return 0
+        return len(rows)
+
+    # --- Read side ---
+
+    def stage_summary(self, db, hours: int = 24) -> List[Dict[str, Any]]:
+        """
+        Per stage: count, outcome breakdown and p50/p90/p99 of wait, service and dwell time (ms).
+        """
+        since = datetime.now() - timedelta(hours=hours)
+        summary = []
+        for stage in STAGES:
+            rows = db.query(StageTiming.wait_ms, StageTiming.duration_ms)\
+                .filter(StageTiming.stage == stage, StageTiming.finished_at >= since)\
+                .order_by(StageTiming.finished_at.desc()).limit(PERCENTILE_SAMPLE).all()
+            outcomes = dict(db.query(StageTiming.outcome, func.count(StageTiming.id))
+                            .filter(StageTiming.stage == stage, StageTiming.finished_at >= since)
+                            .group_by(StageTiming.outcome).all())
+            waits = [w for w, _ in rows if w is not None]
+            durations = [d for _, d in rows if d is not None]
+            dwells = [(w or 0) + (d or 0) for w, d in rows]
+            summary.append({
+                "stage": stage,
+                "count": sum(outcomes.values()),
+                "outcomes": outcomes,
+                "wait_ms": _percentiles(waits),
+                "duration_ms": _percentiles(durations),
+                "dwell_ms": _percentiles(dwells)
+            })
+        return summary
+
+    def slowest_items(self, db, stage: str, hours: int = 24, limit: int = 20) -> List[Dict[str, Any]]:
+        since = datetime.now() - timedelta(hours=hours)
+        rows = db.query(StageTiming, PipelineItem.fqdn, PipelineItem.status)\
+            .join(PipelineItem, PipelineItem.id == StageTiming.item_id)\
+            .filter(StageTiming.stage == stage, StageTiming.finished_at >= since)\
+            .order_by(StageTiming.duration_ms.desc()).limit(limit).all()
+        return [{
+            "item_id": t.item_id,
+            "fqdn": fqdn,
+            "status": status,
+            "stage": t.stage,
+            "wait_ms": t.wait_ms,
+            "duration_ms": t.duration_ms,
+            "outcome": t.outcome,
+            "worker_id": t.worker_id,
+            "bytes_in": t.bytes_in,
+            "tokens": t.tokens,
+            "finished_at": t.finished_at
+        } for t, fqdn, status in rows]
+
+    def slowest_hosts(self, db, stage: str, hours: int = 24, limit: int = 20, min_items: int = 3) -> List[Dict[str, Any]]:
+        since = datetime.now() - timedelta(hours=hours)
+        failures = func.sum(case((StageTiming.outcome == "ok", 0), else_=1))
+        avg_ms = func.avg(StageTiming.duration_ms)
+        rows = db.query(StageTiming.host, func.count(StageTiming.id), avg_ms,
+                        func.max(StageTiming.duration_ms), failures)\
+            .filter(StageTiming.stage == stage, StageTiming.finished_at >= since)\
+            .group_by(StageTiming.host)\
+            .having(func.count(StageTiming.id) >= min_items)\
+            .order_by(avg_ms.desc()).limit(limit).all()
+        return [{
+            "host": host,
+            "items": n,
+            "avg_ms": round(avg or 0, 1),
+            "max_ms": max_ms,
+            "fail_rate": round((failed or 0) / n, 3) if n else 0.0
+        } for host, n, avg, max_ms, failed in rows]
+
+def _percentiles(values: List[int]) -> Dict[str, Optional[int]]:
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    values = sorted(values)
+    last = len(values) - 1
+    pick = lambda q: values[min(int(round(q * last)), last)]
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": values[-1]}
+
+stage_timeline = StageTimeline()
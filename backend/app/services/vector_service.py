@@ -1,75 +1,375 @@
 import logging
+import os
 import uuid
 import time
 import random
-from typing import List, Dict, Any
+import hashlib
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 
-# --- Pydantic v2 Compatibility Patch for ChromaDB ---
-import pydantic
-try:
-    from pydantic_settings import BaseSettings
-    if not hasattr(pydantic, 'BaseSettings'):
-        pydantic.BaseSettings = BaseSettings
-except ImportError:
-    pass
-# ----------------------------------------------------
-
-import chromadb
-from chromadb.utils import embedding_functions
+from app.services.embeddings import get_embedder, LEGACY_MODEL_ID
 
 
 logger = logging.getLogger(__name__)
 
+# Rows per Chroma upsert call (also capped by the client's max batch size)
+UPSERT_CHUNK_SIZE = 1000
+
+COLLECTION_NAME = "threat_intel_kb"
+# Evidence chunk vectors, id = chunk hash; chunk -> domains lives in kb_chunk_refs (SQL)
+CHUNK_COLLECTION_NAME = "threat_intel_kb_chunks"
+# Chunk hits fetched per requested result (several chunks usually map to one domain)
+CHUNK_QUERY_FANOUT = 4
+# Score bonus per additional matching chunk of the same domain, and its cap
+CHUNK_HIT_BONUS = 0.02
+CHUNK_BONUS_CAP = 0.1
+
+# Crawl artifacts are stored relative to the backend root (data/crawled/...)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def read_crawl_evidence(content_path: Optional[str], limit: int = 1000) -> str:
+    """First `limit` chars of a crawled page, or "" if it is missing."""
+    if not content_path:
+        return ""
+    full_path = content_path if content_path.startswith("/") else os.path.join(BACKEND_DIR, content_path)
+    try:
+        with open(full_path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read(limit)
+    except OSError:
+        return ""
+
+def compose_kb_summary(summary: Optional[str], evidence: str) -> str:
+    """Combine LLM summary + crawl evidence into the indexed content."""
+    return f"Summary: {summary or ''}\n\nEvidence: {evidence}"
+
+def build_document(fqdn: str, category: str, content_summary: str) -> str:
+    """The text that gets embedded for a domain."""
+    return f"{fqdn} - {category}: {content_summary}"
+
+def document_hash(document: str) -> str:
+    return hashlib.sha1(document.encode("utf-8", errors="ignore")).hexdigest()
+
+def shared_embedding_function(embedder):
+    """
+    Chroma embedding function backed by our own embedder, so queries and batch
+    indexing share one loaded model. Keeps the SentenceTransformer name/config so
+    it matches the function persisted with the existing collection.
+    The class is built here because its chromadb base class is only imported on use.
+    """
+    from chromadb.utils import embedding_functions
+
+    class SharedModelEmbeddingFunction(embedding_functions.SentenceTransformerEmbeddingFunction):
+        def __init__(self, embedder):
+            # Deliberately not calling super().__init__(): that would load a second copy of the model
+            self.embedder = embedder
+            self.model_name = embedder.model_name
+            self.device = "cpu"
+            self.normalize_embeddings = False
+            self.kwargs = {}
+
+        def __call__(self, input):
+            return list(self.embedder.embed(list(input)))
+
+    return SharedModelEmbeddingFunction(embedder)
+
 class VectorService:
+    """
+    Constructing the singleton is cheap: chromadb is imported and the persistent
+    client opened on first use of client/collection, and the embedding model is
+    loaded on the first embed. Importing the API or a tool pays neither.
+    """
     def __init__(self):
         # Persistent storage for ChromaDB
         self.db_path = "./data/chroma_db"
-        try:
-            self.client = chromadb.PersistentClient(
-                path=self.db_path,
-                settings=chromadb.config.Settings(anonymized_telemetry=False)
-            )
-            
-            # Use SentenceTransformer explicitly to avoid ONNX/tokenizers issues on Python 3.14
-            ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-            
-            self.collection = self.client.get_or_create_collection(
-                name="threat_intel_kb",
-                embedding_function=ef
-            )
-            logger.info(f"VectorService initialized at {self.db_path}")
-        except Exception as e:
-            logger.error(f"Failed to initialize VectorService: {e}")
-            self.collection = None
+        # EMBEDDING_BACKEND picks SentenceTransformer (default; Chroma's bundled ONNX function had
+        # tokenizer issues on Python 3.14) or our own ONNX Runtime backend; served by the shared
+        # embedding server when EMBEDDING_SERVER is set
+        self.embedder = get_embedder(model_name="all-MiniLM-L6-v2")
+
+        # Dedicated executors keep Chroma/embedding work off the asyncio loop and the
+        # FastAPI threadpool. Reads (queries) and writes (bulk embedding) are split so a
+        # long indexing batch can't hold up interactive lookups.
+        self.read_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vector-read")
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-write")
+        # Identical in-flight queries share one execution: key -> Future
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._client = None
+        self._collection = None
+        self._chunks = None
+        self._connected = False
+        self._connect_lock = threading.Lock()
+
+    def _connect(self):
+        with self._connect_lock:
+            if self._connected:
+                return
+            try:
+                from app.core import compat  # noqa: F401  (before chromadb)
+                import chromadb
+                import chromadb.config
+                started = time.perf_counter()
+                self._client = chromadb.PersistentClient(
+                    path=self.db_path,
+                    settings=chromadb.config.Settings(anonymized_telemetry=False)
+                )
+                
+                ef = shared_embedding_function(self.embedder)
+                
+                self._collection = self._client.get_or_create_collection(
+                    name=COLLECTION_NAME,
+                    embedding_function=ef
+                )
+                self._chunks = self._client.get_or_create_collection(
+                    name=CHUNK_COLLECTION_NAME,
+                    embedding_function=ef
+                )
+                logger.info(f"VectorService initialized at {self.db_path} in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                logger.error(f"Failed to initialize VectorService: {e}")
+                self._collection = None
+            # One attempt per process, as before: a failed store stays unavailable
+            self._connected = True
+
+    @property
+    def client(self):
+        if not self._connected:
+            self._connect()
+        return self._client
+
+    @property
+    def collection(self):
+        if not self._connected:
+            self._connect()
+        return self._collection
+
+    @property
+    def chunks(self):
+        if not self._connected:
+            self._connect()
+        return self._chunks
+
+    async def available_async(self) -> bool:
+        """collection is usable; the first check connects on the read executor, not the event loop."""
+        if not self._connected:
+            await self._run(self.read_executor, self._connect)
+        return self._collection is not None
 
     def add_item(self, fqdn: str, content_summary: str, category: str, is_malicious: bool):
         """
         Add or Update an item in the Vector Cache.
-        Embedding is handled automatically by Chroma's default embedding function (all-MiniLM-L6-v2) usually,
-        or we can allow it to download.
+        Always re-embeds; use add_items() for bulk work.
         """
+        self.add_items([{
+            "fqdn": fqdn,
+            "content_summary": content_summary,
+            "category": category,
+            "is_malicious": is_malicious
+        }], skip_unchanged=False)
+
+    def _upsert_chunk_size(self) -> int:
+        try:
+            return min(UPSERT_CHUNK_SIZE, self.client.get_max_batch_size())
+        except Exception:
+            return UPSERT_CHUNK_SIZE
+
+    def add_items(self, items: List[Dict[str, Any]], skip_unchanged: bool = True) -> Dict[str, int]:
+        """
+        Bulk add/update. Each item needs fqdn, content_summary, category, is_malicious.
+        Documents are embedded in large batches and written with chunked upserts.
+        With skip_unchanged, items whose document hash and embedding model match the stored
+        ones are not re-embedded (only their metadata is refreshed if it differs).
+        Items may also carry "evidence" (crawl text), indexed as chunk vectors (see index_chunks()),
+        and "src_hash" (kb_reconcile.source_hash), stored in the metadata.
+        """
+        stats = {"upserted": 0, "metadata_only": 0, "skipped": 0, "failed": 0, "failed_ids": []}
         if not self.collection:
             logger.warning("Vector collection not available.")
-            return
+            stats["failed"] = len(items)
+            stats["failed_ids"] = [it["fqdn"] for it in items]
+            return stats
 
-        try:
-            # Metadata for filtering/context
-            metadata = {
+        # Vectors from another backend/model live in a different space: never keep them
+        model_id = self.embedder.model_id
+        # Last occurrence wins if the same FQDN appears twice
+        rows = {}
+        for it in items:
+            fqdn = it["fqdn"]
+            document = build_document(fqdn, it["category"], it["content_summary"])
+            rows[fqdn] = (document, {
                 "fqdn": fqdn,
-                "category": category,
-                "is_malicious": str(is_malicious), # Chroma needs string/int/float/bool primitives usually safe
-                "source": "w-intel-v2"
-            }
-            
-            # Use FQDN as ID to ensure uniqueness/updates
-            self.collection.upsert(
-                ids=[fqdn],
-                documents=[f"{fqdn} - {category}: {content_summary}"], # The text to embed
-                metadatas=[metadata]
-            )
-            logger.info(f"VectorService: Indexed {fqdn}")
+                "category": it["category"],
+                "is_malicious": str(it["is_malicious"]), # Chroma needs string/int/float/bool primitives usually safe
+                "source": "w-intel-v2",
+                "doc_hash": document_hash(document),
+                "embedding_model": model_id
+            })
+            if it.get("src_hash"):
+                # Source fingerprint for the SQL <-> KB reconciliation (kb_reconcile)
+                rows[fqdn][1]["src_hash"] = it["src_hash"]
+
+        ids = list(rows.keys())
+        chunk_size = self._upsert_chunk_size()
+        for i in range(0, len(ids), chunk_size):
+            chunk_ids = ids[i:i + chunk_size]
+            try:
+                embed_ids = chunk_ids
+                if skip_unchanged:
+                    existing = self.collection.get(ids=chunk_ids, include=["metadatas"])
+                    stored = {eid: (meta or {}) for eid, meta in zip(existing["ids"], existing["metadatas"])}
+                    embed_ids, meta_ids = [], []
+                    for fqdn in chunk_ids:
+                        old = stored.get(fqdn)
+                        new_meta = rows[fqdn][1]
+                        if old is None or old.get("doc_hash") != new_meta["doc_hash"] \
+                                or old.get("embedding_model", LEGACY_MODEL_ID) != model_id:
+                            embed_ids.append(fqdn)
+                        elif old != new_meta:
+                            meta_ids.append(fqdn)
+                        else:
+                            stats["skipped"] += 1
+                    if meta_ids:
+                        self.collection.update(ids=meta_ids, metadatas=[rows[f][1] for f in meta_ids])
+                        stats["metadata_only"] += len(meta_ids)
+
+                if not embed_ids:
+                    continue
+
+                documents = [rows[f][0] for f in embed_ids]
+                embeddings = self.embedder.embed(documents)
+                self.collection.upsert(
+                    ids=embed_ids, # Use FQDN as ID to ensure uniqueness/updates
+                    embeddings=embeddings,
+                    documents=documents,
+                    metadatas=[rows[f][1] for f in embed_ids]
+                )
+                stats["upserted"] += len(embed_ids)
+            except Exception as e:
+                logger.error(f"VectorService Batch Index Error ({len(chunk_ids)} items starting at {chunk_ids[0]}): {e}")
+                stats["failed"] += len(chunk_ids)
+                stats["failed_ids"].extend(chunk_ids)
+
+        failed = set(stats["failed_ids"])
+        evidence = {it["fqdn"]: it["evidence"] for it in items
+                    if it.get("evidence") is not None and it["fqdn"] not in failed}
+        if evidence:
+            stats.update(self.index_chunks(evidence))
+
+        logger.info(f"VectorService: Indexed batch of {len(ids)} "
+                    f"(upserted={stats['upserted']}, metadata_only={stats['metadata_only']}, "
+                    f"skipped={stats['skipped']}, failed={stats['failed']})")
+        return stats
+    def index_chunks(self, evidence_by_fqdn: Dict[str, str]) -> Dict[str, int]:
+        """
+        Replace the evidence chunks of these domains. Only chunks not yet in the chunk
+        collection (or embedded by another model) are embedded; a chunk already stored for another domain just gains
+        a kb_chunk_refs row. Chunks no domain references any more are deleted.
+        """
+        from app.core.config import get_settings
+        from app.core.database import SessionLocal
+        from app.models.pipeline import KBChunkRef
+        from app.services.chunker import chunk_document
+
+        stats = {"chunks_embedded": 0, "chunks_reused": 0, "chunks_removed": 0}
+        settings = get_settings()
+        if not settings.KB_CHUNKS_ENABLED or not self.chunks:
+            return stats
+
+        wanted: Dict[str, Dict[str, tuple]] = {}
+        for fqdn, evidence in evidence_by_fqdn.items():
+            chunks = chunk_document(evidence[:settings.KB_CHUNK_EVIDENCE_CHARS], settings.KB_CHUNK_TOKENS,
+                                    settings.KB_CHUNK_MAX_PER_DOMAIN)
+            wanted[fqdn] = {digest: (position, text) for position, (digest, text) in enumerate(chunks)}
+
+        db = SessionLocal()
+        try:
+            fqdns = list(wanted)
+            current = {(fqdn, digest) for fqdn, digest in db.query(KBChunkRef.fqdn, KBChunkRef.chunk_hash)
+                       .filter(KBChunkRef.fqdn.in_(fqdns))}
+            target = {(fqdn, digest) for fqdn, chunks in wanted.items() for digest in chunks}
+            added, dropped = target - current, current - target
+
+            # Embed chunks the collection doesn't have yet (or has from another model); kept chunks are
+            # checked too so a backend switch re-embeds them. Duplicate texts are identical modulo case/space
+            texts = {}
+            for fqdn, digest in target:
+                texts.setdefault(digest, wanted[fqdn][digest][1])
+            new_refs = {digest for _, digest in added}
+            hashes = list(texts)
+            model_id = self.embedder.model_id
+            size = self._upsert_chunk_size()
+            for i in range(0, len(hashes), size):
+                batch = hashes[i:i + size]
+                existing = self.chunks.get(ids=batch, include=["metadatas"])
+                # A chunk embedded by another backend/model is re-embedded, not reused
+                stored = {cid for cid, meta in zip(existing["ids"], existing["metadatas"])
+                          if (meta or {}).get("embedding_model", LEGACY_MODEL_ID) == model_id}
+                missing = [h for h in batch if h not in stored]
+                stats["chunks_reused"] += sum(1 for h in batch if h in new_refs and h in stored)
+                if missing:
+                    documents = [texts[h] for h in missing]
+                    self.chunks.upsert(ids=missing, embeddings=self.embedder.embed(documents), documents=documents,
+                                       metadatas=[{"chars": len(d), "embedding_model": model_id} for d in documents])
+                    stats["chunks_embedded"] += len(missing)
+
+            # Vectors are written before the refs, so a crash never leaves refs to missing chunks
+            if dropped:
+                for fqdn in {f for f, _ in dropped}:
+                    db.query(KBChunkRef).filter(
+                        KBChunkRef.fqdn == fqdn,
+                        KBChunkRef.chunk_hash.in_([h for f, h in dropped if f == fqdn])
+                    ).delete(synchronize_session=False)
+            db.bulk_insert_mappings(KBChunkRef, [
+                {"fqdn": fqdn, "chunk_hash": digest, "position": wanted[fqdn][digest][0]} for fqdn, digest in added
+            ])
+            db.commit()
+            stats["chunks_removed"] = self._collect_chunks(db, {h for _, h in dropped})
         except Exception as e:
-            logger.error(f"VectorService Index Error for {fqdn}: {e}")
+            logger.error(f"VectorService chunk indexing failed for {len(evidence_by_fqdn)} domains: {e}")
+            db.rollback()
+        finally:
+            db.close()
+        return stats
+
+    def _collect_chunks(self, db, hashes) -> int:
+        """Delete chunk vectors among hashes that no domain references any more."""
+        from app.models.pipeline import KBChunkRef
+        if not hashes:
+            return 0
+        hashes = list(hashes)
+        referenced = {h for (h,) in db.query(KBChunkRef.chunk_hash).filter(KBChunkRef.chunk_hash.in_(hashes)).distinct()}
+        orphaned = [h for h in hashes if h not in referenced]
+        if orphaned:
+            self.chunks.delete(ids=orphaned)
+        return len(orphaned)
+
+    def chunk_stats(self, db) -> Dict[str, Any]:
+        """Distinct chunk vectors vs domain references (refs / chunks = what dedup saves)."""
+        from sqlalchemy import func
+        from app.models.pipeline import KBChunkRef
+        refs, chunks, domains = db.query(func.count(KBChunkRef.id), func.count(func.distinct(KBChunkRef.chunk_hash)),
+                                         func.count(func.distinct(KBChunkRef.fqdn))).one()
+        return {"chunk_vectors": chunks, "chunk_refs": refs, "chunked_domains": domains,
+                "dedup_ratio": round(refs / chunks, 2) if chunks else None}
+
+    def _get_item_once(self, fqdn: str) -> Optional[Dict[str, Any]]:
+        results = self.collection.get(ids=[fqdn])
+        if not results['ids']:
+            return None
+
+        # Extract first match
+        return {
+            "id": results['ids'][0],
+            "fqdn": results['metadatas'][0].get("fqdn"),
+            "category": results['metadatas'][0].get("category"),
+            "is_malicious": results['metadatas'][0].get("is_malicious"),
+            "snippet": results['documents'][0],
+            "distance": 0.0,
+            "score": 1.0 # Exact match
+        }
+
     def get_item(self, fqdn: str) -> Dict[str, Any]:
         """
         Retrieve a specific item by FQDN (Exact Match).
@@ -81,23 +381,7 @@ class VectorService:
         retries = 3
         for attempt in range(retries):
             try:
-                # logger.info(f"VectorService: Executing collection.get for {fqdn} (Attempt {attempt+1})")
-                results = self.collection.get(ids=[fqdn])
-                # logger.info(f"VectorService: Got results for {fqdn}")
-                
-                if not results['ids']:
-                    return None
-                
-                # Extract first match
-                return {
-                    "id": results['ids'][0],
-                    "fqdn": results['metadatas'][0].get("fqdn"),
-                    "category": results['metadatas'][0].get("category"),
-                    "is_malicious": results['metadatas'][0].get("is_malicious"),
-                    "snippet": results['documents'][0],
-                    "distance": 0.0,
-                    "score": 1.0 # Exact match
-                }
+                return self._get_item_once(fqdn)
             except Exception as e:
                 if "locked" in str(e).lower() and attempt < retries - 1:
                     logger.warning(f"Vector DB locked, retrying... ({attempt+1}/{retries})")
@@ -107,47 +391,190 @@ class VectorService:
                 return None
         return None
 
+    def delete_items(self, fqdns: List[str]):
+        if not self.collection or not fqdns:
+            return
+        try:
+            self.collection.delete(ids=fqdns)
+        except Exception as e:
+            logger.error(f"VectorService Delete Error for {fqdns[:5]}: {e}")
+        if self.chunks:
+            self._delete_chunk_refs(fqdns)
+
+    def _delete_chunk_refs(self, fqdns: List[str]):
+        from app.core.database import SessionLocal
+        from app.models.pipeline import KBChunkRef
+        db = SessionLocal()
+        try:
+            hashes = {h for (h,) in db.query(KBChunkRef.chunk_hash).filter(KBChunkRef.fqdn.in_(fqdns))}
+            db.query(KBChunkRef).filter(KBChunkRef.fqdn.in_(fqdns)).delete(synchronize_session=False)
+            db.commit()
+            self._collect_chunks(db, hashes)
+        except Exception as e:
+            logger.error(f"VectorService chunk cleanup failed for {fqdns[:5]}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def _parse_domain_hits(self, results) -> List[Dict[str, Any]]:
+        if not results['ids']:
+            return []
+        ids = results['ids'][0]
+        metadatas = results['metadatas'][0]
+        distances = results['distances'][0] # Similarity distance
+        documents = results['documents'][0]
+        return [{
+            "id": ids[i],
+            "fqdn": metadatas[i].get("fqdn"),
+            "category": metadatas[i].get("category"),
+            "is_malicious": metadatas[i].get("is_malicious"),
+            "snippet": documents[i],
+            "distance": distances[i],
+            "score": 1 - distances[i] # Rough conversion if needed, lower distance = better
+        } for i in range(len(ids))]
+
+    def _search_chunks(self, query_embedding, limit: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Chunk hits aggregated to domains: fqdn -> {score, distance, snippet, chunk_hits}.
+        A domain scores its best chunk plus a small bonus per further matching chunk;
+        chunks shared by more than KB_CHUNK_BOILERPLATE_REFS domains say nothing about
+        any one of them and are skipped.
+        """
+        from sqlalchemy import func
+        from app.core.config import get_settings
+        from app.core.database import SessionLocal
+        from app.models.pipeline import KBChunkRef
+
+        results = self.chunks.query(query_embeddings=[query_embedding], n_results=limit * CHUNK_QUERY_FANOUT)
+        if not results['ids'] or not results['ids'][0]:
+            return {}
+        hits = list(zip(results['ids'][0], results['distances'][0], results['documents'][0]))
+        boilerplate = get_settings().KB_CHUNK_BOILERPLATE_REFS
+        db = SessionLocal()
+        try:
+            hashes = [h for h, _, _ in hits]
+            fanout = dict(db.query(KBChunkRef.chunk_hash, func.count(KBChunkRef.id))
+                          .filter(KBChunkRef.chunk_hash.in_(hashes)).group_by(KBChunkRef.chunk_hash).all())
+            usable = [h for h in hashes if 0 < fanout.get(h, 0) <= boilerplate]
+            owners: Dict[str, List[str]] = {}
+            for digest, fqdn in db.query(KBChunkRef.chunk_hash, KBChunkRef.fqdn).filter(KBChunkRef.chunk_hash.in_(usable)):
+                owners.setdefault(digest, []).append(fqdn)
+        finally:
+            db.close()
+
+        domains: Dict[str, Dict[str, Any]] = {}
+        for digest, distance, text in hits: # best first
+            for fqdn in owners.get(digest, []):
+                hit = domains.get(fqdn)
+                if hit is None:
+                    domains[fqdn] = {"score": 1 - distance, "distance": distance, "snippet": text, "chunk_hits": 1}
+                else:
+                    hit["chunk_hits"] += 1
+        for hit in domains.values():
+            hit["score"] += min(CHUNK_HIT_BONUS * (hit["chunk_hits"] - 1), CHUNK_BONUS_CAP)
+        return domains
+
     def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
-        Semantic Search.
+        Semantic Search over domain documents and evidence chunks.
+        The query is embedded once for both; a domain found through its chunks gets the
+        better of the two scores and the matching chunk as snippet.
         """
         if not self.collection:
             return []
 
         try:
-            results = self.collection.query(
-                query_texts=[query],
+            query_embedding = [float(x) for x in self.embedder.embed([query])[0]]
+            parsed_results = self._parse_domain_hits(self.collection.query(
+                query_embeddings=[query_embedding],
                 n_results=limit
-            )
-            
-            # Format results
-            # results is a dict of lists
-            parsed_results = []
-            
-            # Check safely
-            if not results['ids']:
-                return []
-
-            ids = results['ids'][0]
-            metadatas = results['metadatas'][0]
-            distances = results['distances'][0] # Similarity distance
-            documents = results['documents'][0]
-            
-            for i in range(len(ids)):
-                parsed_results.append({
-                    "id": ids[i],
-                    "fqdn": metadatas[i].get("fqdn"),
-                    "category": metadatas[i].get("category"),
-                    "is_malicious": metadatas[i].get("is_malicious"),
-                    "snippet": documents[i],
-                    "distance": distances[i],
-                    "score": 1 - distances[i] # Rough conversion if needed, lower distance = better
-                })
-                
-            return parsed_results
-            
+            ))
         except Exception as e:
             logger.error(f"VectorService Search Error: {e}")
             return []
 
+        try:
+            chunk_hits = self._search_chunks(query_embedding, limit) if self.chunks else {}
+        except Exception as e:
+            logger.error(f"VectorService Chunk Search Error: {e}")
+            chunk_hits = {}
+        if not chunk_hits:
+            return parsed_results
+
+        by_fqdn = {r["fqdn"]: r for r in parsed_results}
+        missing = [fqdn for fqdn in chunk_hits if fqdn not in by_fqdn]
+        if missing:
+            # Domains reached only through chunks: take category/verdict from their document
+            try:
+                found = self.collection.get(ids=missing, include=["metadatas"])
+                for fqdn, meta in zip(found["ids"], found["metadatas"]):
+                    meta = meta or {}
+                    by_fqdn[fqdn] = {"id": fqdn, "fqdn": fqdn, "category": meta.get("category"),
+                                     "is_malicious": meta.get("is_malicious"), "snippet": "",
+                                     "distance": None, "score": float("-inf")}
+            except Exception as e:
+                logger.error(f"VectorService chunk owner lookup failed: {e}")
+        for fqdn, hit in chunk_hits.items():
+            result = by_fqdn.get(fqdn)
+            if result is None:
+                continue
+            result["chunk_hits"] = hit["chunk_hits"]
+            if hit["score"] > result["score"]:
+                result.update(score=hit["score"], distance=hit["distance"], snippet=hit["snippet"])
+        merged = sorted(by_fqdn.values(), key=lambda r: r["score"], reverse=True)
+        return merged[:limit]
+
+    # --- Async API (for coroutines and async endpoints) ---
+
+    async def _run(self, executor, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+    async def _coalesced(self, key: tuple, fn, *args):
+        """
+        Run a read in the read executor; concurrent callers with the same key
+        await the same execution instead of queueing duplicates.
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(loop),) + key
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._run(self.read_executor, fn, *args))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        # shield: one cancelled caller must not cancel the shared execution
+        return await asyncio.shield(fut)
+
+    async def search_async(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        return await self._coalesced(("search", query, limit), self.search, query, limit)
+
+    async def get_item_async(self, fqdn: str) -> Optional[Dict[str, Any]]:
+        if not await self.available_async():
+            return None
+        retries = 3
+        for attempt in range(retries):
+            try:
+                return await self._coalesced(("get", fqdn), self._get_item_once, fqdn)
+            except Exception as e:
+                if "locked" in str(e).lower() and attempt < retries - 1:
+                    logger.warning(f"Vector DB locked, retrying... ({attempt+1}/{retries})")
+                    await asyncio.sleep(random.uniform(0.1, 0.5))
+                    continue
+                logger.error(f"VectorService Get Error for {fqdn}: {e}")
+                return None
+        return None
+
+    async def add_items_async(self, items: List[Dict[str, Any]], skip_unchanged: bool = True) -> Dict[str, Any]:
+        return await self._run(self.write_executor, self.add_items, items, skip_unchanged=skip_unchanged)
+
+    async def add_item_async(self, fqdn: str, content_summary: str, category: str, is_malicious: bool):
+        return await self._run(self.write_executor, self.add_item, fqdn, content_summary, category, is_malicious)
+
+    async def delete_items_async(self, fqdns: List[str]):
+        return await self._run(self.write_executor, self.delete_items, fqdns)
+
+    async def run_write(self, fn, *args):
+        """Run arbitrary indexing work (e.g. reading evidence + add_items) on the write executor."""
+        return await self._run(self.write_executor, fn, *args)
+
 vector_service = VectorService()
@@ -0,0 +1,254 @@
+import logging
+import ipaddress
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.database import SessionLocal
+from app.models.pipeline import PipelineItem, AnalysisResult, PipelineStatus, PriorityLevel
+
+logger = logging.getLogger(__name__)
+
+# Items in these states carry a usable verdict (INDEXING = analysed, vector pending)
+VERDICT_STATUSES = [PipelineStatus.COMPLETED, PipelineStatus.INDEXING]
+
+def normalize_fqdn(value: str) -> str:
+    value = value.strip().lower()
+    if "://" in value:
+        value = urlparse(value).hostname or ""
+    return value.rstrip(".")
+
+def is_valid_fqdn(fqdn: str) -> bool:
+    """
+    A normalized value worth crawling: has a dot, no whitespace, no port, not an IP literal.
+    """
+    if not fqdn or len(fqdn) > 253 or "." not in fqdn or ":" in fqdn or "/" in fqdn:
+        return False
+    if any(c.isspace() for c in fqdn) or any(not label for label in fqdn.split(".")):
+        return False
+    try:
+        ipaddress.ip_address(fqdn)
+        return False
+    except ValueError:
+        return True
+
+class VerdictIndex:
+    """
+    In-memory exact-match verdict table: fqdn -> (category, is_malicious, confidence).
+    Serves SWG-style lookups without touching Chroma or SQL.
+    Reads are lock-free dict lookups; full loads build a new dict and swap it in.
+    """
+    def __init__(self):
+        self._verdicts: Dict[str, Tuple[str, bool, float]] = {}
+        self._load_lock = threading.Lock()
+        self.loaded = False
+        self.loaded_at: Optional[datetime] = None
+        # Highest analyzed_at seen, for incremental refresh (inclusive: see _query)
+        self._watermark: Optional[datetime] = None
+
+    @staticmethod
+    def _clamp(watermark: Optional[datetime]) -> Optional[datetime]:
+        """
+        analyzed_at is UTC, but rows re-analysed by older versions hold local time: never let
+        such a future timestamp become the watermark (it would hide every newer verdict).
+        """
+        if watermark is None:
+            return None
+        return min(watermark.replace(tzinfo=None), datetime.now(timezone.utc).replace(tzinfo=None))
+
+    def __len__(self):
+        return len(self._verdicts)
+
+    def _query(self, db, since: Optional[datetime] = None):
+        query = db.query(
+            PipelineItem.fqdn,
+            AnalysisResult.category_main,
+            AnalysisResult.is_malicious,
+            AnalysisResult.confidence_score,
+            AnalysisResult.analyzed_at
+        ).join(AnalysisResult, PipelineItem.id == AnalysisResult.item_id)\
+         .filter(PipelineItem.status.in_(VERDICT_STATUSES))
+        if since is not None:
+            # analyzed_at has one-second precision: rows written in the watermark's second after
+            # the last read would be lost with '>', so re-read that second (upserts are idempotent)
+            query = query.filter(AnalysisResult.analyzed_at >= since)
+        return query.yield_per(10000)
+
+    def load(self):
+        """
+        Full (re)load from AnalysisResult.
+        """
+        with self._load_lock:
+            db = SessionLocal()
+            try:
+                verdicts = {}
+                watermark = None
+                for fqdn, category, is_malicious, confidence, analyzed_at in self._query(db):
+                    verdicts[fqdn.lower()] = (category or "Unknown", bool(is_malicious), float(confidence or 0.0))
+                    if analyzed_at and (watermark is None or analyzed_at > watermark):
+                        watermark = analyzed_at
+                self._verdicts = verdicts
+                self._watermark = self._clamp(watermark)
+                self.loaded = True
+                self.loaded_at = datetime.now()
+                logger.info(f"VerdictIndex loaded {len(verdicts)} verdicts")
+            finally:
+                db.close()
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def refresh(self):
+        """
+        Incremental refresh: pick up analyses written since the last load/refresh
+        (e.g. by import scripts or another process).
+        """
+        if not self.loaded:
+            self.load()
+            return
+        with self._load_lock:
+            db = SessionLocal()
+            try:
+                count = 0
+                for fqdn, category, is_malicious, confidence, analyzed_at in self._query(db, since=self._watermark):
+                    key = fqdn.lower()
+                    verdict = (category or "Unknown", bool(is_malicious), float(confidence or 0.0))
+                    if analyzed_at and (self._watermark is None or analyzed_at > self._watermark):
+                        self._watermark = analyzed_at
+                    # The watermark's second is re-read every time: only count actual changes
+                    if self._verdicts.get(key) != verdict:
+                        self._verdicts[key] = verdict
+                        count += 1
+                self._watermark = self._clamp(self._watermark)
+                if count:
+                    logger.info(f"VerdictIndex refreshed {count} verdicts")
+            finally:
+                db.close()
+
+    # --- Write hooks (called on every analysis / KB edit) ---
+
+    def upsert(self, fqdn: str, category: str, is_malicious: bool, confidence: float = 0.0):
+        self._verdicts[normalize_fqdn(fqdn)] = (category or "Unknown", bool(is_malicious), float(confidence or 0.0))
+
+    def remove(self, fqdn: str):
+        self._verdicts.pop(normalize_fqdn(fqdn), None)
+
+    def rename_category(self, old_name: str, new_name: str):
+        for fqdn, (category, is_malicious, confidence) in list(self._verdicts.items()):
+            if category == old_name:
+                self._verdicts[fqdn] = (new_name, is_malicious, confidence)
+
+    # --- Lookups ---
+
+    def lookup(self, fqdn: str, parent_fallback: bool = True) -> Optional[dict]:
+        """
+        Exact match first, then walk up parent domains (a.b.example.com -> b.example.com -> example.com).
+        The bare TLD is never matched.
+        """
+        key = normalize_fqdn(fqdn)
+        verdict = self._verdicts.get(key)
+        matched = key
+        if verdict is None and parent_fallback:
+            parts = key.split(".")
+            for i in range(1, len(parts) - 1):
+                candidate = ".".join(parts[i:])
+                verdict = self._verdicts.get(candidate)
+                if verdict is not None:
+                    matched = candidate
+                    break
+        if verdict is None:
+            return None
+        category, is_malicious, confidence = verdict
+        return {
+            "fqdn": key,
+            "matched": matched,
+            "match_type": "exact" if matched == key else "parent",
+            "category": category,
+            "is_malicious": is_malicious,
+            "confidence": confidence
+        }
+
+    def lookup_many(self, fqdns: List[str], parent_fallback: bool = True) -> List[Optional[dict]]:
+        return [self.lookup(f, parent_fallback) for f in fqdns]
+
+verdict_index = VerdictIndex()
+
+# SQLite bound-parameter budget per IN() query
+SQL_IN_CHUNK = 900
+
+def resolve_batch(fqdns: List[str], parent_fallback: bool = True, enqueue_unknown: bool = False,
+                  source: str = "swg") -> List[dict]:
+    """
+    Resolve many FQDNs in one set-based pass:
+    policy lists + verdict index in memory, then a single chunked IN() query on
+    pipeline_items for whatever is still unknown. Optionally enqueues unknown
+    domains as DISCOVERED (INSERT .. ON CONFLICT DO NOTHING).
+    Returns one compact dict per non-empty input, in input order.
+    """
+    from app.services.policy_service import policy_service
+    policy_service.ensure_loaded()
+    verdict_index.ensure_loaded()
+
+    results = []
+    unresolved = {}
+    for raw in fqdns:
+        fqdn = normalize_fqdn(raw)
+        if not fqdn:
+            continue
+        rec = {"fqdn": fqdn}
+        if not is_valid_fqdn(fqdn):
+            # Ports, IPs, junk log lines: never looked up or enqueued as crawl jobs
+            rec["verdict"] = "invalid"
+            results.append(rec)
+            continue
+        policy = policy_service.classify(fqdn)
+        if policy:
+            rec["policy"] = policy
+        hit = verdict_index.lookup(fqdn, parent_fallback)
+        if hit:
+            rec["verdict"] = "malicious" if hit["is_malicious"] else "clean"
+            rec["category"] = hit["category"]
+            rec["confidence"] = hit["confidence"]
+            rec["match_type"] = hit["match_type"]
+        elif policy == "BLACKLIST":
+            rec["verdict"] = "blocked"
+        elif policy == "WHITELIST":
+            rec["verdict"] = "allowed"
+        else:
+            rec["verdict"] = "unknown"
+            unresolved.setdefault(fqdn, []).append(rec)
+        results.append(rec)
+
+    if unresolved:
+        db = SessionLocal()
+        try:
+            keys = list(unresolved.keys())
+            for i in range(0, len(keys), SQL_IN_CHUNK):
+                chunk = keys[i:i + SQL_IN_CHUNK]
+                for fqdn, status in db.query(PipelineItem.fqdn, PipelineItem.status).filter(PipelineItem.fqdn.in_(chunk)):
+                    for rec in unresolved.pop(fqdn, []):
+                        rec["verdict"] = "pending"
+                        rec["pipeline_status"] = status
+
+            if enqueue_unknown and unresolved:
+                rows = [{
+                    "fqdn": fqdn,
+                    "status": PipelineStatus.DISCOVERED.value,
+                    "source": source,
+                    "priority": PriorityLevel.MEDIUM.value
+                } for fqdn in unresolved]
+                for i in range(0, len(rows), SQL_IN_CHUNK // 4):
+                    stmt = sqlite_insert(PipelineItem).values(rows[i:i + SQL_IN_CHUNK // 4])
+                    db.execute(stmt.on_conflict_do_nothing(index_elements=["fqdn"]))
+                db.commit()
+                for recs in unresolved.values():
+                    for rec in recs:
+                        rec["verdict"] = "pending"
+                        rec["pipeline_status"] = PipelineStatus.DISCOVERED.value
+                        rec["enqueued"] = True
+        finally:
+            db.close()
+
+    return results
@@ -0,0 +1,61 @@
+"""
+Pipeline worker process: runs orchestrator stages outside the API process.
+
+    python -m app.worker --role crawl
+    python -m app.worker --role analyze --role maintenance
+    python -m app.worker --role index
+
+Workers coordinate through the database: claims are conditional updates under a
+per-process lease, so several crawl/analyze workers can run side by side. Run a
+single index worker (the vector store has one writer) and a single maintenance
+worker (feeds, retries, log/metric housekeeping, health monitor). Start the API
+with EMBEDDED_WORKERS=false so it stays a read/control plane.
+SIGTERM/SIGINT drain in-flight work before exiting.
+"""
+from app.core import compat  # noqa: F401  (before anything imports chromadb)
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.core.database import ensure_schema
+from app.services.orchestrator import orchestrator, ROLES, ROLE_CRAWL, ROLE_MAINTENANCE
+
+logger = logging.getLogger("app.worker")
+
+async def run(roles, drain_seconds=None):
+    from app.services.health_monitor import health_monitor
+    ensure_schema()
+    orchestrator.start(roles=roles, control_plane=False)
+    if ROLE_MAINTENANCE in roles:
+        asyncio.create_task(health_monitor.start())
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info(f"Worker running roles: {', '.join(sorted(roles))}")
+    await stop.wait()
+
+    logger.info("Worker shutting down, draining in-flight work...")
+    await health_monitor.stop()
+    await orchestrator.drain(drain_seconds)
+    orchestrator.stop()
+    if ROLE_CRAWL in roles:
+        await orchestrator.crawler.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="W-Intel pipeline worker")
+    parser.add_argument("--role", action="append", required=True, choices=list(ROLES) + ["all"],
+                        help="Stage(s) to run; repeat for several, 'all' for every stage")
+    parser.add_argument("--drain-seconds", type=float, default=None,
+                        help="Shutdown drain deadline (default DRAIN_DEADLINE_SECONDS)")
+    args = parser.parse_args()
+    roles = set(ROLES) if "all" in args.role else set(args.role)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    asyncio.run(run(roles, args.drain_seconds))
+
+if __name__ == "__main__":
+    main()
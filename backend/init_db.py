@@ -1,12 +1,11 @@
-from app.core.database import engine
-from app.models.pipeline import Base
+from app.core.database import ensure_schema
 from app.models.category import CategoryDefinition
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal
 
 def init_db():
     print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    ensure_schema()
     print("Database tables created successfully!")
     seed_categories()
 
@@ -28,17 +28,22 @@ export default function Explorer() {
     const [search, setSearch] = useState('');
     const [statusFilter, setStatusFilter] = useState('');
     const [page, setPage] = useState(0);
+    // Keyset cursors: cursors[n] fetches page n (page 0 has none)
+    const [cursors, setCursors] = useState<(string | null)[]>([null]);
     const limit = 50;
 
     const fetchItems = async () => {
         setLoading(true);
         try {
-            const params: any = { skip: page * limit, limit };
+            const params: any = { limit };
+            if (cursors[page]) params.cursor = cursors[page];
             if (statusFilter) params.status = statusFilter;
             if (search) params.search = search;
 
             const res = await axios.get('/api/v2/pipeline/items', { params });
             setItems(res.data);
+            const next = res.headers['x-next-cursor'] || null;
+            setCursors(prev => [...prev.slice(0, page + 1), next]);
         } catch (err) {
             console.error(err);
         } finally {
@@ -54,6 +59,7 @@ export default function Explorer() {
     const handleSearch = (e: React.FormEvent) => {
         e.preventDefault();
         setPage(0); // Reset to first page
+        setCursors([null]);
         fetchItems();
     };
 
@@ -62,6 +68,7 @@ export default function Explorer() {
             case 'COMPLETED': return <span className="px-2 py-1 rounded bg-green-500/20 text-green-400 text-xs font-bold border border-green-500/30 flex w-fit items-center gap-1"><CheckCircle size={12} /> COMPLETED</span>;
             case 'CRAWLED_SUCCESS': return <span className="px-2 py-1 rounded bg-blue-500/20 text-blue-400 text-xs font-bold border border-blue-500/30 flex w-fit items-center gap-1"><CheckCircle size={12} /> CRAWLED</span>;
             case 'CRAWLED_FAIL': return <span className="px-2 py-1 rounded bg-red-500/20 text-red-400 text-xs font-bold border border-red-500/30 flex w-fit items-center gap-1"><XCircle size={12} /> FAILED</span>;
+            case 'MANUAL_REVIEW': return <span className="px-2 py-1 rounded bg-orange-500/20 text-orange-400 text-xs font-bold border border-orange-500/30 flex w-fit items-center gap-1"><XCircle size={12} /> MANUAL REVIEW</span>;
             case 'CRAWLING': return <span className="px-2 py-1 rounded bg-purple-500/20 text-purple-400 text-xs font-bold border border-purple-500/30 flex w-fit items-center gap-1 animate-pulse"><Clock size={12} /> CRAWLING</span>;
             case 'DISCOVERED': return <span className="px-2 py-1 rounded bg-gray-700 text-gray-400 text-xs font-bold border border-gray-600 flex w-fit items-center gap-1"><Clock size={12} /> DISCOVERED</span>;
             default: return <span className="px-2 py-1 rounded bg-gray-800 text-gray-500 text-xs border border-gray-700">{status}</span>;
@@ -85,13 +92,14 @@ export default function Explorer() {
 
                 <select
                     value={statusFilter}
-                    onChange={(e) => { setStatusFilter(e.target.value); setPage(0); }}
+                    onChange={(e) => { setStatusFilter(e.target.value); setPage(0); setCursors([null]); }}
                     className="bg-gray-900 border border-gray-600 rounded-lg px-4 py-2 text-white focus:outline-none focus:border-blue-500"
                 >
                     <option value="">All Statuses</option>
                     <option value="DISCOVERED">DISCOVERED</option>
                     <option value="CRAWLED_SUCCESS">CRAWLED (SUCCESS)</option>
                     <option value="CRAWLED_FAIL">CRAWLED (FAIL)</option>
+                    <option value="MANUAL_REVIEW">MANUAL REVIEW</option>
                     <option value="COMPLETED">COMPLETED</option>
                 </select>
 
@@ -167,7 +175,7 @@ export default function Explorer() {
                 </button>
                 <span className="text-gray-500 text-sm">Page {page + 1}</span>
                 <button
-                    disabled={items.length < limit}
+                    disabled={!cursors[page + 1]}
                     onClick={() => setPage(p => p + 1)}
                     className="px-4 py-2 bg-gray-800 border border-gray-700 rounded-lg text-gray-300 disabled:opacity-50 hover:bg-gray-700"
                 >
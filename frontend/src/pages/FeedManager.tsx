@@ -14,6 +14,8 @@ interface Feed {
     total_items_found: number;
     last_status: string;
     last_error: string;
+    last_fetch_duration_ms: number | null;
+    last_new_items: number | null;
 }
 
 export default function FeedManager() {
@@ -179,6 +181,11 @@ export default function FeedManager() {
                                 </td>
                                 <td className="px-6 py-4 text-xs">
                                     {feed.last_fetched_at ? new Date(feed.last_fetched_at).toLocaleString() : 'Never'}
+                                    {feed.last_fetch_duration_ms != null && (
+                                        <div className="text-gray-500">
+                                            +{feed.last_new_items ?? 0} new in {(feed.last_fetch_duration_ms / 1000).toFixed(1)}s
+                                        </div>
+                                    )}
                                 </td>
                                 <td className="px-6 py-4 text-right flex items-center justify-end gap-2">
                                     <button
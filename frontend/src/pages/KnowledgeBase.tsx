@@ -27,7 +27,10 @@ export default function KnowledgeBase() {
     const [search, setSearch] = useState("");
     const [categoryFilter, setCategoryFilter] = useState("All");
     const [page, setPage] = useState(1);
+    // Keyset cursors: cursors[n - 1] fetches page n (page 1 has none)
+    const [cursors, setCursors] = useState<(string | null)[]>([null]);
     const [total, setTotal] = useState(0);
+    const [totalIsEstimate, setTotalIsEstimate] = useState(false);
     const [editingItem, setEditingItem] = useState<KBItem | null>(null);
     const [categories, setCategories] = useState<{ id: number, name: string }[]>([]);
 
@@ -54,14 +57,16 @@ export default function KnowledgeBase() {
         try {
             const res = await axios.get('/api/v2/kb/items', {
                 params: {
-                    page,
                     limit: 10,
+                    cursor: cursors[page - 1] || undefined,
                     search,
                     category: categoryFilter
                 }
             });
             itemsSet(res.data.data);
             setTotal(res.data.total);
+            setTotalIsEstimate(res.data.total_is_estimate);
+            setCursors(prev => [...prev.slice(0, page), res.data.next_cursor || null]);
         } catch (e) {
             console.error(e);
         } finally {
@@ -147,13 +152,13 @@ export default function KnowledgeBase() {
                         placeholder="Search domains..."
                         className="w-full bg-gray-800 border border-gray-700 rounded-lg pl-10 pr-4 py-2 text-white focus:outline-none focus:border-blue-500"
                         value={search}
-                        onChange={(e) => setSearch(e.target.value)}
+                        onChange={(e) => { setSearch(e.target.value); setPage(1); setCursors([null]); }}
                     />
                 </div>
                 <select
                     className="bg-gray-800 border border-gray-700 rounded-lg px-4 py-2 text-white"
                     value={categoryFilter}
-                    onChange={(e) => setCategoryFilter(e.target.value)}
+                    onChange={(e) => { setCategoryFilter(e.target.value); setPage(1); setCursors([null]); }}
                 >
                     <option value="All">All Categories</option>
                     {categories.map(c => (
@@ -233,7 +238,7 @@ export default function KnowledgeBase() {
                     </tbody>
                 </table>
                 <div className="p-4 border-t border-gray-700 flex justify-between items-center text-sm text-gray-400">
-                    <span>Showing {items.length} of {total} items</span>
+                    <span>Showing {items.length} of {total}{totalIsEstimate ? '+' : ''} items</span>
                     <div className="flex gap-2">
                         <button
                             disabled={page === 1}
@@ -243,7 +248,7 @@ export default function KnowledgeBase() {
                             Previous
                         </button>
                         <button
-                            disabled={items.length < 10}
+                            disabled={!cursors[page]}
                             onClick={() => setPage(p => p + 1)}
                             className="px-3 py-1 bg-gray-700 rounded hover:bg-gray-600 disabled:opacity-50"
                         >
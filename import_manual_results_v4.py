@@ -61,26 +61,22 @@ def import_results(start_batch, end_batch):
                 with open(r_file, 'r') as f:
                     data = json.load(f)
                 
-                fqdns_to_update = []
+                batch = []
                 
                 for item in data:
                     fqdn = item.get('fqdn')
-                    category = item.get('category_main', 'Uncategorized')
-                    is_malicious = item.get('is_malicious', False)
-                    summary = item.get('summary', 'No summary')
-                    
                     if fqdn:
-                        try:
-                            vector_service.add_item(
-                                fqdn=fqdn,
-                                content_summary=summary,
-                                category=category,
-                                is_malicious=is_malicious
-                            )
-                            fqdns_to_update.append(fqdn)
-                        except Exception as ve:
-                            # print(f"Vector Add Error ({fqdn}): {ve}")
-                            total_errors += 1
+                        batch.append({
+                            "fqdn": fqdn,
+                            "content_summary": item.get('summary', 'No summary'),
+                            "category": item.get('category_main', 'Uncategorized'),
+                            "is_malicious": item.get('is_malicious', False)
+                        })
+                
+                # One batched embedding + upsert per result file
+                stats = vector_service.add_items(batch)
+                total_errors += stats["failed"]
+                fqdns_to_update = [b["fqdn"] for b in batch] if not stats["failed"] else []
                 
                 if fqdns_to_update:
                     placeholders = ','.join(['?'] * len(fqdns_to_update))
@@ -23,7 +23,7 @@ def get_pipeline_stats(conn):
     # Get standard statuses
     statuses = [
         "DISCOVERED", "QUEUED", "CRAWLING", "CRAWLED_SUCCESS", "CRAWLED_FAIL",
-        "ANALYZING", "ANALYSIS_SUCCESS", "ANALYSIS_FAIL", "COMPLETED", "BLOCKED"
+        "ANALYZING", "ANALYSIS_SUCCESS", "ANALYSIS_FAIL", "COMPLETED", "BLOCKED", "MANUAL_REVIEW"
     ]
     
     cursor.execute("SELECT status, COUNT(*) as count FROM pipeline_items GROUP BY status")
@@ -0,0 +1,172 @@
+"""
+Embedding backend benchmark: throughput and retrieval agreement on our own KB.
+
+The corpus is built exactly like the indexer builds KB documents (analysis summary +
+crawl evidence). Every backend embeds the corpus and a query set; each query's top-k
+neighbours (cosine, brute force) are compared with the reference backend's (the first
+one, normally the current fp32 torch model).
+
+    python tools/benchmark_embeddings.py                                 # torch vs onnx vs onnx-int8
+    python tools/benchmark_embeddings.py --backends torch,onnx-int8 --limit 5000 --threads 4
+    python tools/benchmark_embeddings.py --queries-file queries.txt --k 10 --min-overlap 0.9
+
+Exits non-zero if a backend's mean top-k overlap with the reference is below
+--min-overlap, so a faster backend can't silently degrade search.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+sys.path.append(backend_dir)
+
+import numpy as np
+
+from app.core.database import SessionLocal
+from app.models.pipeline import PipelineItem, AnalysisResult, CrawlResult
+from app.services.embeddings import BACKENDS, DEFAULT_MODEL, LEGACY_MODEL_ID, configured_model_id, local_embedder
+from app.services.vector_service import build_document, compose_kb_summary, read_crawl_evidence
+
+def load_corpus(limit: int, seed: int):
+    db = SessionLocal()
+    try:
+        rows = db.query(PipelineItem.fqdn, AnalysisResult.category_main, AnalysisResult.summary,
+                        CrawlResult.html_content_path)\
+            .join(AnalysisResult, PipelineItem.id == AnalysisResult.item_id)\
+            .outerjoin(CrawlResult, PipelineItem.id == CrawlResult.item_id)\
+            .all()
+    finally:
+        db.close()
+    random.Random(seed).shuffle(rows)
+    rows = rows[:limit]
+    documents = [build_document(fqdn, category or "Unknown",
+                                compose_kb_summary(summary, read_crawl_evidence(path)))
+                 for fqdn, category, summary, path in rows]
+    return documents, [summary or fqdn for fqdn, _, summary, _ in rows]
+
+def check_collection_model():
+    """Warn when the KB was embedded by another model than EMBEDDING_BACKEND selects."""
+    from app.services.vector_service import vector_service
+    try:
+        sample = vector_service.collection.get(limit=200, include=["metadatas"])
+    except Exception as e:
+        print(f"⚠️ Could not read the KB collection to check its embedding model: {e}")
+        return
+    stamped = {(meta or {}).get("embedding_model", LEGACY_MODEL_ID) for meta in sample["metadatas"]}
+    configured = configured_model_id(DEFAULT_MODEL)
+    if stamped and stamped != {configured}:
+        print(f"⚠️ KB vectors were embedded with {', '.join(sorted(stamped))} but EMBEDDING_BACKEND selects "
+              f"{configured}. Indexing re-embeds mismatched vectors; until then search mixes embedding spaces.\n")
+
+def default_queries(summaries, n: int, seed: int):
+    """Short natural-language probes: the opening words of random summaries."""
+    rng = random.Random(seed + 1)
+    picked = rng.sample(summaries, min(n, len(summaries)))
+    return [" ".join(text.split()[:rng.randint(3, 10)]) for text in picked]
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+def top_k(queries, corpus, k):
+    scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, idx, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(idx, order, axis=1)
+
+def run_backend(backend, documents, queries, batch_size, repeat):
+    embedder = local_embedder(DEFAULT_MODEL, batch_size=batch_size, backend=backend)
+    started = time.perf_counter()
+    embedder.embed(documents[:8])  # model load + warmup
+    load_seconds = time.perf_counter() - started
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        corpus = embedder.embed(documents)
+        timings.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    query_vectors = embedder.embed(queries)
+    query_seconds = time.perf_counter() - started
+    embedder.close()
+    corpus_seconds = statistics.median(timings)
+    return {
+        "backend": backend,
+        "load_s": load_seconds,
+        "docs_per_s": len(documents) / corpus_seconds,
+        "query_ms": 1000 * query_seconds / max(len(queries), 1),
+        "corpus": normalize(corpus),
+        "queries": normalize(query_vectors),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends on the KB")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help="Comma separated; the first is the reference (default: torch,onnx,onnx-int8)")
+    parser.add_argument("--limit", type=int, default=2000, help="KB documents in the corpus")
+    parser.add_argument("--queries", type=int, default=200, help="Generated queries (ignored with --queries-file)")
+    parser.add_argument("--queries-file", help="One query per line")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--threads", type=int, default=None, help="Overrides EMBEDDING_THREADS")
+    parser.add_argument("--repeat", type=int, default=3, help="Corpus passes per backend (median is reported)")
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        os.environ["EMBEDDING_THREADS"] = str(args.threads)
+        from app.core.config import get_settings
+        get_settings.cache_clear()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    check_collection_model()
+    documents, summaries = load_corpus(args.limit, args.seed)
+    if not documents:
+        print("❌ No analyzed items in the database; nothing to benchmark.")
+        sys.exit(1)
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = default_queries(summaries, args.queries, args.seed)
+    print(f"Corpus: {len(documents)} KB documents, {len(queries)} queries, k={args.k}\n")
+
+    results = []
+    for backend in backends:
+        try:
+            results.append(run_backend(backend, documents, queries, args.batch_size, args.repeat))
+        except Exception as e:
+            print(f"⚠️ {backend}: unavailable ({e})")
+    if not results or results[0]["backend"] != backends[0]:
+        print(f"❌ Reference backend {backends[0]} is unavailable; nothing to compare against.")
+        sys.exit(1)
+
+    reference = results[0]
+    ref_top = top_k(reference["queries"], reference["corpus"], args.k)
+    print(f"{'backend':<10} {'load s':>7} {'docs/s':>9} {'speedup':>8} {'query ms':>9} "
+          f"{'top-k overlap':>14} {'top-1 kept':>11} {'doc cos':>8}")
+    failed = False
+    for result in results:
+        top = top_k(result["queries"], result["corpus"], args.k)
+        overlap = float(np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(ref_top, top)]))
+        top1 = float(np.mean([a[0] in b for a, b in zip(ref_top, top)]))
+        # Same model, same space: per-document cosine between backends shows quantization drift
+        doc_cos = float(np.mean(np.sum(reference["corpus"] * result["corpus"], axis=1)))
+        ok = result is reference or overlap >= args.min_overlap
+        failed |= not ok
+        print(f"{result['backend']:<10} {result['load_s']:>7.2f} {result['docs_per_s']:>9.1f} "
+              f"{result['docs_per_s'] / reference['docs_per_s']:>7.2f}x {result['query_ms']:>9.2f} "
+              f"{overlap:>14.3f} {top1:>11.3f} {doc_cos:>8.4f} {'' if ok else '  ❌ below --min-overlap'}")
+
+    if failed:
+        print(f"\n❌ At least one backend's top-{args.k} agreement is below {args.min_overlap}.")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
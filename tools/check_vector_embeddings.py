@@ -1,8 +1,14 @@
+import sys
+import os
 import chromadb
-from chromadb.utils import embedding_functions
 import logging
 import time
 
+# backend/ on sys.path for the app.* embedder
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+from app.services.embeddings import get_embedder
+from app.services.vector_service import shared_embedding_function
+
 # Logging Setup
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
@@ -15,7 +21,8 @@ def check_embeddings():
     try:
         # 1. Connect
         client = chromadb.PersistentClient(path=DB_PATH)
-        ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+        # Shared embedding server when EMBEDDING_SERVER is set, else a local model
+        ef = shared_embedding_function(get_embedder(model_name="all-MiniLM-L6-v2"))
         collection = client.get_collection(name=COLLECTION_NAME, embedding_function=ef)
         
         count = collection.count()
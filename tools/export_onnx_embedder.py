@@ -0,0 +1,83 @@
+"""
+Export all-MiniLM-L6-v2 to ONNX (fp32) and a dynamically int8-quantized copy for
+EMBEDDING_BACKEND=onnx / onnx-int8.
+
+    python tools/export_onnx_embedder.py                  # -> backend/data/models/all-MiniLM-L6-v2-onnx/
+    python tools/export_onnx_embedder.py --out /srv/models/minilm-onnx
+
+Needs torch + transformers (export) and onnxruntime (quantization) on the machine
+that exports; the servers that run the model only need onnxruntime + tokenizers.
+Run tools/benchmark_embeddings.py afterwards to check throughput and retrieval agreement.
+"""
+import os
+import sys
+import argparse
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+
+MODEL_REPO = "sentence-transformers/all-MiniLM-L6-v2"
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+def export(out_dir: str, opset: int):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_REPO)
+    # Writes tokenizer.json (the fast tokenizer), which OnnxEmbedder loads with `tokenizers`
+    tokenizer.save_pretrained(out_dir)
+
+    model = AutoModel.from_pretrained(MODEL_REPO).eval()
+
+    class Encoder(torch.nn.Module):
+        """Token embeddings only; pooling + normalisation run in numpy (OnnxEmbedder)."""
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids, return_dict=False)[0]
+
+    sample = tokenizer(["export sample text", "a second, longer sample sentence for the trace"],
+                       padding=True, return_tensors="pt")
+    path = os.path.join(out_dir, "model.onnx")
+    dynamic = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(model),
+            tuple(sample[name] for name in INPUT_NAMES),
+            path,
+            input_names=INPUT_NAMES,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: dynamic for name in INPUT_NAMES + ["last_hidden_state"]},
+            opset_version=opset,
+        )
+    print(f"✅ fp32 model: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    return path
+
+def quantize(fp32_path: str, out_dir: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    path = os.path.join(out_dir, "model_int8.onnx")
+    # Dynamic quantization: int8 weights, activations quantized per batch at run time.
+    # Per-channel scales keep the MiniLM projection layers close to fp32.
+    quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8, per_channel=True)
+    print(f"✅ int8 model: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX fp32 + int8")
+    parser.add_argument("--out", default=os.path.join(backend_dir, "data", "models", "all-MiniLM-L6-v2-onnx"))
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--skip-quantize", action="store_true")
+    args = parser.parse_args()
+
+    fp32_path = export(args.out, args.opset)
+    if not args.skip_quantize:
+        quantize(fp32_path, args.out)
+    print(f"\nSet EMBEDDING_ONNX_DIR={args.out} and EMBEDDING_BACKEND=onnx-int8 (or onnx) to use it.")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,11 @@ import sys
 import os
 import logging
 import chromadb
-from chromadb.utils import embedding_functions
+
+# backend/ on sys.path for the app.* embedder
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+from app.services.embeddings import get_embedder
+from app.services.vector_service import shared_embedding_function
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -49,7 +53,8 @@ def migrate():
         
         # IMPORTANT: Use the NEW embedding model logic
         # v2.0 uses 'all-MiniLM-L6-v2' via SentenceTransformer
-        ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+        # Shared embedding server when EMBEDDING_SERVER is set, else a local model
+        ef = shared_embedding_function(get_embedder(model_name="all-MiniLM-L6-v2"))
         
         new_coll = new_client.get_or_create_collection(
             name=NEW_COLLECTION,
@@ -1,6 +1,7 @@
 import sys
 import os
 import logging
+import argparse
 from tqdm import tqdm
 
 # Robust path setup
@@ -19,13 +20,16 @@ from app.models.pipeline import PipelineItem, AnalysisResult, CrawlResult, Pipel
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def rebuild_kb():
+def rebuild_kb(args):
     print("Initializing Database Session...")
     db = SessionLocal()
     
     try:
         print("Importing Vector Service...")
         from app.services.vector_service import vector_service
+        from app.services.kb_reconcile import source_hash
+        vector_service.embedder.batch_size = args.embed_batch_size
+        vector_service.embedder.use_process_pool = args.processes
         
         print("Fetching analyzed items from SQL DB...")
         # Fetch all items that have an analysis result
@@ -38,47 +42,67 @@ def rebuild_kb():
         print(f"Found {total} items with analysis results. Starting Vector Indexing...")
         
         success_count = 0
-        
-        for item, analysis, crawl in tqdm(results, desc="Indexing"):
-            try:
-                # Reconstruct content snippet
-                content_snippet = ""
-                if crawl and crawl.html_content_path:
-                    try:
-                        # Path logic: stored as 'data/crawled/...' relative to backend
-                        # We are at project root. Backend is ./backend
-                        full_path = os.path.join('backend', crawl.html_content_path)
-                        
-                        if os.path.exists(full_path):
-                            with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                content_snippet = f.read()[:1000] # First 1000 chars
-                    except Exception as ex:
-                        # logger.warning(f"Could not read content for {item.fqdn}: {ex}")
-                        pass
-                
-                rich_summary = f"Summary: {analysis.summary}\n\nEvidence: {content_snippet}"
-                
-                vector_service.add_item(
-                    fqdn=item.fqdn,
-                    content_summary=rich_summary,
-                    category=analysis.category_main,
-                    is_malicious=analysis.is_malicious
-                )
-                
+        pending = []
+
+        def flush(batch):
+            # One embedding pass + chunked upserts per batch instead of one call per item
+            stats = vector_service.add_items(
+                [payload for payload, _ in batch],
+                skip_unchanged=not args.force
+            )
+            for _, item in batch:
                 # Update status to COMPLETED if not already (just consistency check)
                 if item.status != PipelineStatus.COMPLETED:
                      item.status = PipelineStatus.COMPLETED
                      db.add(item)
-                
-                success_count += 1
-                
-                # Commit every 100 items
-                if success_count % 100 == 0:
-                    db.commit()
+            db.commit()
+            return len(batch) - stats["failed"], stats
 
-            except Exception as e:
-                logger.error(f"Failed to index {item.fqdn}: {e}")
-        
+        totals = {"upserted": 0, "metadata_only": 0, "skipped": 0, "failed": 0,
+                  "chunks_embedded": 0, "chunks_reused": 0, "chunks_removed": 0}
+        from app.core.config import get_settings
+        chunk_chars = get_settings().KB_CHUNK_EVIDENCE_CHARS
+        for item, analysis, crawl in tqdm(results, desc="Indexing"):
+            # Reconstruct content snippet
+            content_snippet = ""
+            evidence = ""
+            if crawl and crawl.html_content_path:
+                try:
+                    # Path logic: stored as 'data/crawled/...' relative to backend
+                    # We are at project root. Backend is ./backend
+                    full_path = os.path.join('backend', crawl.html_content_path)
+
+                    if os.path.exists(full_path):
+                        with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+                            evidence = f.read(chunk_chars)
+                        content_snippet = evidence[:1000] # First 1000 chars
+                except Exception as ex:
+                    # logger.warning(f"Could not read content for {item.fqdn}: {ex}")
+                    pass
+
+            rich_summary = f"Summary: {analysis.summary}\n\nEvidence: {content_snippet}"
+            pending.append(({
+                "fqdn": item.fqdn,
+                "content_summary": rich_summary,
+                "category": analysis.category_main,
+                "is_malicious": analysis.is_malicious,
+                "evidence": evidence, # indexed as evidence chunk vectors
+                "src_hash": source_hash(analysis.summary, analysis.category_main,
+                                        crawl.html_content_path if crawl else None)
+            }, item))
+
+            if len(pending) >= args.batch_size:
+                ok, stats = flush(pending)
+                success_count += ok
+                for k in totals: totals[k] += stats.get(k, 0)
+                pending = []
+
+        if pending:
+            ok, stats = flush(pending)
+            success_count += ok
+            for k in totals: totals[k] += stats.get(k, 0)
+
+        print(f"Vector stats: {totals}")
         db.commit()
         print(f"\n✅ Rebuild Complete! Indexed {success_count}/{total} items into ChromaDB.")
             
@@ -88,6 +112,15 @@ def rebuild_kb():
         print(f"❌ Critical Error: {e}")
     finally:
         db.close()
+        try:
+            vector_service.embedder.close()
+        except NameError:
+            pass
 
 if __name__ == "__main__":
-    rebuild_kb()
+    parser = argparse.ArgumentParser(description="Rebuild the vector KB from SQL analysis results")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Items per add_items() call")
+    parser.add_argument("--embed-batch-size", type=int, default=128, help="Texts per model forward pass")
+    parser.add_argument("--processes", action="store_true", help="Embed through a multi-process pool (one worker per core)")
+    parser.add_argument("--force", action="store_true", help="Re-embed even if the document hash is unchanged")
+    rebuild_kb(parser.parse_args())
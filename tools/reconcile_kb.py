@@ -0,0 +1,56 @@
+"""
+SQL <-> vector KB reconciliation from the command line (the index worker also runs it
+every KB_RECONCILE_INTERVAL_MINUTES, see app/services/kb_reconcile.py).
+
+    python tools/reconcile_kb.py                       # dry run: drift counts from the checkpoint
+    python tools/reconcile_kb.py --apply               # repair, checkpointing after every batch
+    python tools/reconcile_kb.py --apply --reset --max-changes 0   # full pass, no change budget
+
+Only drifted items are touched: missing vectors are embedded, orphaned ones deleted,
+changed documents re-embedded and changed metadata updated in place.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+sys.path.append(backend_dir)
+
+from app.core.config import get_settings
+from app.services.kb_reconcile import kb_reconciler, REASONS
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Diff SQL analysis results against the vector KB and repair drift")
+    parser.add_argument("--apply", action="store_true", help="Apply the changes (default: report only)")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start a full pass")
+    parser.add_argument("--batch-size", type=int, default=settings.KB_RECONCILE_BATCH_SIZE,
+                        help="Changes per checkpointed batch")
+    parser.add_argument("--max-changes", type=int, default=settings.KB_RECONCILE_MAX_CHANGES,
+                        help="Stop after this many changes; the next run resumes (0 = no limit)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    if args.reset:
+        kb_reconciler.reset()
+    summary = kb_reconciler.run(apply=args.apply, batch_size=args.batch_size, max_changes=args.max_changes or None)
+    if "error" in summary:
+        print(f"❌ {summary['error']}")
+        sys.exit(1)
+
+    print(f"Scanned {summary['sql_scanned']} SQL items ({summary['pending']} in flight) and "
+          f"{summary['kb_scanned']} KB vectors from {summary['resumed_from'] or 'the start'}")
+    for reason in REASONS:
+        print(f"  {reason:<17} {summary[reason]}")
+    if summary["truncated"]:
+        print(f"Stopped at --max-changes {args.max_changes}; run again to continue.")
+    if args.apply:
+        print(f"Applied: {json.dumps({k: summary[k] for k in ('upserted', 'metadata_only', 'skipped', 'deleted', 'failed')})}")
+    elif any(summary[reason] for reason in REASONS):
+        print("Dry run: nothing changed. Re-run with --apply to repair.")
+
+if __name__ == "__main__":
+    main()
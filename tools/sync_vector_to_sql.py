@@ -16,7 +16,7 @@ import chromadb
 # from chromadb.utils import embedding_functions # Not needed for simple read
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Adjust paths
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -111,7 +111,7 @@ def sync_vector_to_sql():
                     confidence_score=1.0, # Assumed trusted
                     summary=summary,
                     vector_id=fqdn,
-                    analyzed_at=datetime.now()
+                    analyzed_at=datetime.now(timezone.utc).replace(tzinfo=None)
                 )
                 session.add(analysis)
                 synced_count += 1
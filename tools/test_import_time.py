@@ -0,0 +1,106 @@
+"""
+Import-time budget check for the API and the modules tools import.
+
+Each target is imported in a fresh interpreter (cold start, like `uvicorn app.main:app`
+or a tool run), timed, and checked for heavy libraries that must stay lazy: the vector
+store, the embedding model stack and the browser crawler load on first use only.
+
+    python tools/test_import_time.py                 # default budget 1.0s
+    python tools/test_import_time.py --budget 0.8 --runs 5
+    python tools/test_import_time.py --profile app.main   # -X importtime top offenders
+
+Exits non-zero if any target is over budget or pulls in a lazy module.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(script_dir), 'backend')
+
+TARGETS = [
+    "app.main",
+    "app.worker",
+    "app.services.orchestrator",
+    "app.services.vector_service",
+    "app.services.llm_service",
+    "app.services.crawler_service",
+    "app.services.feed_service",
+]
+
+# Must not be imported by any target: loaded on first use only
+LAZY_MODULES = [
+    "chromadb",
+    "sentence_transformers",
+    "torch",
+    "transformers",
+    "onnxruntime",
+    "crawl4ai",
+    "playwright",
+    "feedparser",
+    "requests",
+]
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted(m for m in {lazy!r} if m in sys.modules)}}))
+"""
+
+def measure(target: str) -> dict:
+    code = PROBE.format(target=target, lazy=LAZY_MODULES)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["unknown error"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def profile(target: str, top: int):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"],
+                          cwd=backend_dir, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(self_us), int(cumulative_us), name))
+    print(f"Slowest imports (self time) for {target}:")
+    for self_us, cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {self_us / 1000:8.1f} ms self  {cumulative_us / 1000:8.1f} ms total  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import time budget check")
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds allowed per target (median)")
+    parser.add_argument("--runs", type=int, default=3, help="Cold imports per target")
+    parser.add_argument("--target", action="append", help="Module(s) to check instead of the defaults")
+    parser.add_argument("--profile", metavar="MODULE", help="Print the slowest imports of MODULE and exit")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.profile:
+        profile(args.profile, args.top)
+        return
+
+    failed = False
+    for target in args.target or TARGETS:
+        results = [measure(target) for _ in range(max(args.runs, 1))]
+        errors = [r["error"] for r in results if "error" in r]
+        if errors:
+            print(f"❌ {target}: import failed: {errors[0]}")
+            failed = True
+            continue
+        median = statistics.median(r["seconds"] for r in results)
+        leaked = sorted({m for r in results for m in r["modules"]})
+        ok = median <= args.budget and not leaked
+        failed |= not ok
+        note = f"  eagerly imports {', '.join(leaked)}" if leaked else ""
+        print(f"{'✅' if ok else '❌'} {target}: {median:.3f}s (budget {args.budget:.2f}s){note}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+VerdictIndex incremental refresh check on a scratch SQLite DB.
+
+analyzed_at has one-second precision, so a verdict written in the same second as the
+refresh watermark must still be picked up by the next refresh().
+
+    python tools/test_verdict_refresh.py
+
+Exits non-zero on failure.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKEND_DIR = os.path.join(PROJECT_ROOT, "backend")
+sys.path.append(BACKEND_DIR)
+
+# Scratch DB: must be set before app.core.database creates the engine
+scratch_dir = tempfile.mkdtemp(prefix="verdict_refresh_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch_dir, 'verdicts.db')}"
+
+from app.core.database import ensure_schema, SessionLocal
+from app.models.pipeline import PipelineItem, AnalysisResult, PipelineStatus
+from app.services.verdict_index import VerdictIndex
+
+def add_verdict(db, fqdn: str, analyzed_at: datetime, category: str = "News"):
+    item = PipelineItem(fqdn=fqdn, status=PipelineStatus.COMPLETED)
+    db.add(item)
+    db.flush()
+    db.add(AnalysisResult(item_id=item.id, category_main=category, is_malicious=False,
+                          confidence_score=0.9, analyzed_at=analyzed_at))
+    db.commit()
+
+def test_same_second_refresh() -> bool:
+    ensure_schema()
+    index = VerdictIndex()
+    # Truncated to the second, like SQLite CURRENT_TIMESTAMP
+    second = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    db = SessionLocal()
+    try:
+        add_verdict(db, "a.com", second)
+        index.load()
+        add_verdict(db, "b.com", second)
+        index.refresh()
+        index.refresh()
+    finally:
+        db.close()
+    ok = index.lookup("a.com") is not None and index.lookup("b.com") is not None
+    print(f"{'✅' if ok else '❌'} same-second verdict picked up by refresh (b.com -> {index.lookup('b.com')})")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if test_same_second_refresh() else 1)
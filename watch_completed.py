@@ -6,6 +6,43 @@ import sys
 
 # Define database path
 DB_PATH = "/root/project/ARX-v2.0/backend/w_intel.db"
+# Live event stream (throughput ticks pushed by the backend, no DB polling)
+EVENTS_URL = os.environ.get("WINTEL_EVENTS_URL", "http://localhost:8000/api/v2/pipeline/events?types=tick")
+
+def watch_events():
+    """
+    Follow the backend's SSE tick stream. Returns False if the API is unreachable.
+    """
+    import json
+    import httpx
+
+    print(f"👀 Following live pipeline ticks from {EVENTS_URL}")
+    print("Press Ctrl+C to stop.\n")
+    last_count = -1
+    try:
+        with httpx.stream("GET", EVENTS_URL, timeout=httpx.Timeout(10.0, read=60.0)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data: "):
+                    continue
+                tick = json.loads(line[6:])
+                counts = tick.get("counts", {})
+                completed = counts.get("COMPLETED", 0)
+
+                diff_str = ""
+                if last_count != -1:
+                    diff = completed - last_count
+                    diff_str = f"(+{diff} 🔼)" if diff > 0 else "(-)"
+                rate = tick.get("per_minute", {}).get("COMPLETED", 0)
+
+                timestamp = time.strftime("%H:%M:%S")
+                print(f"[{timestamp}] COMPLETED: {completed:<6} {diff_str:<10} | {rate}/min | "
+                      f"Pending Analysis: {counts.get('CRAWLED_SUCCESS', 0):<6} | Failed: {counts.get('ANALYSIS_FAIL', 0)}")
+                last_count = completed
+    except httpx.HTTPError as e:
+        print(f"Event stream unavailable ({e}), falling back to DB polling.\n")
+        return False
+    return True
 
 def watch_db():
     print(f"👀 Monitoring COMPLETED count in {DB_PATH}")
@@ -62,4 +99,8 @@ def watch_db():
         print("\nStopped monitoring.")
 
 if __name__ == "__main__":
-    watch_db()
+    try:
+        if "--db" in sys.argv or not watch_events():
+            watch_db()
+    except KeyboardInterrupt:
+        print("\nStopped monitoring.")